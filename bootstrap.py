@@ -0,0 +1,60 @@
+""" Service registration shared by every limbosh entry point.
+
+Authors:
+    Saul Johnson (saul.johnson@nhlstenden.com)
+Since:
+    28/02/2023
+"""
+import logging
+
+from kink import di
+
+from config.caching_config_provider import CachingConfigProvider
+from config.config_provider import BootSnapshotConfig, ConfigProvider, SessionStoreConfig
+from config.config_validator import ConfigValidator
+from config.file_based_config_provider import FileBasedConfigProvider
+from config.json_schema_config_validator import JsonSchemaConfigValidator
+from input_guards.input_guard_factory import InputGuardFactory
+from input_transformers.input_transformer_factory import InputTransformerFactory
+from llm.context_compressor import ContextCompressor
+from llm.context_compressor_factory import ContextCompressorFactory
+from llm.large_language_model_factory import LargeLanguageModelFactory
+from llm.response_cache import ResponseCache
+from llm.response_cache_factory import ResponseCacheFactory
+from llm.tokenizer_factory import TokenizerFactory
+from output_guards.output_guard_factory import OutputGuardFactory
+from output_transformers.output_transformer_factory import OutputTransformerFactory
+from prompting.prompt_factory import PromptFactory
+from shell.boot_snapshot_cache import BootSnapshotCache
+from shell.session_store import SessionStore
+
+
+def bootstrap():
+    """ Registers all injected services with the dependency injection container.
+    """
+
+    # Initialize config file paths.
+    di['config_json_schema_file_path'] = './config.schema.json'
+    di['config_file_path'] = './config.json'
+
+    # Create application logger.
+    di[logging.Logger] = logging.getLogger('limbosh')
+
+    # Register all injected services.
+    di[ConfigValidator] = JsonSchemaConfigValidator()
+    di[ConfigProvider] = CachingConfigProvider(FileBasedConfigProvider()) # Load and validate config once, reload on change.
+    di[InputTransformerFactory] = InputTransformerFactory()
+    di[InputGuardFactory] = InputGuardFactory()
+    di[LargeLanguageModelFactory] = LargeLanguageModelFactory()
+    di[OutputGuardFactory] = OutputGuardFactory()
+    di[OutputTransformerFactory] = OutputTransformerFactory()
+    di[PromptFactory] = PromptFactory()
+    di[ResponseCacheFactory] = ResponseCacheFactory()
+    di[TokenizerFactory] = TokenizerFactory()
+    di[ContextCompressorFactory] = ContextCompressorFactory()
+    di[ResponseCache] = lambda di: di[ResponseCacheFactory].get() # One cache shared by all sessions in this process.
+    di[ContextCompressor] = lambda di: di[ContextCompressorFactory].get()
+    di[BootSnapshotCache] = lambda di: BootSnapshotCache((di[ConfigProvider].get().boot_snapshot or BootSnapshotConfig()).disk_path)
+    di[SessionStore] = lambda di: SessionStore(
+        (di[ConfigProvider].get().session_store or SessionStoreConfig()).disk_path,
+        (di[ConfigProvider].get().session_store or SessionStoreConfig()).flush_interval)
@@ -0,0 +1,63 @@
+from collections import OrderedDict
+import threading
+from typing import Generic, Hashable, Optional, TypeVar
+
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+class LruCache(Generic[K, V]):
+    """ A thread-safe, size-capped map that evicts its least recently used entries first.
+    """
+
+    def __init__(self, capacity: int):
+        """ Initializes a new instance of a thread-safe, size-capped map that evicts its least recently used entries first.
+
+        Args:
+            capacity (int): The maximum number of entries to hold.
+        """
+        self.capacity = capacity
+        self.entries: OrderedDict[K, V] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: K) -> Optional[V]:
+        """ Gets the value stored against a key, marking it as most recently used.
+
+        Args:
+            key (K): The key to look up.
+        Returns:
+            Optional[V]: The value stored against the key, or None if there isn't one.
+        """
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key: K, value: V):
+        """ Stores a value against a key, evicting the least recently used entry if the cache is full.
+
+        Args:
+            key (K): The key to store the value against.
+            value (V): The value to store.
+        """
+        if self.capacity <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """ Removes all entries from the cache.
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def __contains__(self, key: K) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,43 @@
+import os
+import sqlite3
+import threading
+from typing import Iterable
+
+
+class SqliteDatabase():
+    """ An SQLite database that may be used from any thread of any process, including ones forked after it was opened.
+
+    Each process opens a connection of its own the first time it is used (in write-ahead logging mode, so that many
+    readers can work alongside a writer), since SQLite connections must never be shared with forked processes.
+    """
+
+    def __init__(self, path: str, schema: Iterable[str]):
+        """ Initializes a new instance of an SQLite database that may be used from any thread of any process.
+
+        Args:
+            path (str): The path of the database file.
+            schema (Iterable[str]): The statements to run on each new connection to set up the database (which should
+                therefore be idempotent, such as `CREATE TABLE IF NOT EXISTS`).
+        """
+        self.path = path
+        self.schema = list(schema)
+        self.lock = threading.Lock()
+        self.connection: sqlite3.Connection | None = None
+        self.connection_pid: int | None = None
+
+    def connect(self) -> sqlite3.Connection:
+        """ Gets the connection to the database for this process, opening one if it does not have one yet.
+
+        Callers should hold `lock` for as long as they use the connection.
+
+        Returns:
+            sqlite3.Connection: The connection to the database.
+        """
+        if self.connection is None or self.connection_pid != os.getpid():
+            self.connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self.connection.execute('PRAGMA journal_mode=WAL') # Allow many readers alongside a writer.
+            for statement in self.schema:
+                self.connection.execute(statement)
+            self.connection.commit()
+            self.connection_pid = os.getpid()
+        return self.connection
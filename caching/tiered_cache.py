@@ -0,0 +1,59 @@
+from typing import Optional
+
+from caching.lru_cache import LruCache
+from caching.sqlite_database import SqliteDatabase
+
+
+class TieredCache():
+    """ A thread-safe map from strings to strings that keeps recently used entries in memory, backed by an optional
+    on-disk tier in an SQLite database shared between processes.
+    """
+
+    def __init__(self, capacity: int, table: str, disk_path: Optional[str] = None):
+        """ Initializes a new instance of a map that keeps recently used entries in memory, backed by an optional on-disk tier.
+
+        Args:
+            capacity (int): The maximum number of entries to hold in memory.
+            table (str): The name of the table to keep entries in on disk.
+            disk_path (Optional[str]): The path of an SQLite database to persist entries to across restarts (if any).
+        """
+        self.memory = LruCache[str, str](capacity)
+        self.table = table
+        self.disk = None if disk_path is None else SqliteDatabase(
+            disk_path,
+            [f'CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, response TEXT NOT NULL)'])
+
+    def get(self, key: str) -> Optional[str]:
+        """ Gets the value stored against a key, from memory if possible and otherwise from disk.
+
+        Args:
+            key (str): The key to look up.
+        Returns:
+            Optional[str]: The value stored against the key, or None if there isn't one.
+        """
+        # Try memory first.
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return value
+
+        # Fall back to disk, promoting any hit to memory.
+        with self.disk.lock:
+            row = self.disk.connect().execute(f'SELECT response FROM {self.table} WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self.memory.put(key, row[0])
+        return row[0]
+
+    def put(self, key: str, value: str):
+        """ Stores a value against a key, in memory and on disk (if there is an on-disk tier).
+
+        Args:
+            key (str): The key to store the value against.
+            value (str): The value to store.
+        """
+        self.memory.put(key, value)
+        if self.disk is not None:
+            with self.disk.lock:
+                connection = self.disk.connect()
+                connection.execute(f'INSERT OR REPLACE INTO {self.table} (key, response) VALUES (?, ?)', (key, value))
+                connection.commit()
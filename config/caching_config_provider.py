@@ -0,0 +1,64 @@
+from logging import Logger
+import os
+import threading
+import time
+
+from kink import inject
+
+from config.config_provider import Config, ConfigProvider
+
+
+@inject
+class CachingConfigProvider(ConfigProvider):
+    """ Represents a provider for application-level configuration that caches the configuration loaded by another provider.
+
+    The configuration file is checked for modification at most once per check interval, and a changed configuration is
+    swapped in once it has been loaded and validated successfully. Sessions started after this pick it up without a
+    restart, while an invalid change leaves the last good configuration in place.
+    """
+
+    def __init__(self, config_provider: ConfigProvider, config_file_path: str, logger: Logger, check_interval: float = 1.0):
+        """ Initialises a new instance of a provider for application-level configuration that caches the configuration loaded by another provider.
+
+        Args:
+            config_provider (ConfigProvider): The provider to load (and reload) the configuration with.
+            config_file_path (str): The file to watch for modification.
+            logger (Logger): The logger to use for this instance.
+            check_interval (float): The minimum time (in seconds) between checks for modification.
+        """
+        self.config_provider = config_provider
+        self.config_file_path = config_file_path
+        self.logger = logger
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.config: Config | None = None
+        self.modified_at: int | None = None
+        self.checked_at = 0.0
+
+    def get(self) -> Config:
+        # Serve cached config unless it is time to check for modification.
+        now = time.monotonic()
+        if self.config is not None and now - self.checked_at < self.check_interval:
+            return self.config
+
+        with self.lock:
+            self.checked_at = now
+            try:
+                modified_at = os.stat(self.config_file_path).st_mtime_ns
+            except OSError:
+                modified_at = None # Let the underlying provider report the problem.
+
+            # Reload if the file has changed, keeping the last good config if the new one is broken.
+            if self.config is None or modified_at != self.modified_at:
+                try:
+                    config = self.config_provider.get()
+                except Exception as e:
+                    if self.config is None:
+                        raise e
+                    self.logger.error(f'Could not reload config from {self.config_file_path}, keeping previous config: {e}')
+                else:
+                    if self.config is not None:
+                        self.logger.info(f'Reloaded config from {self.config_file_path}.')
+                    self.config = config
+                self.modified_at = modified_at
+            return self.config
@@ -1,12 +1,12 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Dict, Literal, List
+from dataclasses import dataclass, field
+from typing import Dict, Literal, List, Optional
 
 from dataclasses_json import dataclass_json
 
 
 @dataclass_json
-@dataclass
+@dataclass(frozen=True)
 class OllamaConfig():
     """ Application configuration for connecting to an Ollama instance (useful for self-hosting LLMs).
     """
@@ -21,9 +21,326 @@ class OllamaConfig():
 
 
 @dataclass_json
-@dataclass
+@dataclass(frozen=True)
+class BackendConfig():
+    """ Application configuration for one of several Ollama instances to route LLM requests between.
+    """
+
+    hostname: str
+    """ The hostname of the Ollama instance to connect to.
+    """
+
+    port: int
+    """ The port to connect on.
+    """
+
+    model_name: Optional[str] = None
+    """ The name of the model to use on this instance (by default, the application-level model name).
+    """
+
+    weight: float = 1
+    """ The relative share of requests to send to this instance.
+    """
+
+    max_concurrency: int = 4
+    """ The maximum number of requests that may be outstanding against this instance (across all sessions).
+    """
+
+
+@dataclass_json
+@dataclass(frozen=True)
+class ConnectionPoolConfig():
+    """ Application configuration for the pool of HTTP connections kept open to each LLM endpoint.
+    """
+
+    max_connections: int = 16
+    """ The maximum number of concurrent connections to each endpoint.
+    """
+
+    max_keepalive_connections: int = 8
+    """ The maximum number of idle connections to keep open to each endpoint.
+    """
+
+    keepalive_expiry: float = 300
+    """ The time (in seconds) after which idle connections are closed.
+    """
+
+    connect_timeout: float = 5
+    """ The time (in seconds) to wait for a connection to be established.
+    """
+
+    request_timeout: float = 600
+    """ The time (in seconds) to wait for a request to complete.
+    """
+
+
+@dataclass_json
+@dataclass(frozen=True)
+class HealthCheckConfig():
+    """ Application configuration for monitoring the health of the LLM backend.
+    """
+
+    ttl: float = 30
+    """ The time (in seconds) for which the result of a health probe is trusted.
+    """
+
+    probe_interval: float = 10
+    """ The time (in seconds) between background health probes.
+    """
+
+    keep_alive_interval: float = 240
+    """ The time (in seconds) between pings asking the backend to keep the model loaded (Ollama only).
+    """
+
+    failure_threshold: int = 3
+    """ The number of consecutive failed requests after which requests fail fast.
+    """
+
+    reset_timeout: float = 15
+    """ The time (in seconds) after which requests are tried again once they have started failing fast.
+    """
+
+
+@dataclass_json
+@dataclass(frozen=True)
+class DeadlinesConfig():
+    """ Application configuration for how long to wait for the LLM before giving up, depending on what it is being asked.
+    """
+
+    command: Optional[float] = None
+    """ The time (in seconds) to wait for the response to a shell command (if limited).
+    """
+
+    guard: Optional[float] = None
+    """ The time (in seconds) to wait for an output guard verdict (if limited).
+    """
+
+    compression: Optional[float] = None
+    """ The time (in seconds) to wait for compressed context (if limited).
+    """
+
+
+@dataclass_json
+@dataclass(frozen=True)
+class HedgingConfig():
+    """ Application configuration for hedging slow responses to shell commands by asking a second LLM backend as well.
+    """
+
+    percentile: float = 0.95
+    """ The percentile (between 0 and 1) of recent response latencies after which to hedge a request.
+    """
+
+    minimum_delay: float = 0.5
+    """ The minimum time (in seconds) to wait before hedging a request.
+    """
+
+    model_name: Optional[str] = None
+    """ The name of the model to hedge requests with (by default, the same model, on whichever backend is least loaded).
+    """
+
+
+@dataclass_json
+@dataclass(frozen=True)
+class DegradationConfig():
+    """ Application configuration for keeping sessions responsive when the LLM is too slow to answer commands in time.
+    """
+
+    deadline: float = 10
+    """ The time (in seconds) to wait for the LLM to start responding to a command before making up a response instead.
+    """
+
+    hang: float = 3
+    """ The time (in seconds) to pause for before making up a response to a command not seen before.
+    """
+
+
+@dataclass_json
+@dataclass(frozen=True)
+class SchedulerConfig():
+    """ Application configuration for scheduling LLM requests fairly between sessions.
+    """
+
+    max_concurrency: int = 8
+    """ The maximum number of LLM requests to send at once (across all sessions).
+    """
+
+    max_queue_length: int = 64
+    """ The maximum number of LLM requests that may wait to be sent, beyond which more are turned away.
+    """
+
+    session_rate: float = 1
+    """ The number of commands per second each session may send to the LLM on average.
+    """
+
+    session_burst: int = 20
+    """ The number of commands each session may send to the LLM in quick succession.
+    """
+
+    source_rate: float = 2
+    """ The number of commands per second all sessions from the same address may send to the LLM on average.
+    """
+
+    source_burst: int = 40
+    """ The number of commands all sessions from the same address may send to the LLM in quick succession.
+    """
+
+
+@dataclass_json
+@dataclass(frozen=True)
+class CommandBatchingConfig():
+    """ Application configuration for sending commands entered all at once (for example, a pasted script) to the LLM together.
+    """
+
+    max_commands: int = 16
+    """ The maximum number of commands to send to the LLM in one request.
+    """
+
+
+@dataclass_json
+@dataclass(frozen=True)
+class GenerationLimitsConfig():
+    """ Application configuration for limiting how much the LLM generates in response to each command.
+    """
+
+    stop_at_prompt: bool = True
+    """ Whether to stop the LLM generating once it reaches the prompt, instead of letting it carry on making up more.
+    """
+
+    max_tokens: int = 512
+    """ The maximum number of tokens to generate in response to commands not matching any of `command_max_tokens`.
+    """
+
+    command_max_tokens: Dict[str, int] = field(default_factory=lambda: {
+        r'(id|whoami|hostname|pwd|groups|nproc|uptime|date|arch|tty|uname( -[a-z]+)*)': 64,
+        r'(cat|find|grep|head|tail|ls|ps|dmesg|journalctl|netstat|ss|lsof|du|strings|history)( .*)?': 1024,
+    })
+    """ The maximum number of tokens to generate in response to (whitespace-normalized) commands matching each regular
+    expression (the first that matches applies).
+    """
+
+
+@dataclass_json
+@dataclass(frozen=True)
+class AppropriatenessJudgeConfig():
+    """ Application configuration for deciding which LLM output the appropriateness output guard asks the LLM to judge.
+    """
+
+    confident_threshold: float = 0.8
+    """ The shell-likeness score (between 0 and 1) at or above which output is only judged if sampled.
+    """
+
+    sample_rate: float = 0.1
+    """ The proportion (between 0 and 1) of confidently shell-like output to judge anyway.
+    """
+
+
+@dataclass_json
+@dataclass(frozen=True)
+class ContextCompressionConfig():
+    """ Application configuration for when to compress the LLM context in the background.
+    """
+
+    low_watermark: float = 0.75
+    """ The size of context past which to start compressing it, as a proportion of `context_compression_threshold`.
+    """
+
+    high_watermark: float = 1.5
+    """ The size of context past which to drop its oldest turns until compression catches up, as a proportion of `context_compression_threshold`.
+    """
+
+    compressor: Literal['passthrough', 'built_in', 'structured_state', 'sliding_window'] = 'passthrough'
+    """ The context compressor to use (leaving context as it is, asking the LLM to rewrite it, folding old commands into a record of system state, or dropping them).
+    """
+
+    recent_exchanges: int = 4
+    """ The number of the latest commands (and their output) the structured state compressor keeps in context as they are.
+    """
+
+    window_tokens: int = 4096
+    """ The maximum number of tokens the latest commands (and their output) kept by the sliding window compressor may take up.
+    """
+
+
+@dataclass_json
+@dataclass(frozen=True)
+class DaemonConfig():
+    """ Application configuration for the pre-forking limbosh daemon.
+    """
+
+    socket_path: str = '/run/limbosh.sock'
+    """ The path of the Unix socket that login-shell clients connect to.
+    """
+
+    workers: int = 4
+    """ The number of pre-initialized shell workers to keep waiting for sessions.
+    """
+
+
+@dataclass_json
+@dataclass(frozen=True)
+class BootSnapshotConfig():
+    """ Application configuration for starting sessions from a snapshot of the LLM's response to the system prompt.
+    """
+
+    disk_path: Optional[str] = None
+    """ The path of an SQLite database to persist boot snapshots to across restarts (if any).
+    """
+
+
+@dataclass_json
+@dataclass(frozen=True)
+class SessionStoreConfig():
+    """ Application configuration for keeping sessions on disk, so that reconnecting attackers pick up where they left off.
+    """
+
+    disk_path: str = 'sessions.db'
+    """ The path of the SQLite database to keep sessions in (which must be writable by every user sessions run as).
+    """
+
+    max_age: int = 86400
+    """ The longest time (in seconds) since a session was last active for it to be resumed rather than started afresh.
+    """
+
+    flush_interval: float = 1.0
+    """ The longest time (in seconds) to hold writes back for so that they can be batched together.
+    """
+
+
+@dataclass_json
+@dataclass(frozen=True)
+class ResponseCacheConfig():
+    """ Application configuration for caching LLM responses to stateless commands across sessions.
+    """
+
+    capacity: int = 1024
+    """ The maximum number of responses to keep in memory.
+    """
+
+    disk_path: Optional[str] = None
+    """ The path of an SQLite database to persist cached responses to across restarts (if any).
+    """
+
+    cacheable_commands: List[str] = field(default_factory=lambda: [
+        r'uname( -[a-z]+)*',
+        r'id',
+        r'whoami',
+        r'hostname',
+        r'groups',
+        r'nproc',
+        r'lscpu',
+        r'cat /etc/(passwd|group|hostname|hosts|issue|os-release|resolv\.conf|shells)',
+        r'ls( -[a-zA-Z]+)* /',
+    ])
+    """ Regular expressions matching (whitespace-normalized) commands whose responses may be cached.
+    """
+
+
+@dataclass_json
+@dataclass(frozen=True)
 class Config():
     """ The application-level configuration object.
+
+    Instances are immutable, so that they can be shared safely between sessions and swapped out wholesale on reload.
     """
 
     model_name: Literal[
@@ -62,7 +379,7 @@ class Config():
     """ The input transformers to use between the user and the LLM.
     """
     
-    output_guards: List[Literal['passthrough']]
+    output_guards: List[Literal['passthrough', 'appropriateness']]
     """ The input guards to use between the LLM and the user.
     """
     
@@ -78,6 +395,74 @@ class Config():
     """ Configuration for connecting to an Ollama instance (useful for self-hosting LLMs).
     """
 
+    connection_pool: ConnectionPoolConfig = field(default_factory=ConnectionPoolConfig)
+    """ Configuration for the pool of HTTP connections kept open to each LLM endpoint.
+    """
+
+    health_check: HealthCheckConfig = field(default_factory=HealthCheckConfig)
+    """ Configuration for monitoring the health of the LLM backend.
+    """
+
+    deadlines: DeadlinesConfig = field(default_factory=DeadlinesConfig)
+    """ Configuration for how long to wait for the LLM before giving up, depending on what it is being asked.
+    """
+
+    hedging: Optional[HedgingConfig] = None
+    """ Configuration for hedging slow responses to shell commands by asking a second LLM backend as well (disabled if absent).
+    """
+
+    degradation: Optional[DegradationConfig] = None
+    """ Configuration for keeping sessions responsive when the LLM is too slow to answer commands in time (disabled if absent).
+    """
+
+    scheduler: Optional[SchedulerConfig] = None
+    """ Configuration for scheduling LLM requests fairly between sessions (disabled if absent).
+    """
+
+    command_batching: Optional[CommandBatchingConfig] = None
+    """ Configuration for sending commands entered all at once to the LLM together (disabled if absent).
+    """
+
+    generation_limits: Optional[GenerationLimitsConfig] = None
+    """ Configuration for limiting how much the LLM generates in response to each command (unlimited if absent).
+    """
+
+    context_compression: Optional[ContextCompressionConfig] = None
+    """ Configuration for when to compress the LLM context in the background (at `context_compression_threshold`, uncapped, if absent).
+    """
+
+    appropriateness_judge: AppropriatenessJudgeConfig = field(default_factory=AppropriatenessJudgeConfig)
+    """ Configuration for deciding which LLM output the appropriateness output guard asks the LLM to judge.
+    """
+
+    local_commands: List[Literal['pwd', 'cd', 'whoami', 'hostname', 'echo', 'history', 'export', 'env']] = field(default_factory=list)
+    """ The commands to answer from session state without asking the LLM (which also keeps them consistent).
+    """
+
+    streaming: bool = False
+    """ Whether to stream LLM output to the terminal as it is generated (output guards then run once it has been shown).
+    """
+
+    response_cache: Optional[ResponseCacheConfig] = None
+    """ Configuration for caching LLM responses to stateless commands across sessions (disabled if absent).
+    """
+
+    boot_snapshot: Optional[BootSnapshotConfig] = None
+    """ Configuration for starting sessions from a snapshot of the LLM's response to the system prompt (disabled if absent).
+    """
+
+    session_store: Optional[SessionStoreConfig] = None
+    """ Configuration for keeping sessions on disk, so that reconnecting attackers pick up where they left off (disabled if absent).
+    """
+
+    daemon: Optional[DaemonConfig] = None
+    """ Configuration for the pre-forking limbosh daemon (if any).
+    """
+
+    backends: Optional[List[BackendConfig]] = None
+    """ Configuration for several Ollama instances to route LLM requests between (if any, in place of `ollama`).
+    """
+
 
 class ConfigProvider(ABC):
     """ Represents a provider for application-level configuration.
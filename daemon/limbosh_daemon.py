@@ -0,0 +1,293 @@
+import gc
+import json
+from logging import Logger
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+from typing import Dict
+
+from kink import inject
+
+from config.config_provider import ConfigProvider, DaemonConfig
+from input_guards.input_guard_factory import InputGuardFactory
+from llm.large_language_model_factory import LargeLanguageModelFactory
+from prompting.prompt_factory import PromptFactory
+from shell.boot_snapshot_cache import BootSnapshotCache
+from shell.shell import Shell
+
+
+@inject
+class LimboshDaemon():
+    """ Represents a pre-forking daemon that serves limbosh sessions to login-shell clients over a Unix socket.
+    """
+
+    forwarded_signals = [
+        signal.SIGINT,
+        signal.SIGQUIT,
+        signal.SIGHUP,
+        signal.SIGTERM,
+        signal.SIGWINCH,
+    ]
+    """ The signals that clients are permitted to forward to the worker serving their session.
+    """
+
+    minimum_worker_lifetime = 1.0
+    """ The time (in seconds) a failed worker must have lived for to be respawned without backing off.
+    """
+
+    boot_ahead_timeout = 60.0
+    """ The time (in seconds) to wait for the emulated system to boot ahead of time, after which the daemon starts without a snapshot.
+    """
+
+    def __init__(
+            self,
+            config_provider: ConfigProvider,
+            prompt_factory: PromptFactory,
+            input_guard_factory: InputGuardFactory,
+            large_language_model_factory: LargeLanguageModelFactory,
+            boot_snapshot_cache: BootSnapshotCache,
+            logger: Logger):
+        """ Initializes a new instance of a pre-forking daemon that serves limbosh sessions to login-shell clients over a Unix socket.
+
+        Args:
+            config_provider (ConfigProvider): The application-level configuration provider.
+            prompt_factory (PromptFactory): The prompt factory to warm up before forking workers.
+            input_guard_factory (InputGuardFactory): The input guard factory to warm up before forking workers.
+            large_language_model_factory (LargeLanguageModelFactory): The LLM factory to set up shared load counters and scheduling in before forking workers.
+            boot_snapshot_cache (BootSnapshotCache): The cache of boot snapshots to fill before forking workers.
+            logger (Logger): The logger to use for this instance.
+        """
+        self.config_provider = config_provider
+        self.prompt_factory = prompt_factory
+        self.input_guard_factory = input_guard_factory
+        self.large_language_model_factory = large_language_model_factory
+        self.boot_snapshot_cache = boot_snapshot_cache
+        self.logger = logger
+        self.daemon_config = config_provider.get().daemon or DaemonConfig()
+
+        # Maps worker process IDs to the time they were spawned.
+        self.workers: Dict[int, float] = {}
+
+    def _warm_up(self):
+        """ Initializes shared read-only state once so that forked workers inherit it copy-on-write.
+        """
+        config = self.config_provider.get()
+        self.prompt_factory.get(config.shell) # Compile and cache prompt templates.
+        self.input_guard_factory.get() # Load any text classification models.
+        self.large_language_model_factory.share_state() # Count and schedule requests across all workers.
+        if config.boot_snapshot is not None:
+            self._boot_ahead() # Snapshot the boot of the emulated system, so that no session has to wait for one.
+
+        # Move everything allocated so far out of the reach of the garbage collector, so that collections in workers do
+        # not write to (and so copy) the pages shared with the daemon.
+        gc.collect()
+        gc.freeze()
+
+    def _boot_ahead(self):
+        """ Boots the emulated system and keeps the snapshot for workers to inherit.
+
+        Booting is done in a short-lived child process, so that the daemon never opens connections to the LLM that
+        workers would then inherit and share.
+        """
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            exit_code = 1
+            try:
+                shell = Shell()
+                shell.boot()
+                with os.fdopen(write_fd, 'w') as pipe:
+                    json.dump({'persona': shell.persona, 'response': self.boot_snapshot_cache.get(shell.persona)}, pipe)
+                exit_code = 0
+            except BaseException as e:
+                self.logger.warning(f'Could not boot the emulated system ahead of time: {e}')
+            finally:
+                os._exit(exit_code)
+        os.close(write_fd)
+
+        # Read the snapshot, giving up (and killing the child) if the LLM is taking too long to boot the system.
+        chunks = []
+        deadline = time.monotonic() + LimboshDaemon.boot_ahead_timeout
+        with os.fdopen(read_fd, 'rb') as pipe:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or len(select.select([pipe], [], [], remaining)[0]) == 0:
+                    self.logger.warning(f'Could not boot the emulated system ahead of time within {LimboshDaemon.boot_ahead_timeout} seconds. Starting without a snapshot.')
+                    os.kill(pid, signal.SIGKILL)
+                    chunks = []
+                    break
+                chunk = os.read(pipe.fileno(), 65536)
+                if len(chunk) == 0:
+                    break
+                chunks.append(chunk)
+        os.waitpid(pid, 0)
+        self.large_language_model_factory.settle_process(pid)
+        message = b''.join(chunks).decode('utf-8')
+        if len(message) > 0:
+            snapshot = json.loads(message)
+            if snapshot['response'] is not None:
+                self.boot_snapshot_cache.put(snapshot['persona'], snapshot['response'])
+
+    def _listen(self) -> socket.socket:
+        """ Binds the Unix socket that login-shell clients connect to.
+
+        Returns:
+            socket.socket: The listening socket.
+        """
+        if os.path.exists(self.daemon_config.socket_path):
+            os.unlink(self.daemon_config.socket_path) # Remove stale socket left behind by a previous run.
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.daemon_config.socket_path)
+        os.chmod(self.daemon_config.socket_path, 0o666) # Honeypot users must be able to connect.
+        server.listen(self.daemon_config.workers * 4)
+        return server
+
+    def _spawn_worker(self):
+        """ Forks a new worker that pre-initializes a shell and then waits to serve one session.
+        """
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                exit_code = self._serve_session()
+            except BaseException:
+                self.logger.exception('Worker failed while serving a session.')
+            finally:
+                os._exit(exit_code)
+        self.workers[pid] = time.monotonic()
+
+    def _serve_session(self) -> int:
+        """ Runs in a worker to pre-initialize a shell, accept one client and run a session for it.
+
+        Returns:
+            int: The exit code of the session.
+        """
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        # Initialize the shell before any client arrives, so that it is ready the moment one does.
+        config = self.config_provider.get()
+        shell = Shell()
+        try:
+            shell.boot() # Instant from a boot snapshot, otherwise done while nobody is waiting for it.
+        except Exception as e:
+            self.logger.warning(f'Could not boot the emulated system before the session: {e}')
+
+        # Wait for a client, then attach its terminal to this process.
+        connection, _ = self.server.accept()
+        self.server.close()
+
+        # Config may have changed while waiting, in which case the session should get a shell built from the new one.
+        if self.config_provider.get() is not config:
+            shell = Shell()
+        if not self._attach(connection):
+            return 1
+
+        # Relay signals from the client for the duration of the session.
+        threading.Thread(target=self._forward_signals, args=[connection], daemon=True).start()
+        exit_code = 0
+        try:
+            shell.run()
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception:
+            self.logger.exception('Shell session terminated unexpectedly.')
+            exit_code = 1
+        sys.stdout.flush()
+
+        # Report exit code back to client.
+        try:
+            connection.sendall(bytes([exit_code & 0xFF]))
+        except OSError:
+            pass # Client already gone.
+        return exit_code
+
+    def _attach(self, connection: socket.socket) -> bool:
+        """ Receives the terminal and environment of a client and adopts them as those of the current process.
+
+        Args:
+            connection (socket.socket): The connection to the client.
+        Returns:
+            bool: True if the client was attached successfully, otherwise False.
+        """
+        message, fds, _, _ = socket.recv_fds(connection, 65536, 3)
+        if len(fds) != 3:
+            self.logger.error(f'Client passed {len(fds)} file descriptors instead of 3.')
+            for fd in fds:
+                os.close(fd)
+            return False
+
+        # Standard streams become the client's terminal.
+        for fd, target in zip(fds, [0, 1, 2]):
+            os.dup2(fd, target)
+            os.close(fd)
+        sys.stdin = open(0, 'r', closefd=False)
+        sys.stdout = open(1, 'w', buffering=1, closefd=False)
+        sys.stderr = open(2, 'w', buffering=1, closefd=False)
+
+        # Take on the login environment of the client (user, SSH connection details, terminal type).
+        header = json.loads(message.decode('utf-8'))
+        os.environ.update(header.get('environ', {}))
+
+        # Never serve a session with more privileges than the client connecting to us.
+        if os.geteuid() == 0:
+            credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+            _, uid, gid = struct.unpack('3i', credentials)
+            os.setgroups([])
+            os.setgid(gid)
+            os.setuid(uid)
+        return True
+
+    def _forward_signals(self, connection: socket.socket):
+        """ Raises signals relayed by the client in the current process, as the terminal would have done.
+
+        Args:
+            connection (socket.socket): The connection to the client.
+        """
+        forwarded_signals = [int(signum) for signum in LimboshDaemon.forwarded_signals]
+        while True:
+            try:
+                data = connection.recv(1)
+            except OSError:
+                data = b''
+            if len(data) == 0:
+                os.kill(os.getpid(), signal.SIGHUP) # Client disconnected, hang up.
+                return
+            if data[0] in forwarded_signals:
+                os.kill(os.getpid(), data[0])
+
+    def run(self):
+        """ Starts the daemon and keeps its worker pool topped up until terminated.
+        """
+        self.server = self._listen()
+        self._warm_up()
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        self.logger.info(f'Listening on {self.daemon_config.socket_path} with {self.daemon_config.workers} workers.')
+        try:
+            while True:
+
+                # Replace workers as they finish their sessions.
+                while len(self.workers) < self.daemon_config.workers:
+                    self._spawn_worker()
+                pid, status = os.wait()
+                spawned = self.workers.pop(pid, None)
+                self.large_language_model_factory.settle_process(pid) # Give back any requests it was killed in the middle of.
+
+                # Back off if workers are failing immediately (e.g. broken configuration).
+                failed = os.waitstatus_to_exitcode(status) != 0
+                if failed and spawned is not None and time.monotonic() - spawned < LimboshDaemon.minimum_worker_lifetime:
+                    self.logger.error(f'Worker {pid} failed immediately after starting. Backing off.')
+                    time.sleep(LimboshDaemon.minimum_worker_lifetime)
+        finally:
+            for pid in self.workers:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass # Worker already exited.
+            self.server.close()
+            os.unlink(self.daemon_config.socket_path)
@@ -2,6 +2,8 @@ from abc import ABC, abstractmethod
 from enum import Enum
 from typing import Optional
 
+from caching.lru_cache import LruCache
+
 
 class InputGuardFinding(Enum):
     """ An enumeration of findings that input guards may make with regard to user input.
@@ -31,6 +33,13 @@ class InputGuardFinding(Enum):
 class InputGuard(ABC):
     """ Represents an abstract input guard.
     """
+
+    verdict_cache: Optional[LruCache[str, InputGuardFinding]] = None
+    """ The cache of findings shared by all instances of the guard in this process, keyed on normalized input (if any).
+
+    Only guards whose findings depend on nothing but their input should opt in to caching, by overriding this with a
+    cache of their own.
+    """
     
     def __init__(self, next: Optional['InputGuard'] = None):
         """ Abstract constructor for an input guard.
@@ -40,6 +49,17 @@ class InputGuard(ABC):
         """
         self.next = next
         
+    @staticmethod
+    def normalize(message_content: str) -> str:
+        """ Normalizes input so that trivially different spellings of it share a cache entry.
+
+        Args:
+            message_content (str): The input to normalize.
+        Returns:
+            str: The normalized input.
+        """
+        return ' '.join(message_content.split())
+
     @abstractmethod
     def _detect (self, message_content: str) -> InputGuardFinding:
         """ Uses this input guard to check the given message.
@@ -63,8 +83,15 @@ class InputGuard(ABC):
         Returns:
             InputGuardFinding: The finding of the input guard.
         """
-        # Run own detect function.
-        result = self._detect(message_content)
+        # Run own detect function, unless a finding for the same input is cached.
+        if self.verdict_cache is None:
+            result = self._detect(message_content)
+        else:
+            key = InputGuard.normalize(message_content)
+            result = self.verdict_cache.get(key)
+            if result is None:
+                result = self._detect(message_content)
+                self.verdict_cache.put(key, result)
         if result != InputGuardFinding.OK:
             return result
         
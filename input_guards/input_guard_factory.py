@@ -23,7 +23,7 @@ class InputGuardFactory():
         Args:
             config_provider (ConfigProvider): The application-level configuration provider.
         """
-        self.config = config_provider.get()
+        self.config_provider = config_provider
 
     @staticmethod
     def construct(input_guard_type: Literal['passthrough', 'empty', 'clear', 'exit', 'text_classifier']) -> InputGuard:
@@ -52,4 +52,5 @@ class InputGuardFactory():
         Returns:
             InputGuard: The newly-constructed input guard.
         """
-        return ChainingInputGuard([InputGuardFactory.construct(input_guard) for input_guard in self.config.input_guards])
+        config = self.config_provider.get()
+        return ChainingInputGuard([InputGuardFactory.construct(input_guard) for input_guard in config.input_guards])
@@ -0,0 +1,100 @@
+import json
+import os
+import re
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+
+class LinearTextClassifier():
+    """ Represents a linear text classifier over TF-IDF weighted word n-grams, evaluated directly from NumPy arrays.
+
+    This reproduces the `predict` and `decision_function` methods of a scikit-learn pipeline made up of a `CountVectorizer`, a
+    `TfidfTransformer` (with L2 normalization) and a linear classifier, without having to import scikit-learn or
+    unpickle the pipeline. Models are exported to this format using `tools/export_text_classifier.py`.
+    """
+
+    vocabulary_file_name = 'vocabulary.json'
+    """ The name of the file that maps n-grams to feature indices.
+    """
+
+    metadata_file_name = 'metadata.json'
+    """ The name of the file that holds the vectorizer settings, intercept and class labels.
+    """
+
+    idf_file_name = 'idf.npy'
+    """ The name of the file that holds the inverse document frequency of each feature.
+    """
+
+    weights_file_name = 'weights.npy'
+    """ The name of the file that holds the classifier coefficient of each feature, pre-multiplied by its IDF.
+    """
+
+    def __init__(self, model_directory_path: str):
+        """ Initializes a new instance of a linear text classifier, loading it from an exported model directory.
+
+        Numeric arrays are memory-mapped, so that processes classifying with the same model share one copy of them.
+
+        Args:
+            model_directory_path (str): The path of the directory the model was exported to.
+        """
+        with open(os.path.join(model_directory_path, LinearTextClassifier.metadata_file_name)) as file:
+            metadata = json.load(file)
+        with open(os.path.join(model_directory_path, LinearTextClassifier.vocabulary_file_name), encoding='utf-8') as file:
+            self.vocabulary: Dict[str, int] = json.load(file)
+        self.idf = np.load(os.path.join(model_directory_path, LinearTextClassifier.idf_file_name), mmap_mode='r')
+        self.weights = np.load(os.path.join(model_directory_path, LinearTextClassifier.weights_file_name), mmap_mode='r')
+        self.token_pattern = re.compile(metadata['token_pattern'])
+        self.lowercase: bool = metadata['lowercase']
+        self.min_n, self.max_n = metadata['ngram_range']
+        self.intercept: float = metadata['intercept']
+        self.classes: List[int] = metadata['classes']
+
+    def _get_ngrams(self, text: str) -> Iterator[str]:
+        """ Splits text into word n-grams the same way the vectorizer the model was trained with does.
+
+        Args:
+            text (str): The text to split.
+        Returns:
+            Iterator[str]: The n-grams in the text.
+        """
+        tokens = self.token_pattern.findall(text.lower() if self.lowercase else text)
+        for n in range(self.min_n, min(self.max_n, len(tokens)) + 1):
+            for i in range(len(tokens) - n + 1):
+                yield ' '.join(tokens[i:i + n])
+
+    def decision_function(self, texts: List[str]) -> np.ndarray:
+        """ Computes the signed distance of each of a batch of texts from the decision boundary of the classifier.
+
+        The whole batch is scored in a single pass over one flat array of features, however many texts it contains.
+
+        Args:
+            texts (List[str]): The texts to classify.
+        Returns:
+            np.ndarray: The signed distances (positive for the second class, negative for the first).
+        """
+        rows: List[int] = []
+        indices: List[int] = []
+        for row, text in enumerate(texts):
+            for ngram in self._get_ngrams(text):
+                index = self.vocabulary.get(ngram)
+                if index is not None:
+                    rows.append(row)
+                    indices.append(index)
+
+        # Count occurrences of each feature in each text, then take the dot product with the L2-normalized TF-IDF vector.
+        keys, counts = np.unique(np.array(rows, dtype=np.int64) * len(self.idf) + np.array(indices, dtype=np.int64), return_counts=True)
+        rows_of_keys, features = np.divmod(keys, len(self.idf))
+        scores = np.bincount(rows_of_keys, weights=counts * self.weights[features], minlength=len(texts))
+        norms = np.sqrt(np.bincount(rows_of_keys, weights=np.square(counts * self.idf[features]), minlength=len(texts)))
+        return np.divide(scores, norms, out=np.zeros(len(texts)), where=norms > 0) + self.intercept
+
+    def predict(self, texts: List[str]) -> List[int]:
+        """ Classifies a batch of texts.
+
+        Args:
+            texts (List[str]): The texts to classify.
+        Returns:
+            List[int]: The predicted class label of each text.
+        """
+        return [self.classes[1] if decision > 0 else self.classes[0] for decision in self.decision_function(texts)]
@@ -1,19 +1,39 @@
-from joblib import load
+from functools import lru_cache
+
+from caching.lru_cache import LruCache
 from input_guards.input_guard import InputGuard, InputGuardFinding
+from input_guards.linear_text_classifier import LinearTextClassifier
+
+
+@lru_cache(maxsize=None)
+def _load_classifier(model_directory_path: str) -> LinearTextClassifier:
+    """ Loads an exported text classification model, at most once per process.
+
+    Args:
+        model_directory_path (str): The path of the directory the model was exported to.
+    Returns:
+        LinearTextClassifier: The loaded model.
+    """
+    return LinearTextClassifier(model_directory_path)
 
 
 class TextClassifierInputGuard(InputGuard):
     """ An input guard that uses a text classification model to detect probable prompt injection attacks.
+
+    Verdicts are cached in memory, so only repeats within the same process hit the cache. When running the daemon, each
+    worker serves a single session, so this means repeats within a session. The classifier is cheap enough to run that
+    sharing verdicts between sessions (e.g. on disk) would cost about as much as it saves.
     """
-    
+
+    verdict_cache = LruCache(4096) # Attack tooling tends to repeat the same payloads within a session.
+
     def __init__(self, next: InputGuard | None = None):
         """ Initializes a new instance of an input guard that uses a text classification model to detect probable prompt injection attacks.
         """
         super().__init__(next)
-        self.pipeline = load('./models/rf-1-3.model')
+        self.classifier = _load_classifier('./models/rf-1-3') # Exported from ./models/rf-1-3.model.
 
     def _detect(self, message_content: str) -> bool:
-        if self.pipeline.predict([message_content])[0] == 1:
+        if self.classifier.predict([message_content])[0] == 1:
             return InputGuardFinding.PROBABLE_PROMPT_INJECTION
         return InputGuardFinding.OK
-    
\ No newline at end of file
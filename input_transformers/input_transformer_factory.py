@@ -20,7 +20,7 @@ class InputTransformerFactory():
         Args:
             config_provider (ConfigProvider): The application-level configuration provider.
         """
-        self.config = config_provider.get()
+        self.config_provider = config_provider
 
     @staticmethod
     def construct(input_transformer_type: Literal['passthrough', 'delimiting']) -> InputTransformer:
@@ -43,4 +43,5 @@ class InputTransformerFactory():
         Returns:
             InputTransformer: The newly-constructed input transformer.
         """
-        return ChainingInputTransformer([InputTransformerFactory.construct(input_transformer) for input_transformer in self.config.input_transformers])
+        config = self.config_provider.get()
+        return ChainingInputTransformer([InputTransformerFactory.construct(input_transformer) for input_transformer in config.input_transformers])
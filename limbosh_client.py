@@ -0,0 +1,79 @@
+""" The thin login-shell client that attaches its terminal to a running limbosh daemon.
+
+Deliberately imports nothing beyond the standard library so that it starts in milliseconds. If no daemon is listening,
+falls back to running the shell in-process.
+
+Authors:
+    Saul Johnson (saul.johnson@nhlstenden.com)
+Since:
+    28/02/2023
+"""
+import json
+import os
+import signal
+import socket
+import sys
+
+
+ENVIRONMENT_KEYS = ['USER', 'LOGNAME', 'HOME', 'TERM', 'LANG', 'SSH_CLIENT', 'SSH_CONNECTION', 'SSH_TTY']
+""" The environment variables to pass on to the daemon worker serving the session.
+"""
+
+FORWARDED_SIGNALS = [signal.SIGINT, signal.SIGQUIT, signal.SIGWINCH]
+""" The signals to relay to the daemon worker serving the session.
+"""
+
+HANG_UP_SIGNALS = [signal.SIGHUP, signal.SIGTERM]
+""" The signals to relay to the daemon worker serving the session before exiting immediately.
+"""
+
+
+def get_socket_path(config_file_path: str = './config.json') -> str:
+    """ Reads the path of the daemon socket from the configuration file.
+
+    Args:
+        config_file_path (str): The path of the configuration file.
+    Returns:
+        str: The path of the daemon socket.
+    """
+    try:
+        with open(config_file_path) as file:
+            daemon_config = json.load(file).get('daemon') or {}
+    except (OSError, json.JSONDecodeError):
+        daemon_config = {}
+    return daemon_config.get('socket_path', '/run/limbosh.sock')
+
+
+def main() -> int:
+    # Connect to daemon, falling back to an in-process shell if it isn't running.
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(get_socket_path())
+    except OSError:
+        os.execv(sys.executable, [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'limbosh.py')])
+
+    # Hand over our terminal and login environment.
+    header = json.dumps({'environ': {key: os.environ[key] for key in ENVIRONMENT_KEYS if key in os.environ}})
+    socket.send_fds(connection, [header.encode('utf-8')], [0, 1, 2])
+
+    # Relay signals raised by the terminal, since the worker is not in its foreground process group.
+    def forward(signum, frame):
+        try:
+            connection.send(bytes([signum]))
+        except OSError:
+            pass # Worker already gone.
+    def hang_up(signum, frame):
+        forward(signum, frame)
+        os._exit(128 + signum)
+    for signum in FORWARDED_SIGNALS:
+        signal.signal(signum, forward)
+    for signum in HANG_UP_SIGNALS:
+        signal.signal(signum, hang_up)
+
+    # Wait for the worker to report the exit code of the session.
+    status = connection.recv(1)
+    return status[0] if len(status) > 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
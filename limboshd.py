@@ -0,0 +1,21 @@
+""" The daemon that keeps a pool of pre-initialized limbosh shells ready for incoming logins.
+
+Authors:
+    Saul Johnson (saul.johnson@nhlstenden.com)
+Since:
+    28/02/2023
+"""
+import logging
+
+from kink import di
+
+from bootstrap import bootstrap
+from daemon.limbosh_daemon import LimboshDaemon
+
+
+# Register all injected services.
+bootstrap()
+logging.basicConfig(level=logging.INFO)
+
+# Start serving sessions to login-shell clients.
+di[LimboshDaemon].run()
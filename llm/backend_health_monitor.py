@@ -0,0 +1,180 @@
+from enum import Enum
+from logging import Logger
+import threading
+import time
+from typing import Callable, Optional
+
+
+class CircuitState(Enum):
+    """ An enumeration of the states of the circuit breaker guarding an LLM backend.
+    """
+
+    CLOSED = 0
+    """ Indicates that the backend is healthy and requests are allowed through.
+    """
+
+    OPEN = 1
+    """ Indicates that the backend is down and requests fail fast without being sent.
+    """
+
+    HALF_OPEN = 2
+    """ Indicates that the backend may have recovered and a single trial request is allowed through.
+    """
+
+
+class BackendHealthMonitor():
+    """ Tracks the health of an LLM backend, so that requests fail fast while it is down instead of hanging.
+
+    Health is established by probing the backend, either from a background thread or (if that is not running) at most
+    once per TTL on the request path. Failed requests trip a circuit breaker, which lets a single trial request through
+    once a cooldown has passed to find out whether the backend has recovered.
+    """
+
+    def __init__(
+            self,
+            probe: Callable[[], bool],
+            keep_alive: Optional[Callable[[], None]] = None,
+            ttl: float = 30,
+            probe_interval: float = 10,
+            keep_alive_interval: float = 240,
+            failure_threshold: int = 3,
+            reset_timeout: float = 15,
+            name: str = 'LLM backend',
+            logger: Optional[Logger] = None):
+        """ Initializes a new instance of a monitor for the health of an LLM backend.
+
+        Args:
+            probe (Callable[[], bool]): Checks whether the backend is reachable.
+            keep_alive (Optional[Callable[[], None]]): Pings the backend so that it keeps the model loaded (if supported).
+            ttl (float): The time (in seconds) for which the result of a probe is trusted.
+            probe_interval (float): The time (in seconds) between background probes.
+            keep_alive_interval (float): The time (in seconds) between keep-alive pings.
+            failure_threshold (int): The number of consecutive failed requests after which the circuit opens.
+            reset_timeout (float): The time (in seconds) after which an open circuit lets a trial request through.
+            name (str): The name of the backend, for logging.
+            logger (Optional[Logger]): The logger to use for this instance (if any).
+        """
+        self.probe = probe
+        self.keep_alive = keep_alive
+        self.ttl = ttl
+        self.probe_interval = probe_interval
+        self.keep_alive_interval = keep_alive_interval
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.healthy: bool | None = None
+        self.probed_at = 0.0
+        self.kept_alive_at = 0.0
+        self.prober: threading.Thread | None = None
+
+    def _log(self, message: str):
+        """ Logs a change in backend health.
+
+        Args:
+            message (str): The message to log.
+        """
+        if self.logger is not None:
+            self.logger.warning(f'{self.name}: {message}')
+
+    def _open(self):
+        """ Opens the circuit, so that requests fail fast. Must be called with the lock held.
+        """
+        if self.state != CircuitState.OPEN:
+            self._log('Backend appears to be down. Failing requests fast.')
+        self.state = CircuitState.OPEN
+        self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+    def _run_probe(self):
+        """ Probes the backend and updates the cached health status accordingly.
+        """
+        healthy = self.probe()
+        with self.lock:
+            self.healthy = healthy
+            self.probed_at = time.monotonic()
+            if not healthy:
+                self._open()
+            elif self.state == CircuitState.OPEN:
+                self.opened_at = 0.0 # Probe says the backend is back, so allow a trial request right away.
+
+    def _probe_periodically(self):
+        """ Keeps the cached health status fresh and the model loaded, until the process exits.
+        """
+        while True:
+            self._run_probe()
+            now = time.monotonic()
+            if self.keep_alive is not None and self.healthy and now - self.kept_alive_at >= self.keep_alive_interval:
+                try:
+                    self.keep_alive()
+                    self.kept_alive_at = now
+                except Exception:
+                    pass # Next probe will pick up on any problem.
+            time.sleep(self.probe_interval)
+
+    def start(self):
+        """ Starts probing the backend in the background, so that the request path never has to.
+        """
+        if self.prober is None or not self.prober.is_alive():
+            self.prober = threading.Thread(target=self._probe_periodically, name=f'{self.name} prober', daemon=True)
+            self.prober.start()
+
+    def is_available(self) -> bool:
+        """ Checks whether a request would currently be let through (the circuit is not open, or it is time for a trial
+        request).
+
+        Returns:
+            bool: True if a request would be let through, otherwise False.
+        """
+        return self.state != CircuitState.OPEN or time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def before_request(self):
+        """ Checks that a request may be sent to the backend.
+
+        Raises:
+            ConnectionError: If the backend is known to be down.
+        """
+        # Only probe on the request path if the background prober has not done so recently.
+        if time.monotonic() - self.probed_at > self.ttl:
+            self._run_probe()
+
+        # Fail fast if the circuit is open, unless it is time for a trial request.
+        with self.lock:
+            if self.state == CircuitState.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise ConnectionError(f'Cannot connect to the LLM ({self.name} is down). Check your internet connection or ensure local service is running.')
+                self.state = CircuitState.HALF_OPEN
+            if self.state == CircuitState.HALF_OPEN:
+                if self.trial_in_flight:
+                    raise ConnectionError(f'Cannot connect to the LLM ({self.name} is recovering). Check your internet connection or ensure local service is running.')
+                self.trial_in_flight = True
+
+    def record_success(self):
+        """ Records that a request to the backend succeeded.
+        """
+        with self.lock:
+            if self.state != CircuitState.CLOSED:
+                self._log('Backend has recovered.')
+            self.state = CircuitState.CLOSED
+            self.consecutive_failures = 0
+            self.trial_in_flight = False
+
+    def record_unsent(self):
+        """ Records that a request was turned away before it reached the backend, which counts neither for nor against
+        its health (though frees up the trial request, if it was one).
+        """
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        """ Records that a request to the backend failed.
+        """
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.state == CircuitState.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self._open()
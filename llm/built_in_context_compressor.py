@@ -6,6 +6,7 @@ from kink import inject
 from llm.context_compressor import ContextCompressor
 from llm.large_language_model import ChatMessage
 from llm.large_language_model_factory import LargeLanguageModelFactory
+from llm.structured_output import parse_json
 from prompting.prompt_factory import PromptFactory
 
 
@@ -22,22 +23,18 @@ class BuiltInContextCompressor(ContextCompressor):
             large_language_model_factory (LargeLanguageModelFactory): The LLM factory to use to generate an LLM instance.
         """
         self.prompt_factory = prompt_factory
-        self.large_language_model = large_language_model_factory.get()
+        self.large_language_model = large_language_model_factory.get('compression')
         
     def _compress (self, chat_messages: Iterable[ChatMessage], callback: Callable[[Iterable[ChatMessage]], None]):
         compression_prompt = self.prompt_factory.get('context-compressor', {
             'context': json.dumps([chat_message.to_dict() for chat_message in chat_messages])
         })
 
-        # Pass to LLM.
-        result = self.large_language_model.get_next_message([ChatMessage('user', compression_prompt)]).content
-        
-        # Parse raw compressed context.
-        compressed_context_json = json.loads(result)
+        # Pass to LLM, parsing compressed context as it arrives and stopping it once complete (ignoring any prose around it).
+        compressed_context_json = parse_json(self.large_language_model.get_next_message_stream([ChatMessage('user', compression_prompt)]))
         compressed_chat_messages: List[ChatMessage] = []
         for compressed_chat_message_json in compressed_context_json:
             compressed_chat_messages.append(ChatMessage.from_dict(compressed_chat_message_json))
-        print(compressed_chat_messages)
 
         # Invoke callback with compressed context.
         callback(compressed_chat_messages)
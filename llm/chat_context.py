@@ -0,0 +1,106 @@
+from typing import Iterable, Iterator, List
+
+from llm.large_language_model import ChatMessage
+from llm.tokenizer import Tokenizer
+
+
+class ChatContext():
+    """ Represents the context window of an LLM, keeping a running count of the tokens in it.
+
+    Each message is tokenized once, when it is added, so that the size of the context can be read in constant time.
+    The context is versioned, so that anything working from a snapshot of it can tell whether the messages in the
+    snapshot have since been rewritten (rather than just added to).
+    """
+
+    tokens_per_message = 4
+    """ The number of tokens each message takes up in addition to its content (for its role and delimiters).
+    """
+
+    def __init__(self, tokenizer: Tokenizer, messages: Iterable[ChatMessage] = []):
+        """ Initializes a new instance of an LLM context window.
+
+        Args:
+            tokenizer (Tokenizer): The tokenizer to count tokens in messages with.
+            messages (Iterable[ChatMessage]): The messages initially in context (if any).
+        """
+        self.tokenizer = tokenizer
+        self.messages: List[ChatMessage] = []
+        self.token_counts: List[int] = []
+        self.token_count = 0
+        self.version = 0
+        for message in messages:
+            self.append(message)
+
+    def _count_tokens(self, message: ChatMessage) -> int:
+        """ Counts the number of tokens a message takes up in context.
+
+        Args:
+            message (ChatMessage): The message.
+        Returns:
+            int: The number of tokens the message takes up in context.
+        """
+        return self.tokenizer.count_tokens(message.content) + ChatContext.tokens_per_message
+
+    def append(self, message: ChatMessage):
+        """ Adds a message to the end of the context.
+
+        Args:
+            message (ChatMessage): The message to add.
+        """
+        token_count = self._count_tokens(message)
+        self.messages.append(message)
+        self.token_counts.append(token_count)
+        self.token_count += token_count
+
+    def pop(self) -> ChatMessage:
+        """ Removes the message at the end of the context (for example, a command that was interrupted before it got a response).
+
+        Returns:
+            ChatMessage: The message removed.
+        """
+        message = self.messages[-1]
+        self.token_count -= self.token_counts[-1]
+        self.messages = self.messages[:-1] # New lists, so readers of the old ones are unaffected.
+        self.token_counts = self.token_counts[:-1]
+        self.version += 1
+        return message
+
+    def replace_head(self, count: int, messages: Iterable[ChatMessage]):
+        """ Replaces messages at the start of the context (for example, with a compressed version of them).
+
+        Only the replacement messages are tokenized, since counts for the rest are already known.
+
+        Args:
+            count (int): The number of messages to replace.
+            messages (Iterable[ChatMessage]): The messages to replace them with.
+        """
+        replacement = ChatContext(self.tokenizer, messages)
+        self.token_count += replacement.token_count - sum(self.token_counts[:count])
+        self.messages = [*replacement.messages, *self.messages[count:]] # New lists, so readers of the old ones are unaffected.
+        self.token_counts = [*replacement.token_counts, *self.token_counts[count:]]
+        self.version += 1
+
+    def replace(self, message: ChatMessage, replacement: ChatMessage) -> bool:
+        """ Replaces a message in the context (for example, a placeholder with the real thing).
+
+        Args:
+            message (ChatMessage): The message to replace (matched by identity, not content).
+            replacement (ChatMessage): The message to replace it with.
+        Returns:
+            bool: True if the message was replaced, or False if it is no longer in context (for example, if it has since been compressed).
+        """
+        for index, existing_message in enumerate(self.messages):
+            if existing_message is message:
+                token_count = self._count_tokens(replacement)
+                self.token_count += token_count - self.token_counts[index]
+                self.messages = [*self.messages[:index], replacement, *self.messages[index + 1:]]
+                self.token_counts = [*self.token_counts[:index], token_count, *self.token_counts[index + 1:]]
+                self.version += 1
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __iter__(self) -> Iterator[ChatMessage]:
+        return iter(self.messages)
@@ -0,0 +1,226 @@
+from dataclasses import dataclass
+from logging import Logger
+import os
+import queue
+import threading
+import time
+from typing import List, Optional
+
+from llm.chat_context import ChatContext
+from llm.context_compressor import ContextCompressor
+from llm.large_language_model import ChatMessage
+from llm.shell_state_record import ShellStateRecord
+
+
+@dataclass
+class CompressionStats():
+    """ A snapshot of how context compression has gone so far.
+    """
+
+    started: int
+    """ The number of compressions started.
+    """
+
+    merged: int
+    """ The number of compressions whose result was merged into the context.
+    """
+
+    discarded: int
+    """ The number of compressions whose result was thrown away, because the context was rewritten in the meantime.
+    """
+
+    failed: int
+    """ The number of compressions that failed.
+    """
+
+    trimmed: int
+    """ The number of times the oldest turns were dropped to keep the context under the high watermark.
+    """
+
+    last_duration: float
+    """ The time (in seconds) the last compression took.
+    """
+
+    mean_duration: float
+    """ The average time (in seconds) compressions have taken.
+    """
+
+
+class CompressionJob():
+    """ A compression of a snapshot of an LLM context, done in the background.
+    """
+
+    def __init__(self, context: ChatContext):
+        """ Initializes a new instance of a compression of a snapshot of an LLM context.
+
+        Args:
+            context (ChatContext): The context to snapshot.
+        """
+        self.context = context
+        self.version = context.version
+        self.messages = list(context.messages) # Appending to the context leaves the snapshot as it is.
+        self.token_count = context.token_count
+        self.result: Optional[List[ChatMessage]] = None
+        self.error: Optional[Exception] = None
+        self.duration = 0.0
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+
+
+class ContextCompressionScheduler():
+    """ Compresses an LLM context in the background as it grows, without ever holding up the shell.
+
+    Compression starts once the context passes a low watermark, well before it gets too big, on a snapshot of the
+    context that is merged back in (along with any turns appended since) once compression finishes. If the context has
+    been rewritten in the meantime, the result is thrown away instead. If the context passes a high watermark before
+    compression catches up, its oldest turns are dropped so that requests to the LLM never grow without bound.
+
+    Compressions are run one at a time on a single worker, and a new one is not started until the last has been dealt
+    with.
+    """
+
+    pinned_messages = 2
+    """ The number of messages at the start of the context never dropped to keep it under the high watermark (the system prompt and the LLM's response to it).
+    """
+
+    def __init__(self, context_compressor: ContextCompressor, low_watermark: int, high_watermark: Optional[int], logger: Logger):
+        """ Initializes a new instance of a scheduler for compressing an LLM context in the background.
+
+        Args:
+            context_compressor (ContextCompressor): The context compressor to compress the context with.
+            low_watermark (int): The size (in tokens) of context past which to start compressing it.
+            high_watermark (Optional[int]): The size (in tokens) of context past which to drop its oldest turns (if any).
+            logger (Logger): The logger to use for this instance.
+        """
+        self.context_compressor = context_compressor
+        self.low_watermark = low_watermark
+        self.high_watermark = max(high_watermark, low_watermark) if high_watermark is not None else None
+        self.logger = logger
+        self.jobs: queue.Queue[CompressionJob] = queue.Queue(maxsize=1)
+        self.job: Optional[CompressionJob] = None
+        self.worker_pid: int | None = None
+
+        # Counters for timing and outcomes.
+        self.started = 0
+        self.merged = 0
+        self.discarded = 0
+        self.failed = 0
+        self.trimmed = 0
+        self.timed = 0
+        self.last_duration = 0.0
+        self.total_duration = 0.0
+
+    def _run_worker(self):
+        """ Runs in the background to compress snapshots one at a time.
+        """
+        while True:
+            job = self.jobs.get()
+            if job.cancelled.is_set():
+                job.done.set() # No longer wanted.
+                continue
+            started_at = time.monotonic()
+            try:
+                job.result = self.context_compressor.compress(job.messages)
+            except Exception as e:
+                job.error = e
+            finally:
+                job.duration = time.monotonic() - started_at
+                job.done.set()
+
+    def schedule(self, context: ChatContext) -> bool:
+        """ Starts compressing a snapshot of an LLM context in the background, if it has passed the low watermark and no
+        compression is already under way.
+
+        Args:
+            context (ChatContext): The context.
+        Returns:
+            bool: True if compression was started, otherwise False.
+        """
+        if self.job is not None or context.token_count <= self.low_watermark:
+            return False
+        if self.worker_pid != os.getpid():
+            self.jobs = queue.Queue(maxsize=1) # Compressions started by the parent of a forked process are not ours to finish.
+            self.worker_pid = os.getpid()
+            threading.Thread(target=self._run_worker, name='context-compression', daemon=True).start()
+        self.job = CompressionJob(context)
+        self.jobs.put_nowait(self.job)
+        self.started += 1
+        self.logger.debug(f'Compressing context in background. Starting length {context.token_count} tokens.')
+        return True
+
+    def apply(self, context: ChatContext):
+        """ Merges a finished compression into an LLM context (without waiting for one still under way), then drops its
+        oldest turns if it is still past the high watermark.
+
+        Args:
+            context (ChatContext): The context.
+        """
+        job = self.job
+        if job is not None and job.done.is_set():
+            self.job = None
+            self._merge(job, context)
+        if self.high_watermark is not None and context.token_count > self.high_watermark:
+            self._trim(context)
+
+    def _merge(self, job: CompressionJob, context: ChatContext):
+        """ Merges a finished compression into an LLM context, in place of the snapshot it was made from.
+
+        Args:
+            job (CompressionJob): The compression.
+            context (ChatContext): The context.
+        """
+        if not job.cancelled.is_set(): # Abandoned compressions may not have run at all.
+            self.timed += 1
+            self.last_duration = job.duration
+            self.total_duration += job.duration
+        if job.error is not None:
+            self.failed += 1
+            self.logger.warning(f'Could not compress context: {job.error}')
+            return
+        if job.cancelled.is_set() or job.context is not context or job.version != context.version:
+            self.discarded += 1
+            self.logger.debug('Discarded compressed context, as the context was rewritten while it was being compressed.')
+            return
+        if len(job.result) != len(job.messages) or any(compressed is not message for compressed, message in zip(job.result, job.messages)):
+            context.replace_head(len(job.messages), job.result) # Turns appended since the snapshot stay as they are.
+        self.merged += 1
+        stats = self.get_stats()
+        self.logger.debug(f'Finished compressing context in {round(job.duration, 3)}s ({round(stats.mean_duration, 3)}s average). Snapshot of {job.token_count} tokens, ending length {context.token_count} tokens.')
+
+    def _trim(self, context: ChatContext):
+        """ Drops the oldest turns (after those pinned, and any state summary) from an LLM context until it is back under
+        the high watermark, keeping at least the latest exchange. Any compression under way is abandoned, as it would no longer fit.
+
+        Args:
+            context (ChatContext): The context.
+        """
+        pinned = min(ContextCompressionScheduler.pinned_messages, len(context))
+        if pinned + 1 < len(context) and context.messages[pinned].content.startswith(ShellStateRecord.header):
+            pinned += 2 # Keep the summary of the state of the system, which stands in for turns already dropped.
+        excess = context.token_count - self.high_watermark
+        count = 0
+        while excess > 0 and pinned + count + 2 < len(context):
+            excess -= context.token_counts[pinned + count] + context.token_counts[pinned + count + 1] # A command and its output.
+            count += 2
+        if count == 0:
+            return
+        context.replace_head(pinned + count, context.messages[:pinned])
+        if self.job is not None:
+            self.job.cancelled.set()
+        self.trimmed += 1
+        self.logger.debug(f'Dropped the oldest {count} messages to stay under the high watermark. Context size now stands at {context.token_count} tokens.')
+
+    def get_stats(self) -> CompressionStats:
+        """ Takes a snapshot of how context compression has gone so far.
+
+        Returns:
+            CompressionStats: The snapshot.
+        """
+        return CompressionStats(
+            started=self.started,
+            merged=self.merged,
+            discarded=self.discarded,
+            failed=self.failed,
+            trimmed=self.trimmed,
+            last_duration=self.last_duration,
+            mean_duration=self.total_duration / self.timed if self.timed > 0 else 0.0)
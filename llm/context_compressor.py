@@ -1,6 +1,4 @@
 from abc import ABC, abstractmethod
-import json
-import threading
 from typing import Callable, Iterable, List
 
 from kink import inject
@@ -27,16 +25,20 @@ class ContextCompressor(ABC):
         """
         raise NotImplementedError("Cannot use an abstract context compressor.")
 
-    def compress (self, chat_messages: Iterable[ChatMessage], callback: Callable[[Iterable[ChatMessage]], None]):
-        """ Compresses an LLM context.
+    def compress (self, chat_messages: Iterable[ChatMessage]) -> List[ChatMessage]:
+        """ Compresses an LLM context on the calling thread (see `ContextCompressionScheduler` to do so in the background).
 
-        This method implementes threading and should not be overridden. Override `_compress` instead.
+        This method should not be overridden. Override `_compress` instead.
         
         Args:
             chat_messages (Iterable[ChatMessage]): The chat messages to compress.
-            callback (Callable[[Iterable[ChatMessage]]): The callback to invoke when context compression is finished.
         Returns:
-            Iterable[ChatMessage]: The compressed chat messages.
+            List[ChatMessage]: The compressed chat messages.
+        Raises:
+            RuntimeError: If the context compressor finished without calling back.
         """
-        self.thread = threading.Thread(target=self._compress, args=[chat_messages, callback])
-        self.thread.start()
+        results: List[List[ChatMessage]] = []
+        self._compress(chat_messages, lambda compressed_chat_messages: results.append(list(compressed_chat_messages)))
+        if len(results) == 0:
+            raise RuntimeError('Context compressor finished without calling back.')
+        return results[0]
@@ -0,0 +1,42 @@
+from kink import inject
+
+from config.config_provider import ConfigProvider, ContextCompressionConfig
+from llm.built_in_context_compressor import BuiltInContextCompressor
+from llm.context_compressor import ContextCompressor
+from llm.passthrough_context_compressor import PassthroughContextCompressor
+from llm.sliding_window_context_compressor import SlidingWindowContextCompressor
+from llm.structured_state_context_compressor import StructuredStateContextCompressor
+from llm.tokenizer_factory import TokenizerFactory
+
+
+@inject
+class ContextCompressorFactory():
+    """ A factory for creating context compressor instances depending on application-level configuration.
+    """
+
+    def __init__(self, config_provider: ConfigProvider, tokenizer_factory: TokenizerFactory):
+        """ Initializes a new instance of a factory for creating context compressor instances depending on application-level configuration.
+
+        Args:
+            config_provider (ConfigProvider): The application-level configuration provider.
+            tokenizer_factory (TokenizerFactory): The tokenizer factory to get the tokenizer from, for compressors that count tokens.
+        """
+        self.config_provider = config_provider
+        self.tokenizer_factory = tokenizer_factory
+
+    def get(self) -> ContextCompressor:
+        """ Returns a newly-constructed context compressor based on application-level configuration.
+
+        Returns:
+            ContextCompressor: The newly-constructed context compressor.
+        """
+        context_compression_config = self.config_provider.get().context_compression or ContextCompressionConfig()
+        if context_compression_config.compressor == 'built_in':
+            return BuiltInContextCompressor()
+        if context_compression_config.compressor == 'structured_state':
+            return StructuredStateContextCompressor(context_compression_config.recent_exchanges)
+        if context_compression_config.compressor == 'sliding_window':
+            return SlidingWindowContextCompressor(
+                self.tokenizer_factory.get(),
+                context_compression_config.window_tokens)
+        return PassthroughContextCompressor()
@@ -0,0 +1,62 @@
+from typing import Callable, List, Union
+
+from llm.backend_health_monitor import BackendHealthMonitor, CircuitState
+
+
+class DelegatingHealthMonitor():
+    """ Stands in for the health monitor of an LLM that wraps other LLMs (to schedule, hedge or route their requests),
+    leaving the health of each backend to be tracked by the monitors of the LLMs wrapped.
+
+    Requests are only counted by the monitors of the backends they reach, so a failure is never counted twice and a
+    wrapper never trips a circuit of its own in front of every backend it wraps. Requests fail fast if none of the
+    backends wrapped would let them through.
+    """
+
+    def __init__(self, get_health_monitors: Callable[[], List[Union[BackendHealthMonitor, 'DelegatingHealthMonitor']]]):
+        """ Initializes a new instance of a stand-in for the health monitor of an LLM that wraps other LLMs.
+
+        Args:
+            get_health_monitors (Callable[[], List[Union[BackendHealthMonitor, 'DelegatingHealthMonitor']]]): Gets the monitors of the LLMs wrapped.
+        """
+        self.get_health_monitors = get_health_monitors
+
+    def is_available(self) -> bool:
+        """ Checks whether a request would currently be let through to at least one of the backends wrapped.
+
+        Returns:
+            bool: True if a request would be let through, otherwise False.
+        """
+        return any(health_monitor.is_available() for health_monitor in self.get_health_monitors())
+
+    @property
+    def state(self) -> CircuitState:
+        """ The state of the circuit, which is only open if the circuits of all backends wrapped are open.
+        """
+        if any(health_monitor.state != CircuitState.OPEN for health_monitor in self.get_health_monitors()):
+            return CircuitState.CLOSED
+        return CircuitState.OPEN
+
+    def start(self):
+        """ Does nothing, as the monitors of the backends wrapped do their own probing.
+        """
+
+    def before_request(self):
+        """ Checks that a request may be sent to at least one of the backends wrapped.
+
+        Raises:
+            ConnectionError: If all of the backends wrapped are known to be down.
+        """
+        if not self.is_available():
+            raise ConnectionError('Cannot connect to the LLM (all backends are down). Check your internet connection or ensure local service is running.')
+
+    def record_success(self):
+        """ Does nothing, as the request was counted by the monitor of the backend it reached.
+        """
+
+    def record_unsent(self):
+        """ Does nothing, as the request was counted by the monitor of the backend it reached (if any).
+        """
+
+    def record_failure(self):
+        """ Does nothing, as the request was counted by the monitor of the backend it reached (if any).
+        """
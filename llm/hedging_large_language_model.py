@@ -0,0 +1,193 @@
+import multiprocessing
+import queue
+import threading
+import time
+from typing import Iterable, Iterator, List, Optional
+
+from llm.delegating_health_monitor import DelegatingHealthMonitor
+from llm.large_language_model import ChatMessage, GenerationLimits, LargeLanguageModel, StreamAbandonment
+
+
+class LatencyTracker():
+    """ Keeps a window of recent LLM response latencies, from which percentiles can be estimated.
+
+    The window lives in shared memory, so that if it is created before forking (as the daemon does) every worker process
+    learns from the latencies observed by all the others, rather than starting from nothing with each session.
+    """
+
+    def __init__(self, window: int = 200):
+        """ Initializes a new window of recent LLM response latencies.
+
+        Args:
+            window (int): The number of most recent latencies to keep.
+        """
+        self.lock = multiprocessing.Lock()
+        self.latencies = multiprocessing.RawArray('d', window)
+        self.count = multiprocessing.RawValue('i', 0)
+
+    def record(self, latency: float):
+        """ Records the latency of an LLM response.
+
+        Args:
+            latency (float): The latency (in seconds).
+        """
+        with self.lock:
+            self.latencies[self.count.value % len(self.latencies)] = latency
+            self.count.value += 1
+
+    def get_percentile(self, percentile: float, minimum_samples: int = 20) -> Optional[float]:
+        """ Estimates a percentile of recent LLM response latencies.
+
+        Args:
+            percentile (float): The percentile (between 0 and 1).
+            minimum_samples (int): The number of latencies that must have been recorded for an estimate to be made.
+        Returns:
+            Optional[float]: The estimate (in seconds), or None if too few latencies have been recorded yet.
+        """
+        with self.lock:
+            latencies: List[float] = sorted(self.latencies[:min(self.count.value, len(self.latencies))])
+        if len(latencies) < minimum_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(percentile * len(latencies)))]
+
+
+class HedgingLargeLanguageModel(LargeLanguageModel):
+    """ Represents a large language model (LLM) that hedges slow requests by sending them to a second LLM as well.
+
+    If the primary LLM has not started responding within the given percentile of recent latencies (time to first chunk),
+    the same request is sent to the secondary LLM. Whichever starts responding first is used, and the other is abandoned.
+    """
+
+    def __init__(
+            self,
+            primary: LargeLanguageModel,
+            secondary: LargeLanguageModel,
+            latency_tracker: LatencyTracker,
+            percentile: float = 0.95,
+            minimum_delay: float = 0.5):
+        """ Initializes a new instance of a large language model (LLM) that hedges slow requests by sending them to a second LLM as well.
+
+        Args:
+            primary (LargeLanguageModel): The LLM to send every request to.
+            secondary (LargeLanguageModel): The LLM to send slow requests to as well.
+            latency_tracker (LatencyTracker): The window of recent latencies to decide when a request is slow from.
+            percentile (float): The percentile of recent latencies after which to hedge a request.
+            minimum_delay (float): The minimum time (in seconds) to wait before hedging a request.
+        """
+        super(HedgingLargeLanguageModel, self).__init__(health_monitor=DelegatingHealthMonitor(lambda: [self.primary.health_monitor, self.secondary.health_monitor]))
+        self.primary = primary
+        self.secondary = secondary
+        self.latency_tracker = latency_tracker
+        self.percentile = percentile
+        self.minimum_delay = minimum_delay
+
+    def _check_connectivity(self) -> bool:
+        return self.health_monitor.is_available()
+
+    def _get_hedge_delay(self) -> Optional[float]:
+        """ Gets the time to wait for the primary LLM to start responding before hedging a request.
+
+        Returns:
+            Optional[float]: The time (in seconds), or None if not enough is known about latency yet to hedge.
+        """
+        latency = self.latency_tracker.get_percentile(self.percentile)
+        return None if latency is None else max(self.minimum_delay, latency)
+
+    @staticmethod
+    def _pump(attempt: int, chunks: Iterator[str], output: queue.Queue, abandonment: StreamAbandonment):
+        """ Runs in the background to pass the chunks of a response from an LLM into a queue, until abandoned.
+
+        Args:
+            attempt (int): The number identifying the request.
+            chunks (Iterator[str]): The chunks of the response.
+            output (queue.Queue): The queue to pass chunks into, along with the number identifying the request.
+            abandonment (StreamAbandonment): Abandoned once the response is no longer wanted (which also aborts the request).
+        """
+        try:
+            for chunk in chunks:
+                if abandonment.abandoned:
+                    break
+                output.put((attempt, chunk, None))
+            else:
+                output.put((attempt, None, None))
+        except Exception as e:
+            output.put((attempt, None, e))
+        finally:
+            chunks.close() # Closing the stream stops the backend generating tokens nobody will read.
+
+    def _get_next_message(self, messages: Iterable[ChatMessage], limits: Optional[GenerationLimits] = None) -> ChatMessage:
+        return ChatMessage('system', ''.join(self._get_next_message_stream(messages, limits=limits)))
+
+    def _get_next_message_stream(self, messages: Iterable[ChatMessage], json_mode: bool = False, limits: Optional[GenerationLimits] = None) -> Iterator[str]:
+        messages = list(messages)
+        output: queue.Queue = queue.Queue()
+        attempts: List[GenerationLimits] = []
+        started_at = time.monotonic()
+
+        def start(large_language_model: LargeLanguageModel):
+            attempt_limits = GenerationLimits(
+                stop=[] if limits is None else limits.stop,
+                max_tokens=None if limits is None else limits.max_tokens,
+                abandonment=StreamAbandonment(),
+                excluded_backends=set(backend for backend in [attempt.backend for attempt in attempts] if backend is not None)) # Hedge away from where the request is stuck.
+            attempts.append(attempt_limits)
+            threading.Thread(
+                target=HedgingLargeLanguageModel._pump,
+                args=(len(attempts) - 1, large_language_model.get_next_message_stream(messages, json_mode, attempt_limits), output, attempt_limits.abandonment),
+                daemon=True).start()
+
+        def abandon():
+            for attempt in attempts:
+                attempt.abandonment.abandon()
+
+        # Abandon every request sent if this response is abandoned.
+        abandonment = None if limits is None else limits.abandonment
+        if abandonment is not None:
+            abandonment.on_abandon(abandon)
+
+        # Wait for the first response to start, hedging once the primary is slow (or straight away if it fails).
+        start(self.primary)
+        hedge_delay = self._get_hedge_delay()
+        failures = 0
+        winner: Optional[int] = None
+        try:
+            while winner is None:
+                try:
+                    wait = None if hedge_delay is None or len(attempts) > 1 else max(0, started_at + hedge_delay - time.monotonic())
+                    attempt, chunk, error = output.get(timeout=wait)
+                except queue.Empty:
+                    start(self.secondary)
+                    continue
+                if error is not None:
+                    failures += 1
+                    if failures == len(attempts) and len(attempts) > 1:
+                        raise error # Both requests failed.
+                    if len(attempts) == 1:
+                        start(self.secondary)
+                    continue
+                winner = attempt
+                self.latency_tracker.record(time.monotonic() - started_at)
+                for loser, attempt_limits in enumerate(attempts):
+                    if loser != winner:
+                        attempt_limits.abandonment.abandon() # Abort the loser straight away, even if it is stuck.
+                if chunk is None:
+                    return # Empty response.
+                yield chunk
+
+            # Pass on the rest of the winning response.
+            while True:
+                attempt, chunk, error = output.get()
+                if attempt != winner:
+                    continue
+                if error is not None:
+                    raise error
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            if limits is not None and winner is not None:
+                limits.truncated = attempts[winner].truncated
+                limits.backend = attempts[winner].backend
+            if abandonment is not None:
+                abandonment.forget(abandon)
+            abandon()
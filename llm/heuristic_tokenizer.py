@@ -0,0 +1,15 @@
+from llm.tokenizer import Tokenizer
+
+
+class HeuristicTokenizer(Tokenizer):
+    """ Represents a tokenizer that estimates the number of tokens in a string from its length.
+
+    Uses the rule of thumb here: https://help.openai.com/en/articles/4936856-what-are-tokens-and-how-to-count-them
+    """
+
+    chars_per_token = 4
+    """ The average number of characters per token in English text.
+    """
+
+    def count_tokens(self, text: str) -> int:
+        return len(text) // HeuristicTokenizer.chars_per_token
@@ -1,9 +1,14 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Iterable, Literal
+from dataclasses import dataclass, field
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Literal, Optional, Set
 
 from dataclasses_json import dataclass_json
 
+from llm.backend_health_monitor import BackendHealthMonitor
+from llm.delegating_health_monitor import DelegatingHealthMonitor
+
 
 @dataclass_json
 @dataclass
@@ -20,17 +25,108 @@ class ChatMessage():
     """
 
 
+class StreamAbandonment():
+    """ Lets a streamed response be abandoned from another thread, aborting the request to the backend straight away
+    instead of once the thread reading the response next hears from the backend.
+    """
+
+    def __init__(self):
+        """ Initializes a new instance of a means of abandoning a streamed response from another thread.
+        """
+        self.lock = threading.Lock()
+        self.abandoned = False
+        self.callbacks: List[Callable[[], None]] = []
+
+    def on_abandon(self, callback: Callable[[], None]):
+        """ Registers a callback that aborts the request, to be called when the response is abandoned (or straight away,
+        if it already has been).
+
+        Args:
+            callback (Callable[[], None]): Aborts the request.
+        """
+        with self.lock:
+            if not self.abandoned:
+                self.callbacks.append(callback)
+                return
+        callback()
+
+    def forget(self, callback: Callable[[], None]):
+        """ Unregisters a callback once the request it aborts has finished. Once this returns, the callback will not be
+        called (so that it cannot abort anything that reuses the connection).
+
+        Args:
+            callback (Callable[[], None]): The callback.
+        """
+        with self.lock:
+            if callback in self.callbacks:
+                self.callbacks.remove(callback)
+
+    def abandon(self):
+        """ Abandons the response, aborting the request to the backend.
+        """
+        with self.lock:
+            self.abandoned = True
+            for callback in self.callbacks:
+                callback()
+            self.callbacks.clear()
+
+
+@dataclass
+class GenerationLimits():
+    """ Limits on how much an LLM may generate in response to a request.
+    """
+
+    stop: List[str] = field(default_factory=list)
+    """ Sequences at which to stop generating (not included in the response).
+    """
+
+    max_tokens: Optional[int] = None
+    """ The maximum number of tokens to generate (if any).
+    """
+
+    truncated: bool = False
+    """ Set by the LLM if it stopped generating because it reached `max_tokens`.
+    """
+
+    abandonment: Optional[StreamAbandonment] = None
+    """ Lets the response be abandoned from another thread while it is being streamed (if given).
+    """
+
+    excluded_backends: Set[str] = field(default_factory=set)
+    """ The names of backends not to send the request to, if the LLM routes requests between backends.
+    """
+
+    backend: Optional[str] = None
+    """ Set by the LLM to the name of the backend the request was sent to, if it routes requests between backends.
+    """
+
+
+class BackpressureError(ConnectionError):
+    """ Raised when a request to an LLM is turned away before it is sent (for example, because too many are waiting),
+    which says nothing about the health of the backend.
+    """
+
+
+LargeLanguageModelRole = Literal['command', 'guard', 'compression']
+""" What an LLM is asked to do: respond to shell commands, judge output for a guard or compress context.
+"""
+
+
 class LargeLanguageModel(ABC):
     """ Represents an abstract large language model.
     """
     
-    def __init__(self, temperature=0.0001):
+    def __init__(self, temperature=0.0001, health_monitor: Optional[BackendHealthMonitor | DelegatingHealthMonitor] = None, deadline: Optional[float] = None):
         """ Abstract constructor for a large language model.
         
         Args:
             temperature (float): The temperature to use for the LLM.
+            health_monitor (Optional[BackendHealthMonitor | DelegatingHealthMonitor]): The monitor tracking the health of the LLM backend (by default, one probing it on the request path).
+            deadline (Optional[float]): The time (in seconds) after which to give up on a request (if any).
         """
         self.temperature = temperature
+        self.health_monitor = health_monitor if health_monitor is not None else BackendHealthMonitor(lambda: self._check_connectivity())
+        self.deadline = deadline
         
     @abstractmethod
     def _check_connectivity (self) -> bool:
@@ -42,29 +138,90 @@ class LargeLanguageModel(ABC):
         raise NotImplementedError("Cannot check for connectivity to an abstract LLM.")
     
     @abstractmethod
-    def _get_next_message (self, messages: Iterable[ChatMessage]) -> ChatMessage:
+    def _get_next_message (self, messages: Iterable[ChatMessage], limits: Optional[GenerationLimits] = None) -> ChatMessage:
         """ Sends a list of messages to an LLM and returns the next message suggested by the model.
 
-        Override this method, rather than `get_next_message`, in concrete implementations of this class.
+        Override this method, rather than `get_next_message`, in concrete implementations of this class. Implementations
+        should raise `TimeoutError` if no response has been received once `deadline` (if any) has passed, and should set
+        `truncated` on `limits` (if given) if the response was cut short by `max_tokens`.
 
         Args:
             messages (Iterable[ChatMessage]): Messages currently in context.
+            limits (Optional[GenerationLimits]): Limits on how much the LLM may generate (if any).
         Returns:
             ChatMessage: The LLM's response to the prompt.
         """
         raise NotImplementedError("Cannot query an abstract LLM.")
 
-    def get_next_message (self, messages: Iterable[ChatMessage]) -> ChatMessage:
+    def _get_next_message_stream (self, messages: Iterable[ChatMessage], json_mode: bool = False, limits: Optional[GenerationLimits] = None) -> Iterator[str]:
+        """ Sends a list of messages to an LLM and streams back the next message suggested by the model as it is generated.
+
+        Override this method, rather than `get_next_message_stream`, in concrete implementations of this class. The
+        default implementation yields the whole message as a single chunk once it has been generated. Implementations
+        that can should abort the request when the response is abandoned through `limits` (if given), ending the stream
+        without error.
+
+        Args:
+            messages (Iterable[ChatMessage]): Messages currently in context.
+            json_mode (bool): Whether to constrain the response to a JSON object (ignored if the backend does not support this).
+            limits (Optional[GenerationLimits]): Limits on how much the LLM may generate (if any).
+        Returns:
+            Iterator[str]: The chunks of the LLM's response to the prompt. Closing the iterator early abandons generation.
+        """
+        yield self._get_next_message(messages, limits).content
+
+    def get_next_message (self, messages: Iterable[ChatMessage], limits: Optional[GenerationLimits] = None) -> ChatMessage:
         """ Sends a list of messages to an LLM and returns the next message suggested by the model.
         
-        This method implementes a connectivity check and should not be overridden. Override `_get_next_message` instead.
+        This method implementes backend health tracking and should not be overridden. Override `_get_next_message` instead.
 
         Args:
             messages (Iterable[ChatMessage]): Messages currently in context.
+            limits (Optional[GenerationLimits]): Limits on how much the LLM may generate (if any).
         Returns:
             ChatMessage: The LLM's response to the prompt.
         """
-        if self._check_connectivity():
-            raise ConnectionError("Cannot connect to the LLM. Check your internet connection or ensure local service is running.")
-        return self._get_next_message(messages)
-    
\ No newline at end of file
+        self.health_monitor.before_request()
+        try:
+            message = self._get_next_message(messages, limits)
+        except BackpressureError as e:
+            self.health_monitor.record_unsent() # Never reached the backend.
+            raise e
+        except Exception as e:
+            self.health_monitor.record_failure()
+            raise e
+        self.health_monitor.record_success()
+        return message
+
+    def get_next_message_stream (self, messages: Iterable[ChatMessage], json_mode: bool = False, limits: Optional[GenerationLimits] = None) -> Iterator[str]:
+        """ Sends a list of messages to an LLM and streams back the next message suggested by the model as it is generated.
+
+        This method implementes backend health tracking and should not be overridden. Override `_get_next_message_stream` instead.
+
+        Args:
+            messages (Iterable[ChatMessage]): Messages currently in context.
+            json_mode (bool): Whether to constrain the response to a JSON object (ignored if the backend does not support this).
+            limits (Optional[GenerationLimits]): Limits on how much the LLM may generate (if any).
+        Returns:
+            Iterator[str]: The chunks of the LLM's response to the prompt. Closing the iterator early abandons generation.
+        """
+        self.health_monitor.before_request()
+        started_at = time.monotonic()
+        chunks = self._get_next_message_stream(messages, json_mode, limits)
+        try:
+            for chunk in chunks:
+                if self.deadline is not None and time.monotonic() - started_at > self.deadline:
+                    raise TimeoutError(f'The LLM did not finish responding within {self.deadline} seconds.')
+                yield chunk
+        except GeneratorExit as e:
+            self.health_monitor.record_success() # Abandoned by the caller, but the backend was responding.
+            raise e
+        except BackpressureError as e:
+            self.health_monitor.record_unsent() # Never reached the backend.
+            raise e
+        except Exception as e:
+            self.health_monitor.record_failure()
+            raise e
+        finally:
+            chunks.close() # Stop generation if abandoned or out of time.
+        self.health_monitor.record_success()
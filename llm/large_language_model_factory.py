@@ -1,10 +1,18 @@
-from typing import Dict
+from logging import Logger
+from typing import Callable, Dict, Optional
 
+import httpx
 from kink import inject
+from openai import OpenAI
 
-from config.config_provider import ConfigProvider
+from config.config_provider import BackendConfig, Config, ConfigProvider
+from llm.backend_health_monitor import BackendHealthMonitor
+from llm.hedging_large_language_model import HedgingLargeLanguageModel, LatencyTracker
+from llm.large_language_model import LargeLanguageModel, LargeLanguageModelRole
 from llm.ollama_large_language_model import OllamaLargeLanguageModel
 from llm.openai_large_language_model import OpenaiLargeLanguageModel
+from llm.request_scheduler import RequestScheduler, ScheduledLargeLanguageModel
+from llm.routing_large_language_model import BackendStats, RoutedBackend, RoutingLargeLanguageModel
 
 
 @inject
@@ -33,27 +41,246 @@ class LargeLanguageModelFactory():
     """ The names of all OpenAI models supported by the application.
     """
 
-    def __init__(self, config_provider: ConfigProvider):
+    def __init__(self, config_provider: ConfigProvider, logger: Logger):
         """ Initializes a new instance of a factory for creating large language model (LLM) instances depending on application-level configuration.
 
         Args:
             config_provider (ConfigProvider): The application-level configuration provider.
+            logger (Logger): The logger to use for any health monitors created.
         """
-        self.config = config_provider.get()
+        self.config_provider = config_provider
+        self.logger = logger
+
+        # Every LLM instance talking to the same endpoint shares a health monitor and a client (with its connection pool).
+        self.health_monitors: Dict[str, BackendHealthMonitor] = {}
+        self.clients: Dict[tuple[str | None, str], OpenAI] = {}
+
+        # Every router sending requests to the same backend tracks them with the same counters.
+        self.backend_stats: Dict[str, BackendStats] = {}
+
+        # Created up front so that processes forked afterwards learn from each other's response latencies.
+        self.latency_tracker = LatencyTracker()
+
+        # Every LLM instance waits its turn with the same scheduler (if enabled).
+        self.scheduler: Optional[RequestScheduler] = None
+
+    def _get_client(self, base_url: Optional[str], api_key: str) -> OpenAI:
+        """ Gets the API client for an endpoint, creating one (with its own pool of keep-alive connections) if there isn't one yet.
+
+        Args:
+            base_url (Optional[str]): The base URL of the endpoint (or None for the OpenAI API).
+            api_key (str): The API key to use.
+        Returns:
+            OpenAI: The API client for the endpoint.
+        """
+        if (base_url, api_key) not in self.clients:
+            connection_pool_config = self.config_provider.get().connection_pool
+            timeout = httpx.Timeout(connection_pool_config.request_timeout, connect=connection_pool_config.connect_timeout)
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=connection_pool_config.max_connections,
+                    max_keepalive_connections=connection_pool_config.max_keepalive_connections,
+                    keepalive_expiry=connection_pool_config.keepalive_expiry),
+                timeout=timeout)
+            self.clients[(base_url, api_key)] = OpenAI(base_url=base_url, api_key=api_key, http_client=http_client, timeout=timeout)
+        return self.clients[(base_url, api_key)]
+
+    def _get_health_monitor(self, endpoint: str, probe: Callable[[], bool], keep_alive: Optional[Callable[[], None]] = None) -> BackendHealthMonitor:
+        """ Gets the health monitor for an endpoint, creating and starting one if there isn't one yet.
+
+        Args:
+            endpoint (str): Identifies the endpoint (and model) to monitor.
+            probe (Callable[[], bool]): Checks whether the endpoint is reachable.
+            keep_alive (Optional[Callable[[], None]]): Pings the endpoint so that it keeps the model loaded (if supported).
+        Returns:
+            BackendHealthMonitor: The health monitor for the endpoint.
+        """
+        if endpoint not in self.health_monitors:
+            health_check_config = self.config_provider.get().health_check
+            health_monitor = BackendHealthMonitor(
+                probe,
+                keep_alive=keep_alive,
+                ttl=health_check_config.ttl,
+                probe_interval=health_check_config.probe_interval,
+                keep_alive_interval=health_check_config.keep_alive_interval,
+                failure_threshold=health_check_config.failure_threshold,
+                reset_timeout=health_check_config.reset_timeout,
+                name=endpoint,
+                logger=self.logger)
+            health_monitor.start()
+            self.health_monitors[endpoint] = health_monitor
+        return self.health_monitors[endpoint]
     
-    def get(self):
+    def _get_backend_stats(self, endpoint: str) -> BackendStats:
+        """ Gets the counters tracking the load on a routed backend, creating them if there aren't any yet.
+
+        Args:
+            endpoint (str): Identifies the backend (and model).
+        Returns:
+            BackendStats: The counters for the backend.
+        """
+        if endpoint not in self.backend_stats:
+            self.backend_stats[endpoint] = BackendStats()
+        return self.backend_stats[endpoint]
+
+    def _get_scheduler(self) -> RequestScheduler:
+        """ Gets the scheduler for LLM requests, creating it if there isn't one yet.
+
+        Returns:
+            RequestScheduler: The scheduler, set up according to the current configuration.
+        """
+        scheduler_config = self.config_provider.get().scheduler
+        if self.scheduler is None:
+            self.scheduler = RequestScheduler()
+        self.scheduler.max_concurrency = scheduler_config.max_concurrency
+        self.scheduler.max_queue_length = scheduler_config.max_queue_length
+        return self.scheduler
+
+    def share_state(self):
+        """ Creates the counters tracking the load on every configured routed backend and the request scheduler (if
+        enabled) up front, so that processes forked afterwards share them.
+        """
+        config = self.config_provider.get()
+        if config.scheduler is not None:
+            self._get_scheduler()
+        for backend_config in config.backends or []:
+            self._get_backend_stats(self._get_backend_endpoint(backend_config, backend_config.model_name or config.model_name))
+            if config.hedging is not None and config.hedging.model_name is not None:
+                self._get_backend_stats(self._get_backend_endpoint(backend_config, config.hedging.model_name))
+
+    def settle_process(self, pid: int):
+        """ Stops counting requests as outstanding against routed backends (or waiting with the scheduler) if they were
+        sent by a process that has since exited.
+
+        Args:
+            pid (int): The ID of the process.
+        """
+        for backend_stats in self.backend_stats.values():
+            backend_stats.settle(pid)
+        if self.scheduler is not None:
+            self.scheduler.settle(pid)
+
+    def _get_backend_endpoint(self, backend_config: BackendConfig, model_name: str) -> str:
+        """ Gets the string identifying a routed backend (and model).
+
+        Args:
+            backend_config (BackendConfig): The configuration of the backend.
+            model_name (str): The name of the model used on the backend.
+        Returns:
+            str: The string identifying the backend.
+        """
+        return f'ollama://{backend_config.hostname}:{backend_config.port}/{model_name}'
+
+    def _get_ollama(self, hostname: str, port: int, model_name: str) -> OllamaLargeLanguageModel:
+        """ Constructs an Ollama large language model (LLM), sharing the client and health monitor for its endpoint.
+
+        Args:
+            hostname (str): The hostname of the Ollama instance.
+            port (int): The port of the Ollama instance.
+            model_name (str): The name of the model to use.
+        Returns:
+            OllamaLargeLanguageModel: The newly-constructed LLM.
+        """
+        large_language_model = OllamaLargeLanguageModel(
+            hostname=hostname, 
+            port=port, 
+            model=model_name,
+            client=self._get_client(OllamaLargeLanguageModel.get_api_url(hostname, port), 'ollama'))
+        large_language_model.health_monitor = self._get_health_monitor(
+            f'ollama://{hostname}:{port}/{model_name}',
+            large_language_model._check_connectivity,
+            large_language_model.keep_alive)
+        return large_language_model
+
+    def _construct(self, config: Config, model_name: Optional[str], deadline: Optional[float]) -> LargeLanguageModel:
+        """ Constructs a large language model (LLM), routing requests between backends if more than one is configured.
+
+        Args:
+            config (Config): The application-level configuration.
+            model_name (Optional[str]): The name of the model to use (by default, the one configured for each backend).
+            deadline (Optional[float]): The time (in seconds) after which to give up on a request (if any).
+        Returns:
+            LargeLanguageModel: The newly-constructed LLM.
+        """
+        if config.backends is not None:
+            backends = []
+            for backend_config in config.backends:
+                backend_model_name = model_name or backend_config.model_name or config.model_name
+                if backend_model_name not in LargeLanguageModelFactory.ollama_models:
+                    raise NameError(f'Model "{backend_model_name}" unknown or not supported on Ollama backends.')
+                endpoint = self._get_backend_endpoint(backend_config, backend_model_name)
+                backend = self._get_ollama(backend_config.hostname, backend_config.port, backend_model_name)
+                backend.deadline = deadline
+                backends.append(RoutedBackend(
+                    endpoint,
+                    backend,
+                    weight=backend_config.weight,
+                    max_concurrency=backend_config.max_concurrency,
+                    stats=self._get_backend_stats(endpoint)))
+            return RoutingLargeLanguageModel(backends, logger=self.logger)
+        model_name = model_name or config.model_name
+        if model_name in LargeLanguageModelFactory.ollama_models:
+            large_language_model = self._get_ollama(config.ollama.hostname, config.ollama.port, model_name)
+            large_language_model.deadline = deadline
+            return large_language_model
+        if model_name in LargeLanguageModelFactory.openai_models:
+            large_language_model = OpenaiLargeLanguageModel(
+                api_key=config.openai_api_key, 
+                model=model_name,
+                client=self._get_client(None, config.openai_api_key))
+            large_language_model.health_monitor = self._get_health_monitor(
+                f'openai:///{model_name}',
+                large_language_model._check_connectivity)
+            large_language_model.deadline = deadline
+            return large_language_model
+        raise NameError(f'Model "{model_name}" unknown or not supported.')
+
+    @staticmethod
+    def _can_hedge(config: Config) -> bool:
+        """ Checks whether hedged requests would go anywhere other than the request they hedge (another backend or model).
+
+        Args:
+            config (Config): The application-level configuration.
+        Returns:
+            bool: True if there is somewhere else to send hedged requests, otherwise False.
+        """
+        if config.backends is not None and len(config.backends) > 1:
+            return True
+        primary_model_name = config.backends[0].model_name or config.model_name if config.backends is not None and len(config.backends) == 1 else config.model_name
+        return config.hedging.model_name is not None and config.hedging.model_name != primary_model_name
+
+    def get(self, role: LargeLanguageModelRole = 'command') -> LargeLanguageModel:
         """ Returns a newly-constructed large language model (LLM) based on the application configuration passed.
-        
+
+        Args:
+            role (LargeLanguageModelRole): What the LLM will be asked to do (which decides how long to wait for it).
         Returns:
             LargeLanguageModel: The newly-constructed LLM.
         """
-        if self.config.model_name in LargeLanguageModelFactory.ollama_models:
-            return OllamaLargeLanguageModel(
-                hostname=self.config.ollama.hostname, 
-                port=self.config.ollama.port, 
-                model=self.config.model_name)
-        if self.config.model_name in LargeLanguageModelFactory.openai_models:
-            return OpenaiLargeLanguageModel(
-                api_key=self.config.openai_api_key, 
-                model=self.config.model_name)
-        raise NameError(f'Model "{self.config.model_name}" unknown or not supported.')
+        config = self.config_provider.get()
+        deadline = getattr(config.deadlines, role)
+        large_language_model = self._construct(config, None, deadline)
+
+        # Hedge slow responses to shell commands, since that is where the attacker is left waiting.
+        if role == 'command' and config.hedging is not None and not LargeLanguageModelFactory._can_hedge(config):
+            self.logger.warning('Not hedging requests, as there is only one backend and no other model to hedge with.')
+        elif role == 'command' and config.hedging is not None:
+            large_language_model = HedgingLargeLanguageModel(
+                large_language_model,
+                self._construct(config, config.hedging.model_name, deadline),
+                self.latency_tracker,
+                percentile=config.hedging.percentile,
+                minimum_delay=config.hedging.minimum_delay)
+
+        # Make requests wait their turn, so that no one session can starve the others.
+        if config.scheduler is not None:
+            large_language_model = ScheduledLargeLanguageModel(
+                large_language_model,
+                self._get_scheduler(),
+                role,
+                session_rate=config.scheduler.session_rate,
+                session_burst=config.scheduler.session_burst,
+                source_rate=config.scheduler.source_rate,
+                source_burst=config.scheduler.source_burst,
+                logger=self.logger)
+        return large_language_model
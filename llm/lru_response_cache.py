@@ -0,0 +1,29 @@
+from typing import Iterable, Optional
+
+from caching.tiered_cache import TieredCache
+from llm.response_cache import ResponseCache
+
+
+class LruResponseCache(ResponseCache):
+    """ Represents a response cache that keeps recently used responses in memory, backed by an optional on-disk tier.
+
+    The memory tier belongs to the process, and each session runs in a process of its own (even under the daemon), so
+    only the on-disk tier shares responses between sessions.
+    """
+
+    def __init__(self, capacity: int, cacheable_commands: Iterable[str] = [], disk_path: Optional[str] = None):
+        """ Initializes a new instance of a response cache that keeps recently used responses in memory, backed by an optional on-disk tier.
+
+        Args:
+            capacity (int): The maximum number of responses to hold in memory.
+            cacheable_commands (Iterable[str]): Regular expressions matching (normalized) commands whose responses may be cached.
+            disk_path (Optional[str]): The path of an SQLite database to persist responses to across restarts (if any).
+        """
+        super().__init__(cacheable_commands)
+        self.entries = TieredCache(capacity, 'responses', disk_path)
+
+    def _get(self, key: str) -> Optional[str]:
+        return self.entries.get(key)
+
+    def _put(self, key: str, response: str):
+        self.entries.put(key, response)
@@ -1,9 +1,12 @@
+import json
 import sys
-from typing import Literal
-from urllib.request import urlopen
+from typing import Literal, Optional
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
 
 from openai import OpenAI
 
+from llm.backend_health_monitor import BackendHealthMonitor
 from llm.openai_large_language_model import OpenaiLargeLanguageModel
 
 
@@ -11,23 +14,58 @@ class OllamaLargeLanguageModel(OpenaiLargeLanguageModel):
     """ Represents a large language model (LLM) hosted locally on Ollama.
     """
 
+    keep_alive_duration = '10m'
+    """ How long Ollama should keep the model loaded for after each keep-alive ping.
+    """
+
+    keep_alive_timeout = 120
+    """ The time (in seconds) to wait for a keep-alive ping to return (which may involve loading the model).
+    """
+
+    @staticmethod
+    def get_api_url(hostname: str, port: int) -> str:
+        """ Gets the URL of the OpenAI-compatible API of an Ollama instance.
+
+        Args:
+            hostname (str): The hostname of the Ollama instance.
+            port (int): The port the Ollama instance listens on.
+        Returns:
+            str: The URL of the OpenAI-compatible API of the Ollama instance.
+        """
+        return f'http://{hostname}:{port}/v1'
+
     def _get_api_url(self) -> str:
         """ Gets the URL of the local Ollama API.
     
         Returns:
             bool: The URL of the local Ollama API.
         """
-        return f'http://{self.hostname}:{self.port}/v1'
+        return OllamaLargeLanguageModel.get_api_url(self.hostname, self.port)
 
     def _check_connectivity(self) -> bool:
         try:
-            with urlopen(self._get_api_url()) as response:
+            with urlopen(self._get_api_url(), timeout=OllamaLargeLanguageModel.connectivity_check_timeout) as response:
                 response.read() # Ensure local Ollama API is available.
                 return True
+        except HTTPError:
+            return True # API responded, even if only with an error status.
         except:
             return False
-    
-    def __init__(self, hostname='localhost', port=11434, temperature=0, model: Literal["llama2", "llama3", "openchat", "gemma", "mistral"] = "openchat"):
+
+    def _supports_json_mode(self) -> bool:
+        return True # Ollama supports JSON mode for every model.
+
+    def keep_alive(self):
+        """ Asks Ollama to load the model (if it isn't already) and keep it loaded, so that sessions don't wait for it to load.
+        """
+        request = Request(
+            f'http://{self.hostname}:{self.port}/api/generate',
+            data=json.dumps({'model': self.model, 'keep_alive': OllamaLargeLanguageModel.keep_alive_duration}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'})
+        with urlopen(request, timeout=OllamaLargeLanguageModel.keep_alive_timeout) as response:
+            response.read()
+
+    def __init__(self, hostname='localhost', port=11434, temperature=0, model: Literal["llama2", "llama3", "openchat", "gemma", "mistral"] = "openchat", health_monitor: Optional[BackendHealthMonitor] = None, client: Optional[OpenAI] = None):
         """ Initializes a new instance of a large language model (LLM) hosted locally on Ollama.
         
         Args:
@@ -35,11 +73,16 @@ class OllamaLargeLanguageModel(OpenaiLargeLanguageModel):
             port (int): The port to connect to the Ollama instance on.
             temperature (float): The temperature to use for the LLM.
             model (str): The name of the model to query.
+            health_monitor (Optional[BackendHealthMonitor]): The monitor tracking the health of the Ollama instance (if shared with other instances).
+            client (Optional[OpenAI]): The API client to use (if shared with other instances, along with its connection pool).
         """
-        super(OllamaLargeLanguageModel, self).__init__(temperature)
         self.hostname = hostname
         self.port = port
-        self.api_key = "ollama"
-        self.model = model
-        self.client = OpenAI(base_url=self._get_api_url(), api_key=self.api_key)
+        api_key = "ollama"
+        super(OllamaLargeLanguageModel, self).__init__(
+            api_key,
+            temperature,
+            model,
+            health_monitor,
+            client if client is not None else OpenAI(base_url=self._get_api_url(), api_key=api_key))
         
\ No newline at end of file
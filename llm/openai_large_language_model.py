@@ -1,47 +1,168 @@
+import socket
 import sys
+from urllib.error import HTTPError
 from urllib.request import urlopen
-from typing import Iterable, Literal
+from typing import Iterable, Iterator, Literal, Optional
 
-from openai import OpenAI
-from .large_language_model import LargeLanguageModel, ChatMessage
+import httpx
+from openai import APIConnectionError, APITimeoutError, OpenAI, Stream
+from .backend_health_monitor import BackendHealthMonitor
+from .large_language_model import GenerationLimits, LargeLanguageModel, ChatMessage
 
 
 class OpenaiLargeLanguageModel(LargeLanguageModel):
     """ Represents an OpenAI large language model (LLM).
     """
+
+    connectivity_check_timeout = 5
+    """ The time (in seconds) to wait for the API to respond when checking connectivity.
+    """
+
+    json_mode_models = [
+        'gpt-3.5-turbo',
+        'gpt-4o',
+    ]
+    """ The names of the models that support constraining responses to JSON objects.
+    """
     
-    def __init__(self, api_key: str, temperature=0, model: Literal["gpt-3.5-turbo", "gpt-4", "gpt-4o"] = "gpt-4"):
+    def __init__(self, api_key: str, temperature=0, model: Literal["gpt-3.5-turbo", "gpt-4", "gpt-4o"] = "gpt-4", health_monitor: Optional[BackendHealthMonitor] = None, client: Optional[OpenAI] = None):
         """ Initializes a new instance of an OpenAI large language model (LLM).
         
         Args:
             api_key (str): The API key to use to query the model.
             temperature (float): The temperature to use for the LLM.
             model (str): The name of the model to query.
+            health_monitor (Optional[BackendHealthMonitor]): The monitor tracking the health of the API (if shared with other instances).
+            client (Optional[OpenAI]): The API client to use (if shared with other instances, along with its connection pool).
         """
-        super(OpenaiLargeLanguageModel, self).__init__(temperature)
+        super(OpenaiLargeLanguageModel, self).__init__(temperature, health_monitor)
         self.api_key = api_key
         self.model = model
-        self.client = OpenAI(api_key=api_key)
+        self.client = client if client is not None else OpenAI(api_key=api_key)
         
     def _check_connectivity(self) -> bool:
         try:
-            with urlopen('https://api.openai.com/') as response:
+            with urlopen('https://api.openai.com/', timeout=OpenaiLargeLanguageModel.connectivity_check_timeout) as response:
                 response.read() # Ensure OpenAI API is available.
                 return True
+        except HTTPError:
+            return True # API responded, even if only with an error status.
         except:
             return False
 
-    def _get_next_message (self, messsages: Iterable[ChatMessage]) -> ChatMessage:
+    def _supports_json_mode(self) -> bool:
+        """ Checks whether the model supports constraining responses to JSON objects.
+
+        Returns:
+            bool: True if the model supports JSON mode, otherwise False.
+        """
+        return self.model in OpenaiLargeLanguageModel.json_mode_models
+
+    def _get_client(self) -> OpenAI:
+        """ Gets the API client to send a request with, set to give up once the deadline (if any) has passed.
+
+        Returns:
+            OpenAI: The API client.
+        """
+        if self.deadline is None:
+            return self.client
+        return self.client.with_options(timeout=self.deadline, max_retries=0) # Retrying would overrun the deadline.
+
+    @staticmethod
+    def _get_limit_options(limits: Optional[GenerationLimits]) -> dict:
+        """ Gets the request options that apply limits on how much the LLM may generate.
+
+        Args:
+            limits (Optional[GenerationLimits]): The limits (if any).
+        Returns:
+            dict: The request options.
+        """
+        options = {}
+        if limits is not None and len(limits.stop) > 0:
+            options['stop'] = limits.stop[:4] # The API accepts at most 4.
+        if limits is not None and limits.max_tokens is not None:
+            options['max_tokens'] = limits.max_tokens
+        return options
+
+    def _get_next_message (self, messsages: Iterable[ChatMessage], limits: Optional[GenerationLimits] = None) -> ChatMessage:
         # Format messages for OpenAI API.
         messages = list(map(lambda message: {'role': message.role, 'content': message.content}, messsages))
         
         # Get response.
-        response = self.client.chat.completions.create(
-            model=self.model,
-            temperature=self.temperature,
-            messages=messages
-        ).choices[0].message.content
+        try:
+            choice = self._get_client().chat.completions.create(
+                model=self.model,
+                temperature=self.temperature,
+                messages=messages,
+                **OpenaiLargeLanguageModel._get_limit_options(limits)
+            ).choices[0]
+        except APITimeoutError as e:
+            raise TimeoutError(f'The LLM did not respond within {self.deadline} seconds.') from e
+        except APIConnectionError as e:
+            raise ConnectionError(f'Cannot connect to the LLM ({e}).') from e
+        if limits is not None and choice.finish_reason == 'length':
+            limits.truncated = True
         
         # Adapt and return.
-        return ChatMessage('system', response)
+        return ChatMessage('system', choice.message.content)
+
+    @staticmethod
+    def _abort(stream: Stream):
+        """ Aborts a streamed response from another thread, waking the thread reading it if it is waiting on the backend.
+
+        Closing the response would not wake the reading thread, so the connection is shut down underneath it instead.
+
+        Args:
+            stream (Stream): The streamed response.
+        """
+        network_stream = stream.response.extensions.get('network_stream')
+        connection = None if network_stream is None else network_stream.get_extra_info('socket')
+        if connection is not None:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass # Already closed.
+
+    def _get_next_message_stream (self, messsages: Iterable[ChatMessage], json_mode: bool = False, limits: Optional[GenerationLimits] = None) -> Iterator[str]:
+        # Format messages for OpenAI API.
+        messages = list(map(lambda message: {'role': message.role, 'content': message.content}, messsages))
+
+        # Request streamed response (as a JSON object if asked for and supported).
+        try:
+            stream = self._get_client().chat.completions.create(
+                model=self.model,
+                temperature=self.temperature,
+                messages=messages,
+                stream=True,
+                **({'response_format': {'type': 'json_object'}} if json_mode and self._supports_json_mode() else {}),
+                **OpenaiLargeLanguageModel._get_limit_options(limits)
+            )
+        except APITimeoutError as e:
+            raise TimeoutError(f'The LLM did not respond within {self.deadline} seconds.') from e
+        except APIConnectionError as e:
+            raise ConnectionError(f'Cannot connect to the LLM ({e}).') from e
+
+        # Yield content deltas as they arrive, unless abandoned from another thread in the meantime.
+        abandonment = None if limits is None else limits.abandonment
+        abort = lambda: OpenaiLargeLanguageModel._abort(stream)
+        if abandonment is not None:
+            abandonment.on_abandon(abort)
+        try:
+            for chunk in stream:
+                if len(chunk.choices) == 0:
+                    continue
+                if limits is not None and chunk.choices[0].finish_reason == 'length':
+                    limits.truncated = True
+                if chunk.choices[0].delta.content is not None:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            if abandonment is not None and abandonment.abandoned:
+                return # Aborted on purpose, so not the backend's fault.
+            if isinstance(e, (APITimeoutError, httpx.TimeoutException)):
+                raise TimeoutError(f'The LLM stopped responding for {self.deadline} seconds.') from e
+            raise e
+        finally:
+            if abandonment is not None:
+                abandonment.forget(abort) # Never shut down a connection that may go back into the pool.
+            stream.close() # Closing the connection stops the backend generating tokens nobody will read.
     
\ No newline at end of file
@@ -0,0 +1,17 @@
+from typing import Optional
+
+from llm.response_cache import ResponseCache
+
+
+class PassthroughResponseCache(ResponseCache):
+    """ Represents a response cache that never caches anything.
+    """
+
+    def is_cacheable(self, command: str) -> bool:
+        return False
+
+    def _get(self, key: str) -> Optional[str]:
+        return None
+
+    def _put(self, key: str, response: str):
+        pass # Discard response.
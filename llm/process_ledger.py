@@ -0,0 +1,56 @@
+import multiprocessing
+import os
+
+
+class ProcessLedger():
+    """ Keeps count, in shared memory, of how many of a shared resource (such as request slots) each process holds.
+
+    Processes can die without giving back what they hold (a daemon worker can be killed outright before it has cleaned
+    up, for example), so whatever created the processes uses the ledger to take back what each one held once it has exited.
+    Callers are responsible for locking.
+    """
+
+    def __init__(self, slots: int = 256):
+        """ Initializes a new ledger of how many of a shared resource each process holds.
+
+        Args:
+            slots (int): The maximum number of processes to keep count for at once (any more go untracked).
+        """
+        self.pids = multiprocessing.RawArray('i', slots)
+        self.counts = multiprocessing.RawArray('i', slots)
+
+    def record(self, delta: int):
+        """ Records that the current process has taken (or given back) some of the resource.
+
+        Args:
+            delta (int): The amount taken (or, if negative, given back).
+        """
+        pid = os.getpid()
+        free_slot = None
+        for slot, slot_pid in enumerate(self.pids):
+            if slot_pid == pid:
+                self.counts[slot] += delta
+                if self.counts[slot] == 0:
+                    self.pids[slot] = 0
+                return
+            if slot_pid == 0 and free_slot is None:
+                free_slot = slot
+        if free_slot is not None and delta > 0: # Giving back what was taken untracked (while the ledger was full) leaves nothing to settle.
+            self.pids[free_slot] = pid
+            self.counts[free_slot] = delta
+
+    def settle(self, pid: int) -> int:
+        """ Forgets what a process that has exited was holding.
+
+        Args:
+            pid (int): The ID of the process.
+        Returns:
+            int: The amount of the resource the process was holding, which should now be given back.
+        """
+        for slot, slot_pid in enumerate(self.pids):
+            if slot_pid == pid:
+                count = self.counts[slot]
+                self.pids[slot] = 0
+                self.counts[slot] = 0
+                return count
+        return 0
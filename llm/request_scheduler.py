@@ -0,0 +1,274 @@
+from dataclasses import dataclass
+from logging import Logger
+import multiprocessing
+import os
+import time
+from typing import Iterable, Iterator, List, Optional
+import zlib
+
+from llm.delegating_health_monitor import DelegatingHealthMonitor
+from llm.large_language_model import BackpressureError, ChatMessage, GenerationLimits, LargeLanguageModel, LargeLanguageModelRole
+from llm.process_ledger import ProcessLedger
+
+
+@dataclass
+class SchedulerStats():
+    """ A snapshot of the queue of LLM requests waiting to be sent.
+    """
+
+    in_flight: int
+    """ The number of requests currently being sent.
+    """
+
+    queue_depth: List[int]
+    """ The number of requests currently waiting, by class (highest priority first).
+    """
+
+    max_queue_depth: int
+    """ The largest number of requests that have been waiting at once.
+    """
+
+    mean_wait: List[float]
+    """ The average time (in seconds) requests have waited, by class (highest priority first).
+    """
+
+    rejected: int
+    """ The number of requests turned away because the queue was full.
+    """
+
+    throttled: int
+    """ The number of requests held back because their session or source was sending too many.
+    """
+
+
+class TokenBuckets():
+    """ A table of token buckets in shared memory, used to limit how often each of many sources may send requests.
+
+    Sources are hashed into a fixed number of buckets, so that the table never grows. Sources that collide share a bucket.
+    """
+
+    def __init__(self, slots: int = 1024):
+        """ Initializes a new table of token buckets.
+
+        Args:
+            slots (int): The number of buckets.
+        """
+        self.lock = multiprocessing.Lock()
+        self.tokens = multiprocessing.RawArray('d', slots)
+        self.updated_at = multiprocessing.RawArray('d', slots)
+
+    def reserve(self, key: str, rate: float, burst: int) -> float:
+        """ Takes a token from the bucket for a source, going into debt if there isn't one.
+
+        Args:
+            key (str): Identifies the source.
+            rate (float): The number of tokens added to each bucket per second.
+            burst (int): The number of tokens each bucket holds when full.
+        Returns:
+            float: The time (in seconds) to wait before the token may be used.
+        """
+        slot = zlib.crc32(key.encode('utf-8')) % len(self.tokens)
+        with self.lock:
+            now = time.monotonic()
+            tokens = min(burst, self.tokens[slot] + (now - self.updated_at[slot]) * rate) - 1
+            self.tokens[slot] = tokens
+            self.updated_at[slot] = now
+        return 0.0 if tokens >= 0 else -tokens / rate
+
+
+class RequestScheduler():
+    """ Decides when LLM requests may be sent, so that a flood of requests from one session cannot starve the others.
+
+    At most a fixed number of requests are sent at once. Requests beyond that wait in a bounded queue, and are let
+    through highest priority class first. Each session and each source address is also limited by a token bucket in how
+    often it may send commands. State lives in shared memory, so that if the scheduler is created before forking (as
+    the daemon does) it applies across all sessions.
+    """
+
+    request_classes: List[LargeLanguageModelRole] = ['command', 'guard', 'compression']
+    """ The classes of LLM request, from highest priority to lowest.
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_queue_length: int = 64):
+        """ Initializes a new scheduler for LLM requests.
+
+        Args:
+            max_concurrency (int): The maximum number of requests to send at once.
+            max_queue_length (int): The maximum number of requests that may wait to be sent, beyond which more are turned away.
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue_length = max_queue_length
+        self.condition = multiprocessing.Condition()
+        self.in_flight = multiprocessing.RawValue('i', 0)
+        self.waiting = multiprocessing.RawArray('i', len(RequestScheduler.request_classes))
+        self.max_queue_depth = multiprocessing.RawValue('i', 0)
+        self.waits = multiprocessing.RawArray('i', len(RequestScheduler.request_classes))
+        self.wait_time = multiprocessing.RawArray('d', len(RequestScheduler.request_classes))
+        self.rejected = multiprocessing.RawValue('i', 0)
+        self.throttled = multiprocessing.RawValue('i', 0)
+        self.ledger = ProcessLedger()
+        self.waiting_ledgers = [ProcessLedger() for _ in RequestScheduler.request_classes]
+        self.source_buckets = TokenBuckets()
+
+    def throttle(self, session_buckets: TokenBuckets, session_rate: float, session_burst: int, source: str, source_rate: float, source_burst: int):
+        """ Holds back a command until neither its session nor its source has exceeded their rate limit.
+
+        Args:
+            session_buckets (TokenBuckets): The token bucket of the session.
+            session_rate (float): The number of commands per second each session may send on average.
+            session_burst (int): The number of commands each session may send at once.
+            source (str): The address the session is connected from.
+            source_rate (float): The number of commands per second each source may send on average.
+            source_burst (int): The number of commands each source may send at once.
+        """
+        delay = max(session_buckets.reserve('session', session_rate, session_burst), self.source_buckets.reserve(source, source_rate, source_burst))
+        if delay > 0:
+            with self.condition:
+                self.throttled.value += 1
+            time.sleep(delay)
+
+    def acquire(self, request_class: LargeLanguageModelRole):
+        """ Waits until a request may be sent.
+
+        Args:
+            request_class (LargeLanguageModelRole): The class of the request.
+        Raises:
+            BackpressureError: If the queue is full.
+        """
+        priority = RequestScheduler.request_classes.index(request_class)
+        started_at = time.monotonic()
+        with self.condition:
+            if sum(self.waiting) >= self.max_queue_length:
+                self.rejected.value += 1
+                raise BackpressureError('Cannot connect to the LLM (too many requests are waiting). Try again later.')
+            self.waiting[priority] += 1
+            self.waiting_ledgers[priority].record(1)
+            self.max_queue_depth.value = max(self.max_queue_depth.value, sum(self.waiting))
+            try:
+                while self.in_flight.value >= self.max_concurrency or any(self.waiting[higher] > 0 for higher in range(priority)):
+                    self.condition.wait(1.0) # Wake up now and then in case a worker died holding a request.
+            finally:
+                self.waiting[priority] -= 1
+                self.waiting_ledgers[priority].record(-1)
+            self.in_flight.value += 1
+            self.ledger.record(1)
+            self.waits[priority] += 1
+            self.wait_time[priority] += time.monotonic() - started_at
+
+    def release(self):
+        """ Records that a request has finished, letting the next one waiting through.
+        """
+        with self.condition:
+            self.in_flight.value -= 1
+            self.ledger.record(-1)
+            self.condition.notify_all()
+
+    def settle(self, pid: int):
+        """ Records that any requests sent or waiting to be sent by a process that has since exited have finished.
+
+        Args:
+            pid (int): The ID of the process.
+        """
+        with self.condition:
+            self.in_flight.value -= self.ledger.settle(pid)
+            for priority, waiting_ledger in enumerate(self.waiting_ledgers):
+                self.waiting[priority] -= waiting_ledger.settle(pid)
+            self.condition.notify_all()
+
+    def get_stats(self) -> SchedulerStats:
+        """ Gets a snapshot of the queue of requests waiting to be sent.
+
+        Returns:
+            SchedulerStats: The snapshot.
+        """
+        with self.condition:
+            return SchedulerStats(
+                in_flight=self.in_flight.value,
+                queue_depth=list(self.waiting),
+                max_queue_depth=self.max_queue_depth.value,
+                mean_wait=[wait_time / waits if waits > 0 else 0.0 for wait_time, waits in zip(self.wait_time, self.waits)],
+                rejected=self.rejected.value,
+                throttled=self.throttled.value)
+
+
+class ScheduledLargeLanguageModel(LargeLanguageModel):
+    """ Represents a large language model (LLM) whose requests wait their turn with a scheduler before being sent.
+    """
+
+    def __init__(
+            self,
+            large_language_model: LargeLanguageModel,
+            scheduler: RequestScheduler,
+            request_class: LargeLanguageModelRole,
+            session_rate: float = 1,
+            session_burst: int = 20,
+            source_rate: float = 2,
+            source_burst: int = 40,
+            logger: Optional[Logger] = None):
+        """ Initializes a new instance of a large language model (LLM) whose requests wait their turn with a scheduler.
+
+        Args:
+            large_language_model (LargeLanguageModel): The LLM to send requests to.
+            scheduler (RequestScheduler): The scheduler to wait for.
+            request_class (LargeLanguageModelRole): The class of the requests sent.
+            session_rate (float): The number of commands per second the session may send on average.
+            session_burst (int): The number of commands the session may send at once.
+            source_rate (float): The number of commands per second each source address may send on average.
+            source_burst (int): The number of commands each source address may send at once.
+            logger (Optional[Logger]): The logger to use for this instance (if any).
+        """
+        super(ScheduledLargeLanguageModel, self).__init__(health_monitor=DelegatingHealthMonitor(lambda: [self.large_language_model.health_monitor]))
+        self.large_language_model = large_language_model
+        self.scheduler = scheduler
+        self.request_class = request_class
+        self.session_rate = session_rate
+        self.session_burst = session_burst
+        self.source_rate = source_rate
+        self.source_burst = source_burst
+        self.session_buckets = TokenBuckets(1)
+        self.logger = logger
+
+    @staticmethod
+    def get_source() -> str:
+        """ Gets the address the current session is connected from.
+
+        Returns:
+            str: The address, or 'local' if the session is not connected over SSH.
+        """
+        ssh_client = os.environ.get('SSH_CLIENT', '').split()
+        return ssh_client[0] if len(ssh_client) > 0 else 'local'
+
+    def _check_connectivity(self) -> bool:
+        return self.health_monitor.is_available()
+
+    def _wait_turn(self):
+        """ Waits until the next request may be sent.
+        """
+        if self.request_class == 'command':
+            self.scheduler.throttle(
+                self.session_buckets,
+                self.session_rate,
+                self.session_burst,
+                ScheduledLargeLanguageModel.get_source(), # Read each time, since daemon workers learn it after starting.
+                self.source_rate,
+                self.source_burst)
+        self.scheduler.acquire(self.request_class)
+        if self.logger is not None:
+            stats = self.scheduler.get_stats()
+            self.logger.debug(f'Scheduler: {stats.in_flight} in flight, {stats.queue_depth} waiting, {[round(wait, 3) for wait in stats.mean_wait]}s average wait, {stats.rejected} rejected, {stats.throttled} throttled.')
+
+    def _get_next_message(self, messages: Iterable[ChatMessage], limits: Optional[GenerationLimits] = None) -> ChatMessage:
+        self._wait_turn()
+        try:
+            return self.large_language_model.get_next_message(messages, limits)
+        finally:
+            self.scheduler.release()
+
+    def _get_next_message_stream(self, messages: Iterable[ChatMessage], json_mode: bool = False, limits: Optional[GenerationLimits] = None) -> Iterator[str]:
+        self._wait_turn()
+        chunks = self.large_language_model.get_next_message_stream(messages, json_mode, limits)
+        try:
+            yield from chunks
+        finally:
+            chunks.close()
+            self.scheduler.release()
@@ -0,0 +1,106 @@
+from abc import ABC, abstractmethod
+import hashlib
+import re
+from typing import Iterable, Optional
+
+
+class ResponseCache(ABC):
+    """ Represents an abstract cache of LLM responses to shell commands, shared between sessions.
+    """
+
+    def __init__(self, cacheable_commands: Iterable[str] = []):
+        """ Abstract constructor for a cache of LLM responses to shell commands.
+
+        Args:
+            cacheable_commands (Iterable[str]): Regular expressions matching (normalized) commands whose responses may be cached.
+        """
+        self.cacheable_commands = [re.compile(pattern) for pattern in cacheable_commands]
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize_command(command: str) -> str:
+        """ Normalizes a command so that trivially different spellings of it share a cache entry.
+
+        Args:
+            command (str): The command to normalize.
+        Returns:
+            str: The normalized command.
+        """
+        return ' '.join(command.split())
+
+    @staticmethod
+    def make_key(persona: str, command: str, state: str) -> str:
+        """ Derives the cache key of the response to a command.
+
+        Args:
+            persona (str): Identifies the system being emulated (e.g. the model name and rendered system prompt).
+            command (str): The command being responded to.
+            state (str): A fingerprint of any session state the response depends on.
+        Returns:
+            str: The cache key.
+        """
+        key = '\0'.join([persona, ResponseCache.normalize_command(command), state])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def is_cacheable(self, command: str) -> bool:
+        """ Checks whether the response to a command may be cached.
+
+        Args:
+            command (str): The command to check.
+        Returns:
+            bool: True if the response to the command may be cached, otherwise False.
+        """
+        normalized_command = ResponseCache.normalize_command(command)
+        return any(pattern.fullmatch(normalized_command) for pattern in self.cacheable_commands)
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[str]:
+        """ Looks up a response in this cache.
+
+        Override this method, rather than `get`, in concrete implementations of this class.
+
+        Args:
+            key (str): The cache key of the response.
+        Returns:
+            Optional[str]: The cached response, or None if there isn't one.
+        """
+        raise NotImplementedError("Cannot use an abstract response cache.")
+
+    @abstractmethod
+    def _put(self, key: str, response: str):
+        """ Stores a response in this cache.
+
+        Override this method, rather than `put`, in concrete implementations of this class.
+
+        Args:
+            key (str): The cache key of the response.
+            response (str): The response to store.
+        """
+        raise NotImplementedError("Cannot use an abstract response cache.")
+
+    def get(self, key: str) -> Optional[str]:
+        """ Looks up a response in this cache.
+
+        This method implements hit and miss counting and should not be overridden. Override `_get` instead.
+
+        Args:
+            key (str): The cache key of the response.
+        Returns:
+            Optional[str]: The cached response, or None if there isn't one.
+        """
+        response = self._get(key)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    def put(self, key: str, response: str):
+        """ Stores a response in this cache.
+
+        Args:
+            key (str): The cache key of the response.
+            response (str): The response to store.
+        """
+        self._put(key, response)
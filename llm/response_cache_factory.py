@@ -0,0 +1,34 @@
+from kink import inject
+
+from config.config_provider import ConfigProvider
+from llm.lru_response_cache import LruResponseCache
+from llm.passthrough_response_cache import PassthroughResponseCache
+from llm.response_cache import ResponseCache
+
+
+@inject
+class ResponseCacheFactory():
+    """ A factory for creating response cache instances depending on application-level configuration.
+    """
+
+    def __init__(self, config_provider: ConfigProvider):
+        """ Initializes a new instance of a factory for creating response cache instances depending on application-level configuration.
+
+        Args:
+            config_provider (ConfigProvider): The application-level configuration provider.
+        """
+        self.config_provider = config_provider
+
+    def get(self) -> ResponseCache:
+        """ Returns a newly-constructed response cache based on application-level configuration.
+
+        Returns:
+            ResponseCache: The newly-constructed response cache.
+        """
+        response_cache_config = self.config_provider.get().response_cache
+        if response_cache_config is None:
+            return PassthroughResponseCache()
+        return LruResponseCache(
+            capacity=response_cache_config.capacity,
+            cacheable_commands=response_cache_config.cacheable_commands,
+            disk_path=response_cache_config.disk_path)
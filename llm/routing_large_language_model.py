@@ -0,0 +1,276 @@
+from dataclasses import dataclass
+from logging import Logger
+import multiprocessing
+import time
+from typing import Iterable, Iterator, List, Optional, Set
+
+from llm.delegating_health_monitor import DelegatingHealthMonitor
+from llm.large_language_model import ChatMessage, GenerationLimits, LargeLanguageModel
+from llm.process_ledger import ProcessLedger
+
+
+@dataclass
+class BackendMetrics():
+    """ A snapshot of the load on and performance of one LLM backend behind a router.
+    """
+
+    name: str
+    """ The name of the backend.
+    """
+
+    healthy: bool
+    """ Whether the backend is currently accepting requests.
+    """
+
+    in_flight: int
+    """ The number of requests currently outstanding against the backend.
+    """
+
+    requests: int
+    """ The total number of requests sent to the backend.
+    """
+
+    failures: int
+    """ The total number of requests to the backend that failed.
+    """
+
+    latency: float
+    """ The exponentially-weighted moving average of the time (in seconds) taken by requests to the backend.
+    """
+
+
+class BackendStats():
+    """ Counters tracking the load on and performance of one LLM backend.
+
+    Counters live in shared memory, so that if they are created before forking (as the daemon does) every worker
+    process sees the same counts, and routing and concurrency limits apply across all sessions rather than per session.
+    """
+
+    latency_smoothing = 0.2
+    """ The weight given to the latest request in the moving average of latency.
+    """
+
+    def __init__(self):
+        """ Initializes a new set of counters tracking the load on and performance of an LLM backend.
+        """
+        self.lock = multiprocessing.Lock()
+        self.in_flight = multiprocessing.RawValue('i', 0)
+        self.requests = multiprocessing.RawValue('i', 0)
+        self.failures = multiprocessing.RawValue('i', 0)
+        self.latency = multiprocessing.RawValue('d', 0.0)
+        self.ledger = ProcessLedger()
+
+    def try_acquire(self, max_concurrency: int) -> bool:
+        """ Counts a new outstanding request against the backend, unless it is at its concurrency limit.
+
+        Args:
+            max_concurrency (int): The maximum number of requests that may be outstanding against the backend.
+        Returns:
+            bool: True if the request was counted, otherwise False.
+        """
+        with self.lock:
+            if self.in_flight.value >= max_concurrency:
+                return False
+            self.in_flight.value += 1
+            self.requests.value += 1
+            self.ledger.record(1)
+            return True
+
+    def release(self, latency: float, failed: bool):
+        """ Counts an outstanding request against the backend as finished.
+
+        Args:
+            latency (float): The time (in seconds) the request took.
+            failed (bool): Whether the request failed.
+        """
+        with self.lock:
+            self.in_flight.value -= 1
+            self.ledger.record(-1)
+            if failed:
+                self.failures.value += 1
+            else:
+                smoothing = BackendStats.latency_smoothing if self.latency.value > 0 else 1.0
+                self.latency.value += smoothing * (latency - self.latency.value)
+
+    def settle(self, pid: int):
+        """ Stops counting requests as outstanding if they were sent by a process that has since exited.
+
+        Args:
+            pid (int): The ID of the process.
+        """
+        with self.lock:
+            self.in_flight.value -= self.ledger.settle(pid)
+
+
+class RoutedBackend():
+    """ An LLM backend behind a router, along with its routing settings and statistics.
+    """
+
+    def __init__(self, name: str, large_language_model: LargeLanguageModel, weight: float = 1, max_concurrency: int = 4, stats: Optional[BackendStats] = None):
+        """ Initializes a new LLM backend behind a router.
+
+        Args:
+            name (str): The name of the backend (for metrics and logging).
+            large_language_model (LargeLanguageModel): The LLM hosted by the backend.
+            weight (float): The relative share of requests to send to the backend.
+            max_concurrency (int): The maximum number of requests that may be outstanding against the backend.
+            stats (Optional[BackendStats]): The counters to track the backend with (if shared with other instances).
+        """
+        self.name = name
+        self.large_language_model = large_language_model
+        self.weight = weight
+        self.max_concurrency = max_concurrency
+        self.stats = stats if stats is not None else BackendStats()
+
+    def is_healthy(self) -> bool:
+        """ Checks whether the backend is currently accepting requests (that is, whether it has not been ejected).
+
+        Returns:
+            bool: True if the backend is accepting requests, otherwise False.
+        """
+        return self.large_language_model.health_monitor.is_available()
+
+    def get_load(self) -> float:
+        """ Gets the load on the backend relative to its weight.
+
+        Returns:
+            float: The load on the backend if one more request were sent to it.
+        """
+        return (self.stats.in_flight.value + 1) / self.weight
+
+    def get_metrics(self) -> BackendMetrics:
+        """ Gets a snapshot of the load on and performance of the backend.
+
+        Returns:
+            BackendMetrics: The snapshot.
+        """
+        return BackendMetrics(
+            name=self.name,
+            healthy=self.is_healthy(),
+            in_flight=self.stats.in_flight.value,
+            requests=self.stats.requests.value,
+            failures=self.stats.failures.value,
+            latency=self.stats.latency.value)
+
+
+class RoutingLargeLanguageModel(LargeLanguageModel):
+    """ Represents a large language model (LLM) served by several backends, routing each request to the least loaded one.
+
+    Backends that are down are skipped until their health monitor lets a trial request through, and requests that fail
+    (before any output has been received) are retried on another backend.
+    """
+
+    poll_interval = 0.05
+    """ The time (in seconds) to wait before checking again for a backend with capacity when all are at their limit.
+    """
+
+    def __init__(self, backends: List[RoutedBackend], queue_timeout: float = 30, logger: Optional[Logger] = None):
+        """ Initializes a new instance of a large language model (LLM) served by several backends.
+
+        Args:
+            backends (List[RoutedBackend]): The backends to route requests to.
+            queue_timeout (float): The time (in seconds) to wait for a backend with capacity before giving up on a request.
+            logger (Optional[Logger]): The logger to use for this instance (if any).
+        """
+        super(RoutingLargeLanguageModel, self).__init__(health_monitor=DelegatingHealthMonitor(lambda: [backend.large_language_model.health_monitor for backend in self.backends]))
+        self.backends = backends
+        self.queue_timeout = queue_timeout
+        self.logger = logger
+
+    def _check_connectivity(self) -> bool:
+        return any(backend.is_healthy() for backend in self.backends)
+
+    def _acquire_backend(self, tried: Set[str]) -> RoutedBackend:
+        """ Picks the least loaded healthy backend with spare capacity, waiting for one to free up if necessary.
+
+        Args:
+            tried (Set[str]): The names of backends already tried for this request.
+        Returns:
+            RoutedBackend: The backend, with the request counted against it.
+        Raises:
+            ConnectionError: If no backend is available.
+        """
+        deadline = time.monotonic() + self.queue_timeout
+        while True:
+            candidates = [backend for backend in self.backends if backend.name not in tried and backend.is_healthy()]
+            if len(candidates) == 0:
+                raise ConnectionError('Cannot connect to the LLM (all backends are down). Check your internet connection or ensure local service is running.')
+            for backend in sorted(candidates, key=lambda backend: (backend.get_load(), backend.stats.latency.value)):
+                if backend.stats.try_acquire(backend.max_concurrency):
+                    return backend
+            if time.monotonic() > deadline:
+                raise ConnectionError('Cannot connect to the LLM (all backends are at capacity).')
+            time.sleep(RoutingLargeLanguageModel.poll_interval)
+
+    def _release_backend(self, backend: RoutedBackend, started_at: float, failed: bool):
+        """ Counts a request against a backend as finished.
+
+        Args:
+            backend (RoutedBackend): The backend.
+            started_at (float): The time the request started.
+            failed (bool): Whether the request failed.
+        """
+        backend.stats.release(time.monotonic() - started_at, failed)
+        if self.logger is not None:
+            metrics = backend.get_metrics()
+            self.logger.debug(f'Backend {metrics.name}: {metrics.in_flight} in flight, {metrics.requests} requests, {metrics.failures} failures, {metrics.latency:.2f}s average latency.')
+
+    def get_metrics(self) -> List[BackendMetrics]:
+        """ Gets a snapshot of the load on and performance of every backend.
+
+        Returns:
+            List[BackendMetrics]: A snapshot for each backend.
+        """
+        return [backend.get_metrics() for backend in self.backends]
+
+    def _get_next_message(self, messages: Iterable[ChatMessage], limits: Optional[GenerationLimits] = None) -> ChatMessage:
+        messages = list(messages)
+        tried: Set[str] = set() if limits is None else set(limits.excluded_backends)
+        while True:
+            backend = self._acquire_backend(tried)
+            tried.add(backend.name)
+            if limits is not None:
+                limits.backend = backend.name
+            started_at = time.monotonic()
+            try:
+                message = backend.large_language_model.get_next_message(messages, limits)
+            except Exception as e:
+                self._release_backend(backend, started_at, True)
+                if self.logger is not None:
+                    self.logger.warning(f'Request to backend {backend.name} failed, failing over: {e}')
+                continue
+            except BaseException:
+                self._release_backend(backend, started_at, False) # Interrupted by the caller, not a fault of the backend.
+                raise
+            self._release_backend(backend, started_at, False)
+            return message
+
+    def _get_next_message_stream(self, messages: Iterable[ChatMessage], json_mode: bool = False, limits: Optional[GenerationLimits] = None) -> Iterator[str]:
+        messages = list(messages)
+        tried: Set[str] = set() if limits is None else set(limits.excluded_backends)
+        while True:
+            backend = self._acquire_backend(tried)
+            tried.add(backend.name)
+            if limits is not None:
+                limits.backend = backend.name
+            started_at = time.monotonic()
+            stream = backend.large_language_model.get_next_message_stream(messages, json_mode, limits)
+            received = False
+            failed = True
+            try:
+                for chunk in stream:
+                    received = True
+                    yield chunk
+                failed = False
+                return
+            except Exception as e:
+                if received:
+                    raise # Output has already been passed on, so it is too late to fail over.
+                if self.logger is not None:
+                    self.logger.warning(f'Request to backend {backend.name} failed, failing over: {e}')
+            except BaseException:
+                failed = False # Abandoned or interrupted by the caller, so abandon generation on the backend too.
+                stream.close()
+                raise
+            finally:
+                self._release_backend(backend, started_at, failed)
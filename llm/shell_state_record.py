@@ -0,0 +1,159 @@
+from dataclasses import dataclass, field
+import json
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass
+class ShellStateRecord():
+    """ A compact record of the state of an emulated system, built up from commands that are no longer in context.
+
+    The record is kept in context as a summary message, which it can be read back from, so that folding in more
+    commands never needs anything but the summary and the commands themselves.
+    """
+
+    header = 'The following summarizes the state of the system after earlier commands, which are no longer shown. Stay consistent with it:'
+    """ The first line of the summary message, by which it is recognized.
+    """
+
+    max_entries = 32
+    """ The maximum number of files, packages, environment variables and users to keep (the most recently changed).
+    """
+
+    max_outputs = 8
+    """ The maximum number of notable outputs to keep (the most recent).
+    """
+
+    cwd: Optional[str] = None
+    """ The current working directory.
+    """
+
+    files: Dict[str, str] = field(default_factory=dict)
+    """ The files created, modified or deleted, with what happened to each last.
+    """
+
+    packages: Dict[str, str] = field(default_factory=dict)
+    """ The packages installed or removed, with what happened to each last.
+    """
+
+    env: Dict[str, str] = field(default_factory=dict)
+    """ The environment variables set.
+    """
+
+    users: Dict[str, str] = field(default_factory=dict)
+    """ The users added, deleted or whose passwords were changed, with what happened to each last.
+    """
+
+    outputs: List[Tuple[str, str]] = field(default_factory=list)
+    """ Notable commands and (the first line of) their output.
+    """
+
+    @staticmethod
+    def _note(entries: Dict[str, str], key: str, value: str):
+        """ Notes a change in one of the tables of the record, keeping only the most recently changed entries.
+
+        Args:
+            entries (Dict[str, str]): The table.
+            key (str): The key of the entry changed.
+            value (str): The new value of the entry.
+        """
+        entries.pop(key, None) # Move to the end, as the most recently changed.
+        entries[key] = value
+        while len(entries) > ShellStateRecord.max_entries:
+            del entries[next(iter(entries))]
+
+    def note_file(self, path: str, action: str):
+        """ Notes that a file was created, modified or deleted.
+
+        Args:
+            path (str): The path of the file.
+            action (str): What happened to the file.
+        """
+        ShellStateRecord._note(self.files, path, action)
+
+    def note_package(self, name: str, action: str):
+        """ Notes that a package was installed or removed.
+
+        Args:
+            name (str): The name of the package.
+            action (str): What happened to the package.
+        """
+        ShellStateRecord._note(self.packages, name, action)
+
+    def note_env(self, name: str, value: Optional[str]):
+        """ Notes that an environment variable was set or unset.
+
+        Args:
+            name (str): The name of the variable.
+            value (Optional[str]): The value of the variable, or None if it was unset.
+        """
+        if value is None:
+            self.env.pop(name, None)
+        else:
+            ShellStateRecord._note(self.env, name, value)
+
+    def note_user(self, name: str, action: str):
+        """ Notes that a user was added, deleted or had their password changed.
+
+        Args:
+            name (str): The name of the user.
+            action (str): What happened to the user.
+        """
+        ShellStateRecord._note(self.users, name, action)
+
+    def note_output(self, command: str, output: str):
+        """ Notes the output of a command worth remembering (replacing any earlier output of the same command).
+
+        Args:
+            command (str): The command.
+            output (str): The first line of the output.
+        """
+        earlier_outputs = [(earlier_command, earlier_output) for earlier_command, earlier_output in self.outputs if earlier_command != command]
+        self.outputs = [*earlier_outputs[-(ShellStateRecord.max_outputs - 1):], (command, output)]
+
+    def render(self) -> str:
+        """ Renders the record as the content of a summary message.
+
+        Returns:
+            str: The content of the summary message.
+        """
+        lines = [ShellStateRecord.header]
+        if self.cwd is not None:
+            lines.append(f'cwd: {self.cwd}')
+        lines.extend(f'file: {path} ({action})' for path, action in self.files.items())
+        lines.extend(f'package: {name} ({action})' for name, action in self.packages.items())
+        lines.extend(f'env: {name}={value}' for name, value in self.env.items())
+        lines.extend(f'user: {name} ({action})' for name, action in self.users.items())
+        lines.extend(f'output: {json.dumps(command)} -> {json.dumps(output)}' for command, output in self.outputs)
+        return '\n'.join(lines)
+
+    @staticmethod
+    def parse(content: str) -> Optional['ShellStateRecord']:
+        """ Reads a record back from the content of a summary message.
+
+        Args:
+            content (str): The content of the message.
+        Returns:
+            Optional[ShellStateRecord]: The record, or None if the message is not a summary.
+        """
+        lines = content.split('\n')
+        if lines[0] != ShellStateRecord.header:
+            return None
+        record = ShellStateRecord()
+        for line in lines[1:]:
+            kind, _, value = line.partition(': ')
+            if kind == 'cwd':
+                record.cwd = value
+            elif kind in ['file', 'package', 'user'] and value.endswith(')') and ' (' in value:
+                key, _, action = value[:-1].rpartition(' (')
+                {'file': record.files, 'package': record.packages, 'user': record.users}[kind][key] = action
+            elif kind == 'env' and '=' in value:
+                name, _, env_value = value.partition('=')
+                record.env[name] = env_value
+            elif kind == 'output':
+                try:
+                    command, end = json.JSONDecoder().raw_decode(value)
+                    output = json.loads(value[end:].removeprefix(' -> '))
+                except ValueError:
+                    continue # Skip anything mangled.
+                record.outputs.append((command, output))
+        return record
@@ -0,0 +1,75 @@
+from collections import deque
+from typing import Callable, Deque, Iterable, List, Tuple
+
+from llm.chat_context import ChatContext
+from llm.context_compressor import ContextCompressor
+from llm.large_language_model import ChatMessage
+from llm.shell_state_record import ShellStateRecord
+from llm.tokenizer import Tokenizer
+
+
+class SlidingWindowContextCompressor(ContextCompressor):
+    """ Represents a context compressor that keeps only as many of the latest turns as fit within a token budget, along
+    with the system prompt and the LLM's response to it (and any summary of the state of the system), without asking the
+    LLM.
+
+    The window is kept between compressions, so that only turns added since the last compression are counted and turns
+    falling out of the window are dropped from its start in constant time. Telling whether the context has only been
+    added to since takes a pass over the turns in the window, comparing them by identity.
+    """
+
+    pinned_messages = 2
+    """ The number of messages at the start of the context never dropped (the system prompt and the LLM's response to it).
+    """
+
+    def __init__(self, tokenizer: Tokenizer, window_tokens: int = 4096):
+        """ Initializes a new instance of a context compressor that keeps only as many of the latest turns as fit within a token budget.
+
+        Args:
+            tokenizer (Tokenizer): The tokenizer to count tokens in messages with.
+            window_tokens (int): The maximum number of tokens the turns kept may take up (not counting the pinned messages).
+        """
+        self.tokenizer = tokenizer
+        self.window_tokens = window_tokens
+        self.window: Deque[Tuple[ChatMessage, int]] = deque()
+        self.window_token_count = 0
+
+    @staticmethod
+    def _count_pinned (messages: List[ChatMessage]) -> int:
+        """ Counts the messages at the start of the context that are never dropped.
+
+        Args:
+            messages (List[ChatMessage]): The messages in context.
+        Returns:
+            int: The number of messages never dropped.
+        """
+        pinned = min(SlidingWindowContextCompressor.pinned_messages, len(messages))
+        if pinned + 1 < len(messages) and messages[pinned].content.startswith(ShellStateRecord.header):
+            pinned += 2 # Keep the summary of the state of the system, which stands in for turns already dropped.
+        return pinned
+
+    def _compress (self, chat_messages: Iterable[ChatMessage], callback: Callable[[Iterable[ChatMessage]], None]):
+        messages = list(chat_messages)
+        pinned = SlidingWindowContextCompressor._count_pinned(messages)
+        turns = messages[pinned:]
+
+        # Carry on from the last window if the context has only been added to since (every turn in it still being the
+        # very same message), otherwise start over. Checking identity is cheap next to counting tokens again.
+        if len(self.window) > 0 and len(turns) >= len(self.window) and all(turn is kept_turn for turn, (kept_turn, _) in zip(turns, self.window)):
+            new_turns = turns[len(self.window):]
+        else:
+            self.window.clear()
+            self.window_token_count = 0
+            new_turns = turns
+        for turn in new_turns:
+            token_count = self.tokenizer.count_tokens(turn.content) + ChatContext.tokens_per_message
+            self.window.append((turn, token_count))
+            self.window_token_count += token_count
+
+        # Drop the oldest exchanges until the window fits the budget, keeping at least the latest.
+        while self.window_token_count > self.window_tokens and len(self.window) > 2:
+            for _ in range(2): # A command and its output.
+                _, token_count = self.window.popleft()
+                self.window_token_count -= token_count
+        callback([*messages[:pinned], *(turn for turn, _ in self.window)])
+
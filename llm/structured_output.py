@@ -0,0 +1,143 @@
+import json
+from typing import Any, Dict, Iterable, Optional
+
+
+class JsonStreamParser():
+    """ Incrementally parses the first JSON object or array in a stream of LLM output.
+
+    Any prose the LLM adds before or after the JSON is skipped. Members of a top-level object are made available as soon
+    as each one is complete, so that callers interested in one key need not wait for the rest of the response.
+    """
+
+    def __init__(self):
+        """ Initializes a new instance of an incremental parser for the first JSON object or array in a stream of LLM output.
+        """
+        self.buffer = ''
+        self.position = 0
+        self.start: Optional[int] = None
+        self.member_start: Optional[int] = None
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.members: Dict[str, Any] = {}
+        self.value: Any = None
+        self.done = False
+
+    def _complete_member(self, end: int):
+        """ Parses a complete member of the top-level object and records it.
+
+        Args:
+            end (int): The position in the buffer at which the member ends.
+        """
+        try:
+            self.members.update(json.loads(f'{{{self.buffer[self.member_start:end]}}}'))
+        except json.JSONDecodeError:
+            pass # Leave malformed members out, and let the caller decide what to do about them being missing.
+
+    def _complete_value(self, end: int):
+        """ Parses the complete top-level value.
+
+        Args:
+            end (int): The position in the buffer at which the value ends.
+        """
+        self.done = True
+        try:
+            self.value = json.loads(self.buffer[self.start:end])
+        except json.JSONDecodeError:
+            self.value = None
+
+    def feed(self, chunk: str):
+        """ Feeds the next chunk of LLM output into the parser.
+
+        Args:
+            chunk (str): The chunk of output.
+        """
+        self.buffer += chunk
+        while not self.done and self.position < len(self.buffer):
+            char = self.buffer[self.position]
+            if self.start is None:
+
+                # Skip any prose until the JSON starts.
+                if char in '{[':
+                    self.start = self.position
+                    self.depth = 1
+                    self.member_start = self.position + 1 if char == '{' else None
+            elif self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    if self.member_start is not None:
+                        self._complete_member(self.position)
+                    self._complete_value(self.position + 1)
+            elif char == ',' and self.depth == 1 and self.member_start is not None:
+                self._complete_member(self.position)
+                self.member_start = self.position + 1
+            self.position += 1
+
+
+def _close(chunks: Iterable[str]):
+    """ Closes a stream of LLM output, if it can be closed, abandoning generation of the rest of it.
+
+    Args:
+        chunks (Iterable[str]): The stream.
+    """
+    close = getattr(chunks, 'close', None)
+    if close is not None:
+        close()
+
+
+def parse_json(chunks: Iterable[str]) -> Any:
+    """ Parses the first JSON object or array in a stream of LLM output, stopping the stream as soon as it is complete.
+
+    Args:
+        chunks (Iterable[str]): The stream of LLM output.
+    Returns:
+        Any: The parsed JSON.
+    Raises:
+        ValueError: If the output does not contain a valid JSON object or array.
+    """
+    parser = JsonStreamParser()
+    try:
+        for chunk in chunks:
+            parser.feed(chunk)
+            if parser.done:
+                break
+    finally:
+        _close(chunks)
+    if parser.value is None:
+        raise ValueError(f'LLM output did not contain valid JSON: "{parser.buffer}"')
+    return parser.value
+
+
+def parse_json_member(chunks: Iterable[str], key: str) -> Any:
+    """ Parses a single member of the first JSON object in a stream of LLM output, stopping the stream as soon as it is complete.
+
+    Args:
+        chunks (Iterable[str]): The stream of LLM output.
+        key (str): The key of the member.
+    Returns:
+        Any: The value of the member.
+    Raises:
+        KeyError: If the output does not contain a JSON object with the member.
+    """
+    parser = JsonStreamParser()
+    try:
+        for chunk in chunks:
+            parser.feed(chunk)
+            if key in parser.members or parser.done:
+                break
+    finally:
+        _close(chunks)
+    if key not in parser.members:
+        raise KeyError(f'LLM output did not contain a JSON object with key "{key}": "{parser.buffer}"')
+    return parser.members[key]
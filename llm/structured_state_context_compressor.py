@@ -0,0 +1,210 @@
+import posixpath
+import re
+import shlex
+from typing import Callable, Iterable, List, Optional
+
+from llm.context_compressor import ContextCompressor
+from llm.large_language_model import ChatMessage
+from llm.shell_state_record import ShellStateRecord
+from shell.session_state import SessionState
+
+
+class StructuredStateContextCompressor(ContextCompressor):
+    """ Represents a context compressor that folds commands falling out of context into a compact record of the state of
+    the emulated system (such as the files, packages and users created), kept in context as a summary just after the
+    system prompt. This needs no LLM.
+
+    Only the commands falling out of context since the last compression are read, so the cost of compressing grows with
+    the number of new commands rather than with the length of the session.
+    """
+
+    pinned_messages = 2
+    """ The number of messages at the start of the context kept as they are (the system prompt and the LLM's response to it).
+    """
+
+    delimited_command = re.compile(r'\{\{(?P<command>.*)\}\}\s*$', re.DOTALL)
+    """ Matches commands delimited by the delimiting input transformer, capturing the command.
+    """
+
+    command_separators = [';', '&&', '||', '|', '&']
+    """ The tokens separating commands in a list or pipeline.
+    """
+
+    package_actions = {
+        'install': 'installed',
+        'add': 'installed',
+        'remove': 'removed',
+        'purge': 'removed',
+        'uninstall': 'removed',
+        'erase': 'removed',
+        'del': 'removed',
+    }
+    """ What package manager subcommands do to the packages they are given.
+    """
+
+    package_managers = ['apt', 'apt-get', 'yum', 'dnf', 'apk', 'pip', 'pip3', 'npm']
+    """ The names of package managers.
+    """
+
+    notable_commands = ['uname', 'hostname', 'id', 'whoami', 'ifconfig', 'ip', 'cat', 'ps', 'netstat', 'ss', 'df', 'free', 'lscpu', 'uptime', 'w', 'who', 'last', 'crontab']
+    """ The names of commands whose output is worth remembering.
+    """
+
+    max_output_length = 160
+    """ The maximum length (in characters) of notable output to remember.
+    """
+
+    def __init__(self, recent_exchanges: int = 4):
+        """ Initializes a new instance of a context compressor that folds commands falling out of context into a record
+        of the state of the emulated system.
+
+        Args:
+            recent_exchanges (int): The number of the latest commands (and their output) to keep in context as they are.
+        """
+        self.recent_exchanges = recent_exchanges
+
+    def _compress (self, chat_messages: Iterable[ChatMessage], callback: Callable[[Iterable[ChatMessage]], None]):
+        messages = list(chat_messages)
+        pinned = messages[:StructuredStateContextCompressor.pinned_messages]
+        exchanges = messages[len(pinned):]
+
+        # Pick up the record from the summary left by the last compression (if any).
+        record = ShellStateRecord.parse(exchanges[0].content) if len(exchanges) > 1 and exchanges[0].role == 'user' else None
+        summary_prompt = exchanges[1].content if record is not None else None
+        if record is not None:
+            exchanges = exchanges[2:]
+        else:
+            record = ShellStateRecord()
+
+        # Fold in the commands falling out of context, keeping the latest as they are.
+        split = max(0, len(exchanges) - self.recent_exchanges * 2)
+        split -= split % 2 # Never split an exchange.
+        if split == 0:
+            callback(messages) # Nothing has fallen out of context since the last compression.
+            return
+        for command, output in zip(exchanges[:split:2], exchanges[1:split:2]):
+            summary_prompt = self._fold(record, command.content, output.content) or summary_prompt
+
+        # Keep the summary in context in place of the commands folded into it, as an exchange of its own.
+        summary = [ChatMessage('user', record.render()), ChatMessage('system', summary_prompt or '')]
+        callback([*pinned, *summary, *exchanges[split:]])
+
+    def _fold (self, record: ShellStateRecord, command_content: str, output: str) -> Optional[str]:
+        """ Folds a command and its output into a record of the state of the emulated system.
+
+        Args:
+            record (ShellStateRecord): The record.
+            command_content (str): The command, as it was sent to the LLM.
+            output (str): The output of the command, as returned by the LLM.
+        Returns:
+            Optional[str]: The prompt at the end of the output (if any).
+        """
+        match = StructuredStateContextCompressor.delimited_command.search(command_content)
+        command = match.group('command') if match is not None else command_content
+        try:
+            lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+            lexer.whitespace_split = True
+            words = list(lexer)
+        except ValueError:
+            words = command.split() # Unbalanced quotes.
+
+        # Fold in each command in a list or pipeline.
+        simple_command: List[str] = []
+        for word in [*words, ';']:
+            if word in StructuredStateContextCompressor.command_separators:
+                self._fold_command(record, simple_command)
+                simple_command = []
+            else:
+                simple_command.append(word)
+
+        # Follow the working directory in the prompt, then remember any notable output.
+        lines = output.rstrip('\n').split('\n')
+        prompt = lines[-1].strip()
+        prompt_match = SessionState.prompt_pattern.match(prompt)
+        if prompt_match is not None:
+            record.cwd = prompt_match.group('path')
+            lines = lines[:-1]
+        first_line = next((line.strip() for line in lines if len(line.strip()) > 0), None)
+        name = next((word for word in words if word != 'sudo'), None)
+        if first_line is not None and name in StructuredStateContextCompressor.notable_commands:
+            record.note_output(command.strip(), first_line[:StructuredStateContextCompressor.max_output_length])
+        return prompt if prompt_match is not None else None
+
+    def _fold_command (self, record: ShellStateRecord, words: List[str]):
+        """ Folds a simple command (one without any lists or pipelines) into a record of the state of the emulated system.
+
+        Args:
+            record (ShellStateRecord): The record.
+            words (List[str]): The words of the command.
+        """
+        if len(words) > 0 and words[0] == 'sudo':
+            words = words[1:]
+        if len(words) == 0:
+            return
+        resolve = lambda path: StructuredStateContextCompressor._resolve(record.cwd, path)
+
+        # Pick out redirections to files.
+        arguments: List[str] = []
+        index = 1
+        while index < len(words):
+            if words[index] in ['>', '>>'] and index + 1 < len(words):
+                if not words[index + 1].startswith('/dev/'):
+                    record.note_file(resolve(words[index + 1]), 'created' if words[index] == '>' else 'modified')
+                index += 2
+            else:
+                arguments.append(words[index])
+                index += 1
+        name = words[0]
+        operands = [argument for argument in arguments if not argument.startswith('-')]
+
+        # Fold in what the command does.
+        if name in ['touch', 'mkdir']:
+            for operand in operands:
+                record.note_file(resolve(operand), 'created')
+        elif name in ['rm', 'rmdir']:
+            for operand in operands:
+                record.note_file(resolve(operand), 'deleted')
+        elif name in ['cp', 'mv'] and len(operands) > 1:
+            if name == 'mv':
+                for operand in operands[:-1]:
+                    record.note_file(resolve(operand), 'deleted')
+            record.note_file(resolve(operands[-1]), 'created')
+        elif name in ['nano', 'vi', 'vim', 'tee', 'chmod', 'chown'] or (name == 'sed' and '-i' in arguments):
+            for operand in (operands[1:] if name in ['chmod', 'chown', 'sed'] else operands):
+                record.note_file(resolve(operand), 'modified')
+        elif name in ['wget', 'curl']:
+            option = '-O' if name == 'wget' else '-o'
+            if option in arguments and arguments.index(option) + 1 < len(arguments):
+                record.note_file(resolve(arguments[arguments.index(option) + 1]), 'created')
+            elif name == 'wget' and len(operands) > 0 and len(posixpath.basename(operands[-1])) > 0:
+                record.note_file(resolve(posixpath.basename(operands[-1])), 'created')
+        elif name in StructuredStateContextCompressor.package_managers and len(operands) > 0 and operands[0] in StructuredStateContextCompressor.package_actions:
+            for package in operands[1:]:
+                record.note_package(package, StructuredStateContextCompressor.package_actions[operands[0]])
+        elif name == 'export':
+            for operand in operands:
+                if '=' in operand:
+                    record.note_env(*operand.split('=', 1))
+        elif name == 'unset':
+            for operand in operands:
+                record.note_env(operand, None)
+        elif name in ['useradd', 'adduser'] and len(operands) > 0:
+            record.note_user(operands[-1], 'added')
+        elif name in ['userdel', 'deluser'] and len(operands) > 0:
+            record.note_user(operands[-1], 'deleted')
+        elif name == 'passwd' and len(operands) > 0:
+            record.note_user(operands[-1], 'added, password changed' if record.users.get(operands[-1], '').startswith('added') else 'password changed')
+
+    @staticmethod
+    def _resolve (cwd: Optional[str], path: str) -> str:
+        """ Resolves a path against the working directory (if known).
+
+        Args:
+            cwd (Optional[str]): The working directory (if known).
+            path (str): The path.
+        Returns:
+            str: The resolved path.
+        """
+        if cwd is None or path.startswith('/') or path.startswith('~'):
+            return posixpath.normpath(path)
+        return posixpath.normpath(posixpath.join(cwd, path))
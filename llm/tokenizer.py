@@ -0,0 +1,17 @@
+from abc import ABC, abstractmethod
+
+
+class Tokenizer(ABC):
+    """ Represents an abstract tokenizer, used to measure text in the same units as the LLM's context window.
+    """
+
+    @abstractmethod
+    def count_tokens(self, text: str) -> int:
+        """ Counts the number of tokens in a string.
+
+        Args:
+            text (str): The string to count tokens in.
+        Returns:
+            int: The number of tokens in the string.
+        """
+        raise NotImplementedError('Cannot count tokens using an abstract tokenizer.')
@@ -0,0 +1,26 @@
+from kink import inject
+
+from llm.heuristic_tokenizer import HeuristicTokenizer
+from llm.tokenizer import Tokenizer
+
+
+@inject
+class TokenizerFactory():
+    """ A factory for creating the tokenizer used to count tokens in the LLM context.
+
+    Token counts are estimated from the length of the text for every model, as no vocabulary is shipped to count them
+    exactly. Counting tokens through this factory keeps the choice of tokenizer in one place.
+    """
+
+    def __init__(self):
+        """ Initializes a new instance of a factory for creating the tokenizer used to count tokens in the LLM context.
+        """
+        self.tokenizer = HeuristicTokenizer() # Every session shares a tokenizer.
+
+    def get(self) -> Tokenizer:
+        """ Returns the tokenizer used to count tokens in the LLM context (the same estimate, whatever the configured model).
+
+        Returns:
+            Tokenizer: The tokenizer.
+        """
+        return self.tokenizer
@@ -1,26 +1,72 @@
-import json
+import hashlib
+import random
+from caching.lru_cache import LruCache
 from llm.large_language_model import ChatMessage
 from llm.large_language_model_factory import LargeLanguageModelFactory
+from llm.structured_output import parse_json_member
 from output_guards.output_guard import OutputGuard, OutputGuardFinding
+from output_guards.shell_likeness_scorer import ShellLikenessScorer
 from prompting.prompt_factory import PromptFactory
 
 
 class AppropriatenessOutputGuard(OutputGuard):
     """ An output guard that assesses response appropriateness using a different LLM context to detect prompt injection.
+
+    If the guard LLM cannot be reached or misses its deadline, output is let through (and not cached, so that it is
+    judged if seen again). A slow backend is no sign of deviation, and failing closed would disconnect every session
+    whenever the backend is overloaded. A guard LLM that responds without a verdict is still treated as a deviation.
     """
 
-    def __init__(self, prompt_factory: PromptFactory, large_language_model_factory: LargeLanguageModelFactory):
+    cost = 100 # Makes a full LLM call.
+
+    judge_verdicts: LruCache[str, OutputGuardFinding] = LruCache(1024) # The judge gives the same verdict on the same exchange.
+
+    def __init__(
+            self,
+            prompt_factory: PromptFactory,
+            large_language_model_factory: LargeLanguageModelFactory,
+            confident_threshold: float = 0.8,
+            sample_rate: float = 0.1):
         """ Initializes a new instance of an output guard that assesses response appropriateness using a different LLM context to detect prompt injection.
         
         Args:
             prompt_factory (PromptFactory): The prompt factory to use to generate the guard prompt.
             large_language_model_factory (LargeLanguageModelFactory): The LLM factory to use to acquire an LLM instance.
+            confident_threshold (float): The shell-likeness score at or above which output is only judged if sampled.
+            sample_rate (float): The proportion of confidently shell-like output to judge anyway.
         """
         super().__init__()
         self.prompt_factory = prompt_factory
-        self.large_language_model = large_language_model_factory.get()
+        self.large_language_model = large_language_model_factory.get('guard')
+        self.scorer = ShellLikenessScorer()
+        self.confident_threshold = confident_threshold
+        self.sample_rate = sample_rate
 
     def _detect (self, input_message_content: str, output_message_content: str) -> OutputGuardFinding:
+        # Only ask the LLM about output that doesn't obviously look like it came from a shell (and a sample of what does).
+        # Output let through unjudged is not cached, so that the same exchange can still be sampled next time.
+        if self.scorer.score(input_message_content, output_message_content) >= self.confident_threshold and random.random() >= self.sample_rate:
+            return OutputGuardFinding.OK
+        key = hashlib.sha256(f'{input_message_content}\0{output_message_content}'.encode('utf-8')).hexdigest()
+        finding = AppropriatenessOutputGuard.judge_verdicts.get(key)
+        if finding is None:
+            try:
+                finding = self._judge(input_message_content, output_message_content)
+            except (TimeoutError, ConnectionError):
+                return OutputGuardFinding.OK # Fail open, as above.
+            AppropriatenessOutputGuard.judge_verdicts.put(key, finding)
+        return finding
+
+    def _judge (self, input_message_content: str, output_message_content: str) -> OutputGuardFinding:
+        """ Asks the guard LLM whether output deviates from the system prompt.
+
+        Args:
+            input_message_content (str): The input message content that prompted the output.
+            output_message_content (str): The output message content to check.
+        Returns:
+            OutputGuardFinding: The verdict of the guard LLM.
+        """
+
         # Render guard prompt.
         key_name = 'probable_deviation'
         guard_prompt = self.prompt_factory.get('appropriateness-output-guard', {
@@ -29,19 +75,16 @@ class AppropriatenessOutputGuard(OutputGuard):
             'key_name': key_name,
         })
 
-        # Pass to LLM.
-        result = self.large_language_model.get_next_message([ChatMessage('user', guard_prompt)]).content
-
-        # Parse output.
+        # Pass to LLM, stopping it as soon as it has given its verdict.
         try:
-            parsed_result = json.loads(result)
-        
-            # The guard LLM is misbehaving. This should be treated as successful prompt injection so throw deviation.
-            if key_name not in parsed_result or not parsed_result[key_name]:
+            probable_deviation = parse_json_member(self.large_language_model.get_next_message_stream([ChatMessage('user', guard_prompt)], json_mode=True), key_name)
+
+            # The guard LLM has found a deviation.
+            if probable_deviation:
                 return OutputGuardFinding.PROBABLE_DEVIATION
-        except json.JSONDecodeError:
+        except KeyError:
             
-            # Guard LLM did not produce valid JSON. Throw deviation.
+            # Guard LLM did not produce a verdict, so is misbehaving. This should be treated as successful prompt injection so throw deviation.
             return OutputGuardFinding.PROBABLE_DEVIATION
 
         # Things look okay.
@@ -1,24 +1,41 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import List
 from output_guards.passthrough_output_guard import PassthroughOutputGuard
-from output_guards.output_guard import OutputGuard
+from output_guards.output_guard import OutputGuard, OutputGuardFinding
 
 
 class ChainingOutputGuard(PassthroughOutputGuard):
-    """ An output guard that constructs a chain of responsibility from a list of output guards.
+    """ An output guard that runs a list of output guards concurrently, cheapest first, returning the first problem found.
+    """
+
+    executor = ThreadPoolExecutor(thread_name_prefix='output-guard-link')
+    """ The thread pool that links in the chain are run on (kept apart from `OutputGuard.executor`, which may be running the chain itself).
     """
 
     def __init__(self, chain: List[OutputGuard]):
-        """ Initializes a new instance of an output guard that constructs a chain of responsibility from a list of output guards.
+        """ Initializes a new instance of an output guard that runs a list of output guards concurrently, cheapest first.
 
         Args:
-            chain (List[OutputGuard]): The list of output guards to chain together.
+            chain (List[OutputGuard]): The list of output guards to run.
         """
         super().__init__(None)
+        self.chain = sorted(chain, key=lambda guard: guard.cost) # Sort is stable, so configured order breaks ties.
+
+    def _detect (self, input_message_content: str, output_message_content: str) -> OutputGuardFinding:
+        if len(self.chain) == 0:
+            return OutputGuardFinding.OK
+        if len(self.chain) == 1:
+            return self.chain[0].detect(input_message_content, output_message_content)
 
-        # Construct chain.
-        if len(chain) > 0:
-            first_link = self
-            latest_link = first_link
-            for guard in chain:
-                latest_link.next = guard
-                latest_link = guard # Remember latest link.
+        # Start every guard, then stop as soon as any of them finds a problem.
+        pending = {ChainingOutputGuard.executor.submit(guard.detect, input_message_content, output_message_content) for guard in self.chain}
+        try:
+            while len(pending) > 0:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.result() != OutputGuardFinding.OK:
+                        return future.result()
+            return OutputGuardFinding.OK
+        finally:
+            for future in pending:
+                future.cancel() # Guards that have not started yet need not run.
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
 from enum import Enum
 from typing import Optional
 
@@ -19,6 +20,14 @@ class OutputGuardFinding(Enum):
 class OutputGuard(ABC):
     """ Represents an abstract output guard.
     """
+
+    cost = 0
+    """ The relative cost of running the guard. Cheaper guards are started first and can short-circuit dearer ones.
+    """
+
+    executor = ThreadPoolExecutor(thread_name_prefix='output-guard')
+    """ The thread pool that output guards are run on in the background.
+    """
     
     def __init__(self, next: Optional['OutputGuard'] = None):
         """ Abstract constructor for an output guard.
@@ -60,4 +69,15 @@ class OutputGuard(ABC):
         
         # Delegate to next link in chain-of-responsibility (if any).
         return OutputGuardFinding.OK if self.next == None else self.next.detect(input_message_content, output_message_content)
+
+    def detect_async (self, input_message_content: str, output_message_content: str) -> Future:
+        """ Uses the output guard to check the given message in the background.
+
+        Args:
+            input_message_content (str): The input message content that prompted the output.
+            output_message_content (str): The output message content to check.
+        Returns:
+            Future: The future finding of the output guard (an `OutputGuardFinding`).
+        """
+        return OutputGuard.executor.submit(self.detect, input_message_content, output_message_content)
     
\ No newline at end of file
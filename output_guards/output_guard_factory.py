@@ -24,7 +24,7 @@ class OutputGuardFactory():
             large_language_model_factory (LargeLanguageModelFactory): The LLM factory to use to generate any LLM instances required.
             prompt_factory (PromptFactory): The prompt factory to use to generate any prompts required.
         """
-        self.config = config_provider.get()
+        self.config_provider = config_provider
         self.large_language_model_factory = large_language_model_factory
         self.prompt_factory = prompt_factory
 
@@ -39,7 +39,12 @@ class OutputGuardFactory():
         if output_guard_type == 'passthrough':
             return PassthroughOutputGuard()
         if output_guard_type == 'appropriateness':
-            return AppropriatenessOutputGuard(self.prompt_factory, self.large_language_model_factory)
+            appropriateness_judge_config = self.config_provider.get().appropriateness_judge
+            return AppropriatenessOutputGuard(
+                self.prompt_factory,
+                self.large_language_model_factory,
+                confident_threshold=appropriateness_judge_config.confident_threshold,
+                sample_rate=appropriateness_judge_config.sample_rate)
         raise NameError(f'Output guard "{output_guard_type}" unknown or not supported.')
 
     def get(self):
@@ -48,4 +53,5 @@ class OutputGuardFactory():
         Returns:
             OutputGuard: The newly-constructed output guard.
         """
-        return ChainingOutputGuard([self.construct(output_guard) for output_guard in self.config.output_guards])
+        config = self.config_provider.get()
+        return ChainingOutputGuard([self.construct(output_guard) for output_guard in config.output_guards])
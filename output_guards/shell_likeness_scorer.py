@@ -0,0 +1,143 @@
+import re
+from typing import List
+
+
+class ShellLikenessScorer():
+    """ Rates how much LLM output looks like the output of a real shell, using cheap local heuristics.
+
+    Scores range from 0 (nothing like shell output) to 1 (obviously shell output). Output containing phrases that a shell
+    would never produce (such as "As an AI") always scores 0, and terse output in response to input that reads like a
+    question or a prompt injection attempt is never rated confidently either way.
+    """
+
+    banned_phrases = re.compile('|'.join([
+        r'\bas an ai\b',
+        r'\blanguage model\b',
+        r'\bi(\'m| am) (sorry|unable|not able|happy to|just)\b',
+        r'\bi (cannot|can\'t|won\'t|apologi[sz]e)\b',
+        r'\bcertainly[!,]',
+        r'\bsure[!,]',
+        r'\bhere(\'s| is| are) (the|an?|your|some)\b',
+        r'\b(openai|chatgpt)\b',
+        r'\bsimulat(e|ed|ing|ion)\b',
+        r'\bpretend(ing)?\b',
+        r'\binstructions?\b',
+    ]), re.IGNORECASE)
+    """ Matches phrases that a shell would never produce, but that an LLM that has deviated from its task often does.
+    """
+
+    shell_patterns = re.compile('|'.join([
+        r'command not found',
+        r'no such file or directory',
+        r'permission denied',
+        r'not a directory',
+        r'is a directory',
+        r'operation not permitted',
+        r'^total \d+$',
+        r'^[-dlcbps][-rwxsStT]{9}[.+@]?\s',
+        r'^[^:\s]+:[^:\s]*:\d+:\d+:',
+        r'^\S+@\S+:\S*[$#]',
+        r'^(usage|Usage):',
+        r'^\S+: \S+: ',
+    ]), re.IGNORECASE | re.MULTILINE)
+    """ Matches fragments of output that are characteristic of a shell (error messages, file listings, passwd lines,
+    prompts and so on).
+    """
+
+    conversational_input = re.compile(r'^\s*(what|why|how|when|where|who (is|are|was|were)|is|are|can|could|would|will|should|please|tell|explain|ignore|forget|disregard|pretend|you|act as)\b', re.IGNORECASE)
+    """ Matches input addressed to a person rather than a shell (questions, requests and attempts at redirecting the LLM).
+    """
+
+    word = re.compile(r'^[A-Za-z][a-z\']*[,.!?;:]?$')
+    """ Matches a word of prose (as opposed to a path, flag, number or other token).
+    """
+
+    min_symbol_sample = 16
+    """ The number of visible characters of output needed to fully trust its symbol density (a lone number is no evidence either way).
+    """
+
+    def _is_prose(self, line: str) -> bool:
+        """ Checks whether a line of output reads like prose (a capitalized sentence of at least six words, mostly made
+        up of ordinary words and punctuated like English).
+
+        Args:
+            line (str): The line to check.
+        Returns:
+            bool: True if the line reads like prose, otherwise false.
+        """
+        words = line.split()
+        if len(words) < 6 or not line[0].isupper() or line[-1] not in '.!?:':
+            return False
+        return sum(1 for word in words if ShellLikenessScorer.word.match(word) is not None) / len(words) >= 0.8
+
+    def _is_terse(self, line: str) -> bool:
+        """ Checks whether a line of output is terse in the way that shell output often is (a few words at most, with no
+        sentence punctuation).
+
+        Args:
+            line (str): The line to check.
+        Returns:
+            bool: True if the line is terse, otherwise false.
+        """
+        return len(line.split()) <= 3 and line[-1] not in '.!?'
+
+    def _is_conversational(self, input_message_content: str) -> bool:
+        """ Checks whether input reads like it was addressed to a person (or to the LLM) rather than to a shell.
+
+        Args:
+            input_message_content (str): The input.
+        Returns:
+            bool: True if the input reads like prose or a prompt injection attempt, otherwise false.
+        """
+        input_line = input_message_content.strip()
+        return len(input_line) > 0 and (
+            ShellLikenessScorer.conversational_input.match(input_line) is not None
+            or ShellLikenessScorer.banned_phrases.search(input_line) is not None
+            or self._is_prose(input_line))
+
+    def _get_symbol_density(self, output_message_content: str) -> float:
+        """ Measures the proportion of characters in output that are digits or punctuation typical of paths, flags,
+        sizes and dates.
+
+        Args:
+            output_message_content (str): The output.
+        Returns:
+            float: The proportion of such characters, scaled down for output too short to tell by.
+        """
+        visible = [char for char in output_message_content if not char.isspace()]
+        if len(visible) == 0:
+            return 0.0
+        density = sum(1 for char in visible if char.isdigit() or char in '/-_.:=@~[]()<>|') / len(visible)
+        return density * min(1.0, len(visible) / ShellLikenessScorer.min_symbol_sample)
+
+    def score(self, input_message_content: str, output_message_content: str) -> float:
+        """ Rates how much output looks like the output of a real shell.
+
+        Args:
+            input_message_content (str): The input message content that prompted the output.
+            output_message_content (str): The output to rate.
+        Returns:
+            float: The score, between 0 and 1.
+        """
+        if ShellLikenessScorer.banned_phrases.search(output_message_content) is not None:
+            return 0.0
+        lines: List[str] = [line.strip() for line in output_message_content.splitlines() if len(line.strip()) > 0]
+        if len(lines) == 0:
+            return 1.0 # Plenty of commands print nothing.
+
+        # Terse answers to questions are just what a deviated LLM gives, so leave those to be judged.
+        shell_pattern_found = ShellLikenessScorer.shell_patterns.search(output_message_content) is not None
+        terse = sum(1 for line in lines if self._is_terse(line)) / len(lines)
+        if terse == 1.0 and not shell_pattern_found and self._is_conversational(input_message_content):
+            return 0.5
+
+        # Start from neutral, then weigh evidence either way (terse lines being weak evidence, as answers are terse too).
+        score = 0.5
+        if shell_pattern_found:
+            score += 0.4
+        score -= 0.8 * sum(1 for line in lines if self._is_prose(line)) / len(lines)
+        score += 0.1 * terse
+        score += 0.3 * min(1.0, self._get_symbol_density(output_message_content) * 4)
+        if sum(len(line) for line in lines) / len(lines) > 120:
+            score -= 0.2 # Shell output rarely has long lines, but prose tends to come in long paragraphs.
+        return min(1.0, max(0.0, score))
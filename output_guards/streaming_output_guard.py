@@ -0,0 +1,63 @@
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+from output_guards.output_guard import OutputGuard, OutputGuardFinding
+
+
+class StreamingOutputGuard():
+    """ Runs an output guard over LLM output while it is still being streamed to the terminal.
+
+    Once enough output has arrived, the guard is started on it in the background, so that a problem near the start of
+    the response is found early and the rest of the response held back from the terminal. Once the response is complete,
+    only the part that came after the part checked early is guarded, so that no output is judged twice.
+    """
+
+    partial_output_length = 400
+    """ The number of characters of output to start the guard on. Shorter responses are checked in full once complete.
+    """
+
+    def __init__(self, output_guard: OutputGuard, input_message_content: str, callback: Callable[[str], None]):
+        """ Initializes a new instance of a runner for an output guard over LLM output while it is being streamed.
+
+        Args:
+            output_guard (OutputGuard): The output guard to run.
+            input_message_content (str): The input message content that prompted the output.
+            callback (Callable[[str], None]): Called with each chunk of output for as long as it may be shown.
+        """
+        self.output_guard = output_guard
+        self.input_message_content = input_message_content
+        self.callback = callback
+        self.chunks: List[str] = []
+        self.length = 0
+        self.finding: Optional[Future] = None
+        self.checked_output = ''
+
+    def write(self, chunk: str):
+        """ Accepts a chunk of streamed output, passing it on unless the guard has already found a problem.
+
+        Args:
+            chunk (str): The chunk of output.
+        """
+        if self.finding is not None and self.finding.done() and self.finding.result() != OutputGuardFinding.OK:
+            return
+        self.callback(chunk)
+        self.chunks.append(chunk)
+        self.length += len(chunk)
+        if self.finding is None and self.length >= StreamingOutputGuard.partial_output_length:
+            self.checked_output = ''.join(self.chunks)
+            self.finding = self.output_guard.detect_async(self.input_message_content, self.checked_output)
+
+    def detect(self, output_message_content: str) -> OutputGuardFinding:
+        """ Gets the finding of the guard once the response is complete.
+
+        Args:
+            output_message_content (str): The complete output.
+        Returns:
+            OutputGuardFinding: The finding of the output guard.
+        """
+        if self.finding is None or self.finding.cancel() or not output_message_content.startswith(self.checked_output):
+            return self.output_guard.detect(self.input_message_content, output_message_content)
+        finding = self.finding.result()
+        remainder = output_message_content[len(self.checked_output):]
+        if finding != OutputGuardFinding.OK or not remainder.strip():
+            return finding
+        return self.output_guard.detect(self.input_message_content, remainder) # Guard only whatever came after the part checked early.
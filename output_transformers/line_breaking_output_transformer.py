@@ -1,4 +1,5 @@
 from string import whitespace
+from typing import Iterable, Iterator
 from output_transformers.output_transformer import OutputTransformer
 
 
@@ -11,4 +12,12 @@ class LineBreakingOutputTransformer(OutputTransformer):
         if len(message_content.strip(whitespace)) > 0:
             return f'{message_content}\n'
         return message_content
-    
\ No newline at end of file
+
+    def _transform_stream(self, chunks: Iterable[str]) -> Iterator[str]:
+        # Pass chunks straight through, then append a line break if we got output.
+        has_output = False
+        for chunk in chunks:
+            has_output = has_output or len(chunk.strip(whitespace)) > 0
+            yield chunk
+        if has_output:
+            yield '\n'
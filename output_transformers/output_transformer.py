@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 
 
 class OutputTransformer(ABC):
@@ -40,4 +40,32 @@ class OutputTransformer(ABC):
         
         # Delegate to next link in chain-of-responsibility (if any).
         return self.next.transform(transformed) if self.next is not None else transformed
-    
\ No newline at end of file
+
+    def _transform_stream (self, chunks: Iterable[str]) -> Iterator[str]:
+        """ Uses this output transformer to transform the given message as it is streamed in.
+
+        Override this method, rather than `transform_stream`, in concrete implementations of this class that can transform
+        output incrementally. The default implementation waits for the whole message and transforms it in one go.
+
+        Args:
+            chunks (Iterable[str]): The chunks of the message content to transform.
+        Returns:
+            Iterator[str]: The chunks of the transformed message.
+        """
+        yield self._transform(''.join(chunks))
+
+    def transform_stream (self, chunks: Iterable[str]) -> Iterator[str]:
+        """ Uses this output transformer to transform the given message as it is streamed in.
+
+        This method implementes a chain of responsibility pattern and should not be overridden. Override `_transform_stream` instead.
+
+        Args:
+            chunks (Iterable[str]): The chunks of the message content to transform.
+        Returns:
+            Iterator[str]: The chunks of the transformed message.
+        """
+        # Run own transformation function.
+        transformed = self._transform_stream(chunks)
+
+        # Delegate to next link in chain-of-responsibility (if any).
+        return self.next.transform_stream(transformed) if self.next is not None else transformed
@@ -22,7 +22,7 @@ class OutputTransformerFactory():
         Args:
             config_provider (ConfigProvider): The application-level configuration provider.
         """
-        self.config = config_provider.get()
+        self.config_provider = config_provider
 
     @staticmethod
     def construct(output_transformer_type: Literal['passthrough', 'stripping', 'line_breaking']) -> OutputTransformer:
@@ -42,7 +42,7 @@ class OutputTransformerFactory():
         Returns:
             OutputTransformer: The newly-constructed output transformer.
         """
-        config = self.config.output_transformers
+        config = self.config_provider.get().output_transformers
         if type(config) is str:
             return OutputTransformerFactory.construct(config)
         return ChainingOutputTransformer([
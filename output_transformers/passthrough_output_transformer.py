@@ -1,3 +1,4 @@
+from typing import Iterable, Iterator
 from output_transformers.output_transformer import OutputTransformer
 
 
@@ -8,4 +9,7 @@ class PassthroughOutputTransformer(OutputTransformer):
     def _transform(self, message_content: str) -> str:
         # Return input unchanged.
         return message_content
-    
\ No newline at end of file
+
+    def _transform_stream(self, chunks: Iterable[str]) -> Iterator[str]:
+        # Return input unchanged.
+        yield from chunks
@@ -1,5 +1,5 @@
 from string import whitespace
-from typing import Callable, Optional
+from typing import Callable, Iterable, Iterator, Optional
 from output_transformers.output_transformer import OutputTransformer
 
 
@@ -40,7 +40,21 @@ class PromptCapturingOutputTransformer(OutputTransformer):
             return '\n'.join(message_content_lines[:offset])
         elif self.prompt is None:
             raise RuntimeError(f'LLM has deviated. Output did not end with a prompt and there is no prompt currently in the buffer. Instead, last line was: "{prompt_line}").')
-        
+
         # No prompt in message, but we have one in the buffer.
         return message_content
-    
\ No newline at end of file
+
+    def _transform_stream(self, chunks: Iterable[str]) -> Iterator[str]:
+        buffer = ''
+        for chunk in chunks:
+            buffer += chunk
+
+            # Hold back the last non-empty line (and the line break before it), since it could turn out to be the prompt.
+            content_length = len(buffer.rstrip(whitespace))
+            boundary = max(buffer.rfind('\n', 0, content_length), 0)
+            if boundary > 0:
+                yield buffer[:boundary]
+                buffer = buffer[boundary:]
+
+        # Decide what to do with the last line now that the message is complete.
+        yield self._transform(buffer)
@@ -1,16 +1,53 @@
 from functools import reduce
 from output_transformers.output_transformer import OutputTransformer
 from string import whitespace
+from typing import Iterable, Iterator
 
 
 class StrippingOutputTransformer(OutputTransformer):
     """ An output transformer that returns LLM output with leading and trailing whitespace stripped.
     """
 
+    chars_to_strip = [whitespace, '`', whitespace]
+    """ The sets of characters to strip from either end of the output, in order.
+    """
+
     def _transform(self, message_content: str) -> str:
-        chars_to_strip = [whitespace, '`', whitespace]
         buffer = message_content
-        for char_to_strip in chars_to_strip:
+        for char_to_strip in StrippingOutputTransformer.chars_to_strip:
             buffer = buffer.strip(char_to_strip)
         return buffer
-    
\ No newline at end of file
+
+    def _transform_stream(self, chunks: Iterable[str]) -> Iterator[str]:
+        strippable = ''.join(StrippingOutputTransformer.chars_to_strip)
+        buffer = ''
+        started = False
+        for chunk in chunks:
+            buffer += chunk
+
+            # Leading characters can be stripped once the first character that can't be has arrived.
+            if not started:
+                offset = len(buffer) - len(buffer.lstrip(strippable))
+                if offset == len(buffer):
+                    continue
+                head = buffer[:offset]
+                for char_to_strip in StrippingOutputTransformer.chars_to_strip:
+                    head = head.lstrip(char_to_strip)
+                buffer = head + buffer[offset:]
+                started = True
+
+            # Hold back only the trailing run of characters that might yet need stripping.
+            held_back = len(buffer) - len(buffer.rstrip(strippable))
+            if held_back < len(buffer):
+                yield buffer[:len(buffer) - held_back]
+                buffer = buffer[len(buffer) - held_back:]
+
+        # Nothing but strippable characters arrived, so defer to the non-streaming transformation.
+        if not started:
+            yield self._transform(buffer)
+            return
+
+        # Strip trailing characters.
+        for char_to_strip in StrippingOutputTransformer.chars_to_strip:
+            buffer = buffer.rstrip(char_to_strip)
+        yield buffer
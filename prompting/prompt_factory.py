@@ -20,7 +20,7 @@ class PromptFactory():
             loader=PackageLoader('limbosh'),
             autoescape=select_autoescape()
         ) # Initialize Jinja2 environment.
-        self.config = config_provider.get()
+        self.config_provider = config_provider
 
     def get(self, prompt_name: str, extra_params: Dict[str, str] = {}):
         """ Gets the prompt with the specified name.
@@ -32,4 +32,4 @@ class PromptFactory():
             str: The rendered prompt.
         """
         template = self.engine.get_template(f'{prompt_name}.jinja2')
-        return template.render(**self.config.prompt, **extra_params)
+        return template.render(**self.config_provider.get().prompt, **extra_params)
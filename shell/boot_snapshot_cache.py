@@ -0,0 +1,52 @@
+import hashlib
+from typing import Optional
+
+from caching.tiered_cache import TieredCache
+
+
+class BootSnapshotCache():
+    """ Keeps the LLM's response to the system prompt (ending with the first prompt) for each emulated system, so that
+    sessions can start straight away instead of waiting for the LLM to boot the system all over again.
+
+    Snapshots are keyed by the system being emulated (the model name and rendered system prompt), so changing either in
+    config boots a fresh snapshot. They are kept in memory, backed by an optional on-disk tier shared between processes.
+    """
+
+    def __init__(self, disk_path: Optional[str] = None, capacity: int = 16):
+        """ Initializes a new instance of a cache of boot snapshots.
+
+        Args:
+            disk_path (Optional[str]): The path of an SQLite database to persist snapshots to across restarts (if any).
+            capacity (int): The maximum number of snapshots to hold in memory.
+        """
+        self.snapshots = TieredCache(capacity, 'boot_snapshots', disk_path)
+
+    @staticmethod
+    def make_key(persona: str) -> str:
+        """ Derives the cache key of the boot snapshot of an emulated system.
+
+        Args:
+            persona (str): Identifies the system being emulated (e.g. the model name and rendered system prompt).
+        Returns:
+            str: The cache key.
+        """
+        return hashlib.sha256(persona.encode('utf-8')).hexdigest()
+
+    def get(self, persona: str) -> Optional[str]:
+        """ Looks up the boot snapshot of an emulated system.
+
+        Args:
+            persona (str): Identifies the system being emulated.
+        Returns:
+            Optional[str]: The raw LLM response to the system prompt, or None if the system has not been booted yet.
+        """
+        return self.snapshots.get(BootSnapshotCache.make_key(persona))
+
+    def put(self, persona: str, response: str):
+        """ Stores the boot snapshot of an emulated system.
+
+        Args:
+            persona (str): Identifies the system being emulated.
+            response (str): The raw LLM response to the system prompt.
+        """
+        self.snapshots.put(BootSnapshotCache.make_key(persona), response)
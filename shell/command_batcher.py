@@ -0,0 +1,79 @@
+import platform
+import re
+import select
+import sys
+from typing import List
+
+
+class CommandBatcher():
+    """ Picks up commands that have already been entered (for example, by pasting a script) so that they can be sent to
+    the LLM in one request, and splits the response back out into the output of each command.
+    """
+
+    prompt_line = re.compile(r'^(?P<prompt>.*?:\s*[~/][^\s$#]*\s*[$#])(?P<echo>\s.*)?$')
+    """ Matches a line containing a prompt of the form `user@host:path$`, capturing the prompt and any command after it.
+    """
+
+    def __init__(self, max_commands: int = 16):
+        """ Initializes a new instance of a batcher for commands entered all at once.
+
+        Args:
+            max_commands (int): The maximum number of commands to send to the LLM in one request.
+        """
+        self.max_commands = max_commands
+
+    def read_queued_lines(self) -> List[str]:
+        """ Reads any lines of input that have already been entered, without waiting for more.
+
+        Returns:
+            List[str]: The lines (without line breaks).
+        """
+        if platform.system() == 'Windows':
+            return [] # Cannot poll console input.
+        lines: List[str] = []
+        while len(lines) < self.max_commands and len(select.select([sys.stdin], [], [], 0)[0]) > 0:
+            line = sys.stdin.readline()
+            if len(line) == 0:
+                break # End of input, which the next read will pick up on.
+            lines.append(line.rstrip('\n'))
+        return lines
+
+    def split(self, output_message_content: str, count: int) -> List[str]:
+        """ Splits the response to several commands into the output of each, using the prompt after each one as a delimiter.
+
+        Each part keeps the prompt that ends it, so that it can be transformed like the response to a single command.
+
+        Args:
+            output_message_content (str): The response to the commands.
+            count (int): The number of commands.
+        Returns:
+            List[str]: The output of each command, in order. If too few prompts were found to tell the output of every
+            command apart, only the output of those that could be is returned.
+        """
+        lines = output_message_content.split('\n')
+
+        # Drop an echo of the first command, since it comes before any output.
+        first = next((index for index, line in enumerate(lines) if len(line.strip()) > 0), None)
+        if first is not None:
+            match = CommandBatcher.prompt_line.match(lines[first].strip())
+            if match is not None and match.group('echo') is not None:
+                lines = lines[first + 1:]
+
+        # Split after each prompt, dropping any command echoed after it.
+        parts: List[str] = []
+        part: List[str] = []
+        for line in lines:
+            match = CommandBatcher.prompt_line.match(line.strip())
+            if match is None:
+                part.append(line)
+                continue
+            part.append(match.group('prompt'))
+            parts.append('\n'.join(part))
+            part = []
+            if len(parts) == count:
+                return parts # Ignore anything the LLM made up after the last command.
+
+        # The last command may be missing its prompt, in which case the current one stays.
+        if len(parts) == count - 1 and len('\n'.join(part).strip()) > 0:
+            parts.append('\n'.join(part))
+        return parts
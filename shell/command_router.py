@@ -0,0 +1,175 @@
+import re
+import shlex
+from typing import Callable, Dict, Iterable, List, Literal, Optional
+
+from shell.session_state import SessionState
+
+
+LocalCommand = Literal['pwd', 'cd', 'whoami', 'hostname', 'echo', 'history', 'export', 'env']
+""" The names of the commands that can be answered locally instead of by the LLM.
+"""
+
+
+class CommandRouter():
+    """ Answers shell builtins and other commands that only depend on session state locally, instead of asking the LLM.
+
+    Anything the router is not completely sure how to answer (pipelines, redirection, substitution, globbing, unknown
+    options and so on) is left to the LLM.
+    """
+
+    unsupported_syntax = re.compile(r'[|&;<>`(){}*?\[\]\\!]|\$\(|\n')
+    """ Matches shell syntax that the router does not attempt to interpret.
+    """
+
+    variable_reference = re.compile(r'\$(?:\{(?P<braced>[A-Za-z_][A-Za-z0-9_]*)\}|(?P<bare>[A-Za-z_][A-Za-z0-9_]*))')
+    """ Matches references to environment variables.
+    """
+
+    variable_assignment = re.compile(r'^(?P<name>[A-Za-z_][A-Za-z0-9_]*)=(?P<value>.*)$', re.DOTALL)
+    """ Matches environment variable assignments.
+    """
+
+    def __init__(self, session_state: SessionState, local_commands: Iterable[LocalCommand] = []):
+        """ Initializes a new instance of a router that answers commands that only depend on session state locally.
+
+        Args:
+            session_state (SessionState): The state of the emulated system.
+            local_commands (Iterable[LocalCommand]): The commands to answer locally.
+        """
+        self.session_state = session_state
+        handlers: Dict[str, Callable[[List[str]], Optional[str]]] = {
+            'pwd': self._pwd,
+            'cd': self._cd,
+            'whoami': self._whoami,
+            'hostname': self._hostname,
+            'echo': self._echo,
+            'history': self._history,
+            'export': self._export,
+            'env': self._env,
+        }
+        self.handlers = {local_command: handlers[local_command] for local_command in local_commands}
+
+    def _expand(self, command: str) -> Optional[List[str]]:
+        """ Expands environment variables in a command and splits it into words.
+
+        Args:
+            command (str): The command.
+        Returns:
+            Optional[List[str]]: The words of the command, or None if it uses syntax that the router does not interpret.
+        """
+        if CommandRouter.unsupported_syntax.search(CommandRouter.variable_reference.sub('', command)) is not None:
+            return None
+        if '$' in command and "'" in command:
+            return None # Expansion rules differ inside single quotes.
+
+        # Substitute variable values, escaped according to whether they are inside double quotes.
+        expanded: List[str] = []
+        offset = 0
+        for match in CommandRouter.variable_reference.finditer(command):
+            expanded.append(command[offset:match.start()])
+            value = self.session_state.environment.get(match.group('braced') or match.group('bare'), '')
+            if command.count('"', 0, match.start()) % 2 == 1:
+                expanded.append(value.replace('\\', '\\\\').replace('"', '\\"'))
+            else:
+                expanded.append(' '.join(shlex.quote(word) for word in value.split())) # Unquoted values are split into words.
+            offset = match.end()
+        if '$' in command[offset:] or any('$' in part for part in expanded[::2]):
+            return None # Special parameters such as `$?` and `$$` are left to the LLM.
+        expanded.append(command[offset:])
+        try:
+            return shlex.split(''.join(expanded))
+        except ValueError:
+            return None # Unbalanced quotes (the real shell would wait for more input).
+
+    def _pwd(self, args: List[str]) -> Optional[str]:
+        if len(args) > 0:
+            return None
+        return self.session_state.cwd
+
+    def _cd(self, args: List[str]) -> Optional[str]:
+        if len(args) > 1:
+            return None
+        if len(args) == 0:
+            target = self.session_state.home
+        elif args[0] == '-':
+            target = self.session_state.environment['OLDPWD']
+        else:
+            target = self.session_state.resolve_path(args[0])
+
+        # Only directories known to exist can be changed to locally, since the LLM decides what exists.
+        if target not in self.session_state.known_directories:
+            return None
+        self.session_state.change_directory(target)
+        return target if len(args) > 0 and args[0] == '-' else ''
+
+    def _whoami(self, args: List[str]) -> Optional[str]:
+        if len(args) > 0:
+            return None
+        return self.session_state.username
+
+    def _hostname(self, args: List[str]) -> Optional[str]:
+        if len(args) > 0:
+            return None
+        return self.session_state.hostname
+
+    def _echo(self, args: List[str]) -> Optional[str]:
+        if len(args) > 0 and args[0].startswith('-'):
+            return None # Options change how arguments are interpreted.
+        return ' '.join(args)
+
+    def _history(self, args: List[str]) -> Optional[str]:
+        if len(args) > 0:
+            return None
+        return '\n'.join(f'{index:5d}  {command}' for index, command in enumerate(self.session_state.history, start=1))
+
+    def _export(self, args: List[str]) -> Optional[str]:
+        if len(args) == 0:
+            return '\n'.join(f'declare -x {name}="{value}"' for name, value in sorted(self.session_state.environment.items()))
+        assignments = [CommandRouter.variable_assignment.match(arg) for arg in args]
+        if any(assignment is None for assignment in assignments):
+            return None # Exporting an existing shell variable or passing options.
+        for assignment in assignments:
+            self.session_state.environment[assignment.group('name')] = assignment.group('value')
+        return ''
+
+    def _env(self, args: List[str]) -> Optional[str]:
+        if len(args) > 0:
+            return None
+        return '\n'.join(f'{name}={value}' for name, value in self.session_state.environment.items())
+
+    def record(self, command: str):
+        """ Adds a command to the session history.
+
+        Args:
+            command (str): The command.
+        """
+        if len(command.strip()) > 0:
+            self.session_state.history.append(command)
+
+    def handles(self, command: str) -> bool:
+        """ Checks whether a command might be answered locally, without answering it.
+
+        Args:
+            command (str): The command.
+        Returns:
+            bool: True if the command might be answered locally, or False if the LLM must answer it.
+        """
+        if len(self.handlers) == 0:
+            return False
+        words = self._expand(command)
+        return words is not None and len(words) > 0 and words[0] in self.handlers
+
+    def route(self, command: str) -> Optional[str]:
+        """ Answers a command locally, if possible.
+
+        Args:
+            command (str): The command.
+        Returns:
+            Optional[str]: The output of the command (which may be empty), or None if the LLM must answer it.
+        """
+        if len(self.handlers) == 0:
+            return None
+        words = self._expand(command)
+        if words is None or len(words) == 0 or words[0] not in self.handlers:
+            return None
+        return self.handlers[words[0]](words[1:])
@@ -0,0 +1,65 @@
+import time
+from typing import Optional
+
+
+class FallbackResponder():
+    """ Makes up plausible output for a command that the LLM is too slow to answer, so that the session stays responsive.
+
+    Commands seen before get the same output again. Otherwise, after a short hang (like a loaded system), commands that
+    usually print nothing print nothing, and anything else fails the way commands do on a system that has run out of
+    processes.
+    """
+
+    silent_commands = [
+        'cd',
+        'mkdir',
+        'touch',
+        'rm',
+        'rmdir',
+        'cp',
+        'mv',
+        'ln',
+        'chmod',
+        'chown',
+        'chgrp',
+        'export',
+        'unset',
+        'alias',
+        'unalias',
+        'source',
+        '.',
+        'kill',
+        'sleep',
+        'true',
+        'umask',
+        'wait',
+    ]
+    """ The names of commands that usually print nothing when they succeed.
+    """
+
+    def __init__(self, shell: str, hang: float = 3):
+        """ Initializes a new instance of a responder that makes up plausible output for commands the LLM is too slow to answer.
+
+        Args:
+            shell (str): The type of shell being mimicked.
+            hang (float): The time (in seconds) to pause for before making up output for a command not seen before.
+        """
+        self.shell = shell
+        self.hang = hang
+
+    def respond(self, command: str, previous_output: Optional[str] = None) -> str:
+        """ Makes up output for a command.
+
+        Args:
+            command (str): The command.
+            previous_output (Optional[str]): The output the command produced last time it was run (if it has been).
+        Returns:
+            str: The output.
+        """
+        if previous_output is not None:
+            return previous_output
+        time.sleep(self.hang)
+        words = command.split()
+        if len(words) == 0 or words[0] in FallbackResponder.silent_commands:
+            return ''
+        return f'-{self.shell}: fork: Resource temporarily unavailable\n'
@@ -0,0 +1,169 @@
+import re
+from typing import Dict, Iterable, Iterator, Optional
+
+from llm.large_language_model import GenerationLimits
+from llm.response_cache import ResponseCache
+from shell.command_batcher import CommandBatcher
+from shell.session_state import SessionState
+
+
+class GenerationPolicy():
+    """ Decides how much the LLM may generate in response to each command, and tidies up responses cut short as a result.
+
+    The LLM is stopped as soon as it starts writing the prompt (which the shell already knows) instead of being left to
+    carry on making up further commands and their output, and commands known for short output get less room than those
+    known for long output. Commands that can change the prompt (such as `cd`) are left to write it themselves.
+    """
+
+    prompt_changing_commands = [
+        'cd',
+        'pushd',
+        'popd',
+        'su',
+        'sudo',
+        'exit',
+        'logout',
+        'login',
+        'ssh',
+        'chroot',
+        'bash',
+        'sh',
+    ]
+    """ The names of commands that can change the prompt.
+    """
+
+    command_separator = re.compile(r'[;&|]+')
+    """ Matches the separators between commands in a list or pipeline.
+    """
+
+    def __init__(self, max_tokens: int = 512, command_max_tokens: Dict[str, int] = {}, stop_at_prompt: bool = True):
+        """ Initializes a new instance of a policy for how much the LLM may generate in response to each command.
+
+        Args:
+            max_tokens (int): The maximum number of tokens to generate in response to commands not matching any of `command_max_tokens`.
+            command_max_tokens (Dict[str, int]): The maximum number of tokens to generate in response to (normalized) commands matching each regular expression.
+            stop_at_prompt (bool): Whether to stop generating once the LLM reaches the prompt.
+        """
+        self.max_tokens = max_tokens
+        self.command_max_tokens = [(re.compile(pattern), tokens) for pattern, tokens in command_max_tokens.items()]
+        self.stop_at_prompt = stop_at_prompt
+
+    @staticmethod
+    def _get_prompt_head(prompt: str) -> Optional[str]:
+        """ Gets the part of a prompt that comes before the current working directory (such as `user@host:`).
+
+        Args:
+            prompt (str): The prompt.
+        Returns:
+            Optional[str]: The part of the prompt before the current working directory, or None if the prompt is not in a recognised format.
+        """
+        match = SessionState.prompt_pattern.match(prompt.strip())
+        if match is None or len(match.group('head').strip()) < 2:
+            return None
+        return match.group('head').strip()
+
+    @staticmethod
+    def _may_change_prompt(command: str) -> bool:
+        """ Checks whether a command might change the prompt.
+
+        Args:
+            command (str): The command.
+        Returns:
+            bool: True if the command might change the prompt, otherwise False.
+        """
+        for part in GenerationPolicy.command_separator.split(command):
+            words = part.split()
+            if len(words) > 0 and words[0] in GenerationPolicy.prompt_changing_commands:
+                return True
+        return False
+
+    @staticmethod
+    def _match_prompt(line: str, prompt_head: Optional[str]) -> Optional[str]:
+        """ Checks whether a line of a response is a prompt (possibly followed by a made-up command).
+
+        Args:
+            line (str): The line.
+            prompt_head (Optional[str]): The part of the current prompt before the current working directory (if known).
+        Returns:
+            Optional[str]: The prompt, or None if the line is not one.
+        """
+        if prompt_head is None or not line.strip().startswith(prompt_head):
+            return None
+        match = CommandBatcher.prompt_line.match(line.strip())
+        return match.group('prompt') if match is not None else None
+
+    def get_max_tokens(self, command: str) -> int:
+        """ Gets the maximum number of tokens to generate in response to a command.
+
+        Args:
+            command (str): The command.
+        Returns:
+            int: The maximum number of tokens.
+        """
+        normalized_command = ResponseCache.normalize_command(command)
+        return next((tokens for pattern, tokens in self.command_max_tokens if pattern.fullmatch(normalized_command)), self.max_tokens)
+
+    def get_limits(self, command: str, prompt: str) -> GenerationLimits:
+        """ Gets the limits on how much the LLM may generate in response to a command.
+
+        Args:
+            command (str): The command.
+            prompt (str): The current prompt.
+        Returns:
+            GenerationLimits: The limits.
+        """
+        prompt_head = GenerationPolicy._get_prompt_head(prompt)
+        stop_at_prompt = self.stop_at_prompt and prompt_head is not None and not GenerationPolicy._may_change_prompt(command)
+        return GenerationLimits(stop=[f'\n{prompt_head}'] if stop_at_prompt else [], max_tokens=self.get_max_tokens(command))
+
+    def get_batch_limits(self, commands: Iterable[str]) -> GenerationLimits:
+        """ Gets the limits on how much the LLM may generate in response to several commands sent together.
+
+        The response has a prompt after each command, so generation is not stopped at the prompt.
+
+        Args:
+            commands (Iterable[str]): The commands.
+        Returns:
+            GenerationLimits: The limits.
+        """
+        return GenerationLimits(max_tokens=sum(self.get_max_tokens(command) for command in commands))
+
+    def finish(self, chunks: Iterator[str], limits: GenerationLimits, prompt: str) -> Iterator[str]:
+        """ Passes on a response generated within limits, making sure that it ends with a prompt (and nothing after it).
+
+        The response is ended at the first prompt in it, so that anything made up after it is never read. If the
+        response was cut short before the prompt, the prompt is put back. If it was cut short by `max_tokens`, the line
+        it was cut short in is dropped, as if the output had ended there.
+
+        Args:
+            chunks (Iterator[str]): The chunks of the response.
+            limits (GenerationLimits): The limits the response was generated within.
+            prompt (str): The current prompt.
+        Returns:
+            Iterator[str]: The chunks of the finished response.
+        """
+        prompt_head = GenerationPolicy._get_prompt_head(prompt)
+        line = ''
+        try:
+            for chunk in chunks:
+                line += chunk
+                while '\n' in line:
+                    complete_line, line = line.split('\n', 1)
+                    line_prompt = GenerationPolicy._match_prompt(complete_line, prompt_head)
+                    if line_prompt is not None:
+                        yield line_prompt
+                        return # Anything after the prompt was made up.
+                    yield f'{complete_line}\n'
+        finally:
+            chunks.close() # Stop generating if the response was ended early.
+
+        # Finish the last line, which may have been cut short.
+        line_prompt = GenerationPolicy._match_prompt(line, prompt_head)
+        if line_prompt is not None:
+            yield line_prompt
+        elif limits.truncated:
+            yield prompt
+        elif len(limits.stop) > 0:
+            yield f'{line}\n{prompt}' if len(line) > 0 else prompt
+        else:
+            yield line
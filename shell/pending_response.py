@@ -0,0 +1,112 @@
+import queue
+import threading
+from typing import Callable, Iterator, List, Optional
+
+
+class PendingResponse():
+    """ An LLM response being generated in the background, so that the shell can stop waiting for it without stopping it.
+    """
+
+    def __init__(self, response: Iterator[str], stream: bool):
+        """ Starts generating an LLM response in the background.
+
+        Args:
+            response (Iterator[str]): The chunks of the response, as streamed from the LLM (closing it abandons generation).
+            stream (bool): Whether the response is streamed to the terminal, so that it can be read before it is complete.
+        """
+        self.response = response
+        self.stream = stream
+        self.chunks: queue.Queue = queue.Queue()
+        self.raw_chunks: List[str] = []
+        self.error: Optional[Exception] = None
+        self.started = threading.Event()
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+        self.callbacks: List[Callable[['PendingResponse'], None]] = []
+        threading.Thread(target=self._generate, name='llm-response', daemon=True).start()
+
+    def _generate(self):
+        """ Runs in the background to generate the response.
+        """
+        try:
+            for chunk in self.response:
+                if self.cancelled.is_set():
+                    raise InterruptedError('LLM response was cancelled.')
+                self.raw_chunks.append(chunk)
+                self.chunks.put(chunk)
+                if self.stream:
+                    self.started.set()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.response.close() # Stops the backend generating tokens nobody will read, if cancelled.
+            self.chunks.put(None)
+            self.started.set()
+            with self.lock:
+                self.done.set()
+                callbacks = list(self.callbacks)
+            for callback in callbacks:
+                callback(self)
+
+    def cancel(self):
+        """ Stops generating the response (closing the stream, so that the backend stops generating it too) as soon as
+        the next chunk arrives.
+        """
+        self.cancelled.set()
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        """ Waits for the response to start (if streamed) or finish (otherwise) without error.
+
+        Args:
+            timeout (Optional[float]): The time (in seconds) to wait for (or None to wait indefinitely).
+        Returns:
+            bool: True if the response started in time without error, otherwise False.
+        """
+        try:
+            return self.started.wait(timeout) and self.error is None
+        except KeyboardInterrupt:
+            self.cancel() # Nobody is waiting for it any more.
+            raise
+
+    def iterate(self) -> Iterator[str]:
+        """ Reads the chunks of the response as they arrive.
+
+        Returns:
+            Iterator[str]: The chunks of the response. Closing the iterator early cancels the response.
+        Raises:
+            Exception: Whatever the LLM raised, if the response could not be generated.
+        """
+        try:
+            while True:
+                chunk = self.chunks.get()
+                if chunk is None:
+                    break
+                yield chunk
+        except (KeyboardInterrupt, GeneratorExit):
+            self.cancel() # Nobody is reading it any more.
+            raise
+        if self.error is not None:
+            raise self.error
+
+    def get_content(self) -> str:
+        """ Waits for the whole response.
+
+        Returns:
+            str: The response.
+        Raises:
+            Exception: Whatever the LLM raised, if the response could not be generated.
+        """
+        return ''.join(self.iterate())
+
+    def on_done(self, callback: Callable[['PendingResponse'], None]):
+        """ Arranges for a callback to be invoked (in the background) once the response is complete, successfully or not.
+
+        Args:
+            callback (Callable[[PendingResponse], None]): The callback, which is invoked straight away if the response is already complete.
+        """
+        with self.lock:
+            if not self.done.is_set():
+                self.callbacks.append(callback)
+                return
+        callback(self)
@@ -0,0 +1,80 @@
+import secrets
+from typing import Optional
+
+from llm.chat_context import ChatContext
+from shell.session_store import SessionStore
+
+
+class SessionJournal():
+    """ Records the context of a session to a session store as it changes, writing only what changed since last time.
+
+    Whether the context has only been added to since last time is told from its version in constant time, so recording
+    an unchanged context costs nothing however long it is.
+
+    If another login with the same key takes the session over (see `SessionStore`), the journal stops recording, so
+    that the other session is the one picked up next time.
+    """
+
+    def __init__(self, session_store: SessionStore, key: str, epoch: int, recorded: Optional[ChatContext] = None):
+        """ Initializes a new instance of a journal of the context of a session.
+
+        Args:
+            session_store (SessionStore): The store to record the session to.
+            key (str): The session key.
+            epoch (int): The epoch of the log to record to (one past the last recorded, unless resuming it).
+            recorded (Optional[ChatContext]): The context holding the messages already recorded in the epoch (if resuming it).
+        """
+        self.session_store = session_store
+        self.key = key
+        self.writer = secrets.token_hex(8)
+        self.epoch = epoch
+        self.context = recorded
+        self.version = None if recorded is None else recorded.version
+        self.length = 0 if recorded is None else len(recorded)
+        self.prompt: str | None = None
+        self.state_fingerprint: str | None = None
+        self.session_state: str | None = None
+        self.take_over = self.length == 0 # A new session replaces whatever was recorded with the same key.
+        if not self.take_over:
+            session_store.claim(key, self.writer, epoch, self.length)
+
+    def sync(self, context: ChatContext, prompt: str, state_fingerprint: str, session_state: str):
+        """ Records the context of the session, if it has changed.
+
+        Messages added since the last sync are appended to the log. If any earlier message was removed or replaced (for
+        example, by compression or by filling in a late response), the whole context is recorded as a new epoch instead.
+
+        Args:
+            context (ChatContext): The context.
+            prompt (str): The prompt last shown.
+            state_fingerprint (str): The state fingerprint of the session.
+            session_state (str): The state of the emulated system kept track of by the session (serialized).
+        """
+        if self.session_store.has_lost(self.writer):
+            return # Taken over by another login.
+        version = context.version
+        messages = context.messages
+        if context is self.context and version == self.version and len(messages) >= self.length:
+            start = self.length # Only added to since, which leaves the version as it was.
+        elif self.length == 0:
+            start = 0 # Nothing recorded in this epoch yet.
+        else:
+            self.epoch += 1
+            start = 0
+        if start < len(messages) or prompt != self.prompt or state_fingerprint != self.state_fingerprint or session_state != self.session_state:
+            self.session_store.append(self.key, self.writer, self.epoch, start, messages[start:], prompt, state_fingerprint, session_state, self.take_over and start == 0)
+            self.take_over = False
+        self.context = context
+        self.version = version
+        self.length = len(messages)
+        self.prompt = prompt
+        self.state_fingerprint = state_fingerprint
+        self.session_state = session_state
+
+    def forget(self):
+        """ Throws the session away, so that the next login with the same key starts afresh.
+        """
+        self.session_store.forget(self.key, self.writer)
+        self.context = None
+        self.length = 0
+        self.epoch += 1
@@ -0,0 +1,125 @@
+import json
+import posixpath
+import re
+from typing import Dict, List, Optional, Set
+
+
+class SessionState():
+    """ Represents the state of the emulated system that a shell session can keep track of without asking the LLM.
+    """
+
+    prompt_pattern = re.compile(r'^(?P<head>.*?:\s*)(?P<path>[~/][^\s$#]*)(?P<tail>\s*[$#])$')
+    """ Matches prompts of the form `user@host:path$`, capturing the path so that it can be read and replaced.
+    """
+
+    def __init__(self, username: str, hostname: str, shell: str):
+        """ Initializes a new instance of the state of an emulated system.
+
+        Args:
+            username (str): The name of the user logged in to the emulated system.
+            hostname (str): The hostname of the emulated system.
+            shell (str): The name of the shell being emulated.
+        """
+        self.username = username
+        self.hostname = hostname
+        self.home = '/root' if username == 'root' else f'/home/{username}'
+        self.cwd = '/'
+        self.known_directories: Set[str] = {'/', self.home}
+        self.history: List[str] = []
+        self.environment: Dict[str, str] = {
+            'HOME': self.home,
+            'HOSTNAME': hostname,
+            'LANG': 'C.UTF-8',
+            'LOGNAME': username,
+            'OLDPWD': '/',
+            'PATH': '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin',
+            'PWD': self.cwd,
+            'SHELL': f'/bin/{shell}',
+            'SHLVL': '1',
+            'TERM': 'xterm-256color',
+            'USER': username,
+        }
+
+    def resolve_path(self, path: str) -> str:
+        """ Resolves a path relative to the current working directory of the session.
+
+        Args:
+            path (str): The path to resolve.
+        Returns:
+            str: The resolved (absolute, normalized) path.
+        """
+        if path == '~' or path.startswith('~/'):
+            path = self.home + path[1:]
+        return posixpath.normpath(posixpath.join(self.cwd, path)).replace('//', '/')
+
+    def display_path(self, path: str) -> str:
+        """ Abbreviates a path the way the shell prompt shows it.
+
+        Args:
+            path (str): The absolute path to abbreviate.
+        Returns:
+            str: The path, with the home directory shown as `~`.
+        """
+        if path == self.home or path.startswith(self.home + '/'):
+            return '~' + path[len(self.home):]
+        return path
+
+    def change_directory(self, path: str):
+        """ Changes the current working directory of the session.
+
+        Args:
+            path (str): The absolute path of the new working directory.
+        """
+        if path != self.cwd:
+            self.environment['OLDPWD'] = self.cwd
+        self.cwd = path
+        self.environment['PWD'] = path
+        self.known_directories.add(path)
+
+    def get_prompt(self, prompt: str) -> Optional[str]:
+        """ Rewrites a prompt to show the current working directory of the session.
+
+        Args:
+            prompt (str): The prompt to rewrite.
+        Returns:
+            Optional[str]: The rewritten prompt, or None if the prompt is not in a recognised format.
+        """
+        match = SessionState.prompt_pattern.match(prompt)
+        if match is None:
+            return None
+        return f"{match.group('head')}{self.display_path(self.cwd)}{match.group('tail')}"
+
+    def serialize(self) -> str:
+        """ Writes out the parts of the state that change as the session goes on, for example to store the session.
+
+        Returns:
+            str: The state, as JSON.
+        """
+        return json.dumps({
+            'cwd': self.cwd,
+            'known_directories': sorted(self.known_directories),
+            'history': self.history,
+            'environment': self.environment,
+        })
+
+    def restore(self, serialized: str):
+        """ Reads back state written out by `serialize` (for example, when resuming a stored session).
+
+        Args:
+            serialized (str): The state, as JSON.
+        """
+        state = json.loads(serialized)
+        self.cwd = state['cwd']
+        self.known_directories = set(state['known_directories'])
+        self.history = state['history']
+        self.environment = state['environment']
+
+    def sync_prompt(self, prompt: str):
+        """ Picks up the current working directory from a prompt produced by the LLM.
+
+        Args:
+            prompt (str): The prompt.
+        """
+        match = SessionState.prompt_pattern.match(prompt)
+        if match is not None:
+            self.change_directory(self.resolve_path(match.group('path')))
@@ -0,0 +1,254 @@
+from dataclasses import dataclass
+import getpass
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Set
+
+from caching.sqlite_database import SqliteDatabase
+from llm.large_language_model import ChatMessage
+
+
+@dataclass
+class StoredSession():
+    """ A session as last recorded by the session store.
+    """
+
+    epoch: int
+    """ The number of times the recorded context has been rewritten (rather than added to), such as by compression.
+    """
+
+    messages: List[ChatMessage]
+    """ The messages in context.
+    """
+
+    prompt: str
+    """ The prompt last shown.
+    """
+
+    state_fingerprint: str
+    """ The fingerprint of the commands run that might have changed what cached responses should look like.
+    """
+
+    session_state: str
+    """ The state of the emulated system kept track of without asking the LLM (see `SessionState.serialize`).
+    """
+
+    updated_at: float
+    """ The time (in seconds since the epoch) the session was last recorded.
+    """
+
+
+class SessionStore():
+    """ Keeps the context of each session on disk, so that an attacker who reconnects picks up where they left off
+    instead of finding a freshly booted system that contradicts what they saw before.
+
+    Sessions are keyed by the username and source address they were logged in with. Each session is kept as a log of
+    the messages in context: new turns are appended to the log, while rewriting the context (for example, compressing
+    it) starts a new epoch of the log and throws the old one away. Writes are batched and made in the background, so
+    that the interactive path never waits on the disk.
+
+    Parallel logins with the same key (which attackers often open) each record through their own writer. Only one
+    writer owns a key at a time: the last to resume or start it. Each append only goes through if its writer still owns
+    the key and the log is still the length that writer last left it at. Otherwise the writer has lost the key and
+    stops recording, so that the log is never a mix of two sessions.
+    """
+
+    def __init__(self, disk_path: str, flush_interval: float = 1.0):
+        """ Initializes a new instance of a store of sessions.
+
+        Args:
+            disk_path (str): The path of the SQLite database to keep sessions in.
+            flush_interval (float): The longest time (in seconds) to hold writes back for so that they can be batched together.
+        """
+        self.disk = SqliteDatabase(disk_path, [
+            'CREATE TABLE IF NOT EXISTS sessions (key TEXT PRIMARY KEY, writer TEXT NOT NULL, epoch INTEGER NOT NULL, length INTEGER NOT NULL, prompt TEXT NOT NULL, state_fingerprint TEXT NOT NULL, session_state TEXT NOT NULL, updated_at REAL NOT NULL)',
+            'CREATE TABLE IF NOT EXISTS turns (key TEXT NOT NULL, epoch INTEGER NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, PRIMARY KEY (key, epoch, seq))'])
+        self.flush_interval = flush_interval
+        self.writes: queue.Queue = queue.Queue()
+        self.writer_pid: int | None = None
+        self.lost_lock = threading.Lock()
+        self.lost_writers: Set[str] = set()
+
+    @staticmethod
+    def get_current_key() -> str:
+        """ Derives the key of the session being served by the current process, from the login environment.
+
+        Returns:
+            str: The session key.
+        """
+        ssh_client = os.environ.get('SSH_CLIENT', os.environ.get('SSH_CONNECTION', '')).split()
+        return SessionStore.make_key(getpass.getuser(), ssh_client[0] if len(ssh_client) > 0 else 'local')
+
+    @staticmethod
+    def make_key(username: str, source: str) -> str:
+        """ Derives the key of a session.
+
+        Args:
+            username (str): The username the session was logged in with.
+            source (str): The address the session was logged in from.
+        Returns:
+            str: The session key.
+        """
+        return hashlib.sha256(f'{username}\0{source}'.encode('utf-8')).hexdigest()
+
+    def load(self, key: str) -> Optional[StoredSession]:
+        """ Reads a session back from disk, waiting for any writes still pending first.
+
+        Args:
+            key (str): The session key.
+        Returns:
+            Optional[StoredSession]: The session, or None if it has never been recorded (or has been forgotten).
+        """
+        self.flush()
+        with self.disk.lock:
+            connection = self.disk.connect()
+            row = connection.execute('SELECT epoch, prompt, state_fingerprint, session_state, updated_at FROM sessions WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            turns = connection.execute('SELECT role, content FROM turns WHERE key = ? AND epoch = ? ORDER BY seq', (key, row[0])).fetchall()
+        return StoredSession(row[0], [ChatMessage(role, content) for role, content in turns], row[1], row[2], row[3], row[4])
+
+    def claim(self, key: str, writer: str, epoch: int, length: int):
+        """ Takes ownership of a session that has been resumed (in the background), so long as nothing has been recorded
+        to it since it was loaded.
+
+        Args:
+            key (str): The session key.
+            writer (str): Identifies the writer taking ownership.
+            epoch (int): The epoch of the log loaded.
+            length (int): The number of messages loaded.
+        """
+        self._write(('claim', key, writer, epoch, length))
+
+    def append(self, key: str, writer: str, epoch: int, start: int, messages: List[ChatMessage], prompt: str, state_fingerprint: str, session_state: str, take_over: bool = False):
+        """ Records messages added to the context of a session (in the background), if the writer still owns it.
+
+        Args:
+            key (str): The session key.
+            writer (str): Identifies the writer recording the messages.
+            epoch (int): The epoch of the log to record the messages in. Recording from the start of a new epoch throws older epochs away.
+            start (int): The position in context of the first message.
+            messages (List[ChatMessage]): The messages.
+            prompt (str): The prompt last shown.
+            state_fingerprint (str): The state fingerprint of the session.
+            session_state (str): The state of the emulated system kept track of by the session (serialized).
+            take_over (bool): Whether to take ownership of the session from whichever writer owns it (when recording a new session from the start).
+        """
+        self._write(('append', key, writer, epoch, start, [(message.role, message.content) for message in messages], prompt, state_fingerprint, session_state, time.time(), take_over))
+
+    def forget(self, key: str, writer: str):
+        """ Throws a session away (in the background), if the writer still owns it, so that the next login with the same
+        key starts afresh.
+
+        Args:
+            key (str): The session key.
+            writer (str): Identifies the writer throwing the session away.
+        """
+        self._write(('forget', key, writer))
+
+    def has_lost(self, writer: str) -> bool:
+        """ Checks whether a writer has lost ownership of its session to another (as far as writes made so far show).
+
+        Args:
+            writer (str): Identifies the writer.
+        Returns:
+            bool: True if the writer has lost its session, otherwise False.
+        """
+        with self.lost_lock:
+            return writer in self.lost_writers
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """ Waits for writes made so far to reach the disk.
+
+        Args:
+            timeout (Optional[float]): The time (in seconds) to wait for (or None to wait indefinitely).
+        Returns:
+            bool: True if the writes reached the disk in time, otherwise False.
+        """
+        if self.writer_pid != os.getpid():
+            return True # Nothing written from this process yet.
+        flushed = threading.Event()
+        self.writes.put(flushed)
+        return flushed.wait(timeout)
+
+    def _write(self, write: tuple):
+        """ Queues a write for the background writer, starting it if this process does not have one yet.
+
+        Args:
+            write (tuple): The write.
+        """
+        if self.writer_pid != os.getpid():
+            self.writes = queue.Queue() # Writes queued by the parent of a forked process are not ours to make.
+            self.writer_pid = os.getpid()
+            threading.Thread(target=self._run_writer, name='session-store', daemon=True).start()
+        self.writes.put(write)
+
+    def _run_writer(self):
+        """ Runs in the background, making queued writes in batches of one transaction each.
+        """
+        writes = self.writes
+        while True:
+            batch = [writes.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while not isinstance(batch[-1], threading.Event):
+                try:
+                    batch.append(writes.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                with self.disk.lock:
+                    connection = self.disk.connect()
+                    with connection:
+                        for write in batch:
+                            if not isinstance(write, threading.Event) and not self._apply(connection, write):
+                                with self.lost_lock:
+                                    self.lost_writers.add(write[2])
+            except sqlite3.Error:
+                pass # Losing a session only means the attacker starts afresh next time.
+            finally:
+                for write in batch:
+                    if isinstance(write, threading.Event):
+                        write.set()
+
+    def _apply(self, connection: sqlite3.Connection, write: tuple) -> bool:
+        """ Makes a queued write within the current transaction, if its writer (still) owns the session.
+
+        Args:
+            connection (sqlite3.Connection): The connection to the database.
+            write (tuple): The write.
+        Returns:
+            bool: True if the writer owns the session, or False if it has lost it to another.
+        """
+        key, writer = write[1], write[2]
+        row = connection.execute('SELECT writer, epoch, length FROM sessions WHERE key = ?', (key,)).fetchone()
+        if write[0] == 'forget':
+            if row is not None and row[0] == writer:
+                connection.execute('DELETE FROM turns WHERE key = ?', (key,))
+                connection.execute('DELETE FROM sessions WHERE key = ?', (key,))
+            return True # Nothing left to lose.
+        if write[0] == 'claim':
+            _, _, _, epoch, length = write
+            if row is None or row[1:] != (epoch, length):
+                return False # Recorded to by another session since it was loaded.
+            connection.execute('UPDATE sessions SET writer = ? WHERE key = ?', (writer, key))
+            return True
+
+        # Append only to the very log this writer left off at, unless starting it afresh.
+        _, _, _, epoch, start, messages, prompt, state_fingerprint, session_state, updated_at, take_over = write
+        if start > 0 and (row is None or row != (writer, epoch, start)):
+            return False
+        if start == 0 and not take_over and row is not None and row[0] != writer:
+            return False
+        if start == 0:
+            connection.execute('DELETE FROM turns WHERE key = ?', (key,)) # Rewritten since.
+        connection.executemany(
+            'INSERT OR REPLACE INTO turns (key, epoch, seq, role, content) VALUES (?, ?, ?, ?, ?)',
+            [(key, epoch, start + index, role, content) for index, (role, content) in enumerate(messages)])
+        connection.execute(
+            'INSERT OR REPLACE INTO sessions (key, writer, epoch, length, prompt, state_fingerprint, session_state, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (key, writer, epoch, start + len(messages), prompt, state_fingerprint, session_state, updated_at))
+        return True
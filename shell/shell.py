@@ -1,8 +1,14 @@
-from logging import Logger
+from collections import deque
+from concurrent.futures import Future
+import hashlib
+from logging import DEBUG, Logger
 import os
 import platform
+import queue
+import signal
 import sys
-from typing import Iterable, List
+import time
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from kink import inject
 
@@ -10,13 +16,27 @@ from config.config_provider import ConfigProvider
 from input_guards.input_guard import InputGuardFinding
 from input_guards.input_guard_factory import InputGuardFactory
 from input_transformers.input_transformer_factory import InputTransformerFactory
+from llm.chat_context import ChatContext
+from llm.context_compression_scheduler import ContextCompressionScheduler
 from llm.context_compressor import ContextCompressor
-from llm.large_language_model import ChatMessage
+from llm.large_language_model import ChatMessage, GenerationLimits
 from llm.large_language_model_factory import LargeLanguageModelFactory
-from output_guards.output_guard import OutputGuardFinding
+from llm.response_cache import ResponseCache
+from llm.tokenizer_factory import TokenizerFactory
+from output_guards.output_guard import OutputGuard, OutputGuardFinding
 from output_guards.output_guard_factory import OutputGuardFactory
+from output_guards.streaming_output_guard import StreamingOutputGuard
 from output_transformers.output_transformer_factory import OutputTransformerFactory
 from prompting.prompt_factory import PromptFactory
+from shell.boot_snapshot_cache import BootSnapshotCache
+from shell.command_batcher import CommandBatcher
+from shell.command_router import CommandRouter
+from shell.fallback_responder import FallbackResponder
+from shell.generation_policy import GenerationPolicy
+from shell.pending_response import PendingResponse
+from shell.session_journal import SessionJournal
+from shell.session_state import SessionState
+from shell.session_store import SessionStore
 
 
 @inject
@@ -24,6 +44,10 @@ class Shell():
     """ Represents an LLM-powered honeypot shell.
     """
 
+    session_flush_timeout = 5
+    """ The time (in seconds) to wait for the session to be recorded when it ends.
+    """
+
     def __init__(
             self,
             config_provider: ConfigProvider,
@@ -34,6 +58,10 @@ class Shell():
             input_transformer_factory: InputTransformerFactory,
             output_guard_factory: OutputGuardFactory,
             output_transformer_factory: OutputTransformerFactory,
+            response_cache: ResponseCache,
+            boot_snapshot_cache: BootSnapshotCache,
+            session_store: SessionStore,
+            tokenizer_factory: TokenizerFactory,
             logger: Logger):
         """ Intitializes a new instance of an LLM-powered honeypot shell.
 
@@ -46,81 +74,452 @@ class Shell():
             input_transformer_factory (InputGuardFactory): The input transformer factory to generate an input transformer for the LLM.
             output_guard_factory (OutputGuardFactory): The output guard factory to generate an output guard for the LLM.
             output_transformer_factory (OutputTransformerFactory): The output transformer factory to generate an output transformer for the LLM.
+            response_cache (ResponseCache): The cache of LLM responses to stateless commands shared between sessions.
+            boot_snapshot_cache (BootSnapshotCache): The cache of LLM responses to the system prompt shared between sessions.
+            session_store (SessionStore): The store of sessions to resume reconnecting sessions from.
+            tokenizer_factory (TokenizerFactory): The tokenizer factory to get the tokenizer for counting tokens in context from.
             logger (Logger): The logger to use for this instance.
         """
         self.config_provider = config_provider.get()
         self.large_language_model = large_language_model_factory.get()
-        self.context_compressor = context_compressor
+        self.prompt_factory = prompt_factory
         self.system_prompt = prompt_factory.get(self.config_provider.shell)
         self.input_guard = input_guard_factory.get()
         self.input_transformer = input_transformer_factory.get()
         self.output_guard = output_guard_factory.get()
         self.output_transformer = output_transformer_factory.get(lambda new_prompt: self.update_prompt(new_prompt))
+        self.response_cache = response_cache
+        self.boot_snapshot_cache = boot_snapshot_cache if self.config_provider.boot_snapshot is not None else None
+        self.session_store = session_store if self.config_provider.session_store is not None else None
+        self.tokenizer = tokenizer_factory.get()
         self.logger = logger
 
-        # Set default prompt.
-        self.prompt = '$'
-
-        # Initialize context to empty.
-        context: List[ChatMessage] = []
-        self.context = context
-
-        # Initialize context compression boundary.
-        self.context_compression_boundary: int | None = None
+        # Responses are only shared between sessions emulating the same system.
+        self.persona = f'{self.config_provider.model_name}\0{self.system_prompt}'
 
-    @staticmethod
-    def _estimate_tokens_in_str (str) -> int:
-        """ Provides a rough estimate of the number of tokens in a string.
+        # Fingerprint of the commands so far that might have changed what cached responses should look like.
+        self.state_fingerprint = ''
 
-        Uses the algorithm here: https://help.openai.com/en/articles/4936856-what-are-tokens-and-how-to-count-them
-        
-        Returns:
-            int: The estimated number of tokens in the string provided.
-        """
-        return len(str) // 4
+        # Set default prompt.
+        self.prompt = '$'
 
-    def _estimate_tokens (self) -> int:
-        """ Provides a rough estimate of the number of tokens in the shell's context window.
-        
-        Returns:
-            int: The estimated number of tokens in the shell's context window.
-        """
-        return sum([Shell._estimate_tokens_in_str(message.content) for message in self.context]) // 4
+        # Answer commands that only depend on session state without asking the LLM.
+        self.session_state = SessionState(
+            self.config_provider.prompt.get('username', 'root'),
+            self.config_provider.prompt.get('hostname', 'localhost'),
+            self.config_provider.shell)
+        self.command_router = CommandRouter(self.session_state, self.config_provider.local_commands)
 
-    def push_context (self, content: str, transform_input: bool = True, transform_output = True):
+        # Initialize context to empty.
+        self.context = ChatContext(self.tokenizer)
+        self.booted = False
+
+        # Record the session as it goes (if enabled), once it is known which session this is.
+        self.session_journal: SessionJournal | None = None
+
+        # Compress context in the background as it grows (unless disabled), capping its size until compression catches up.
+        threshold = self.config_provider.context_compression_threshold
+        compression_config = self.config_provider.context_compression
+        self.compression_scheduler = ContextCompressionScheduler(
+            context_compressor,
+            int(threshold * compression_config.low_watermark) if compression_config is not None else threshold,
+            int(threshold * compression_config.high_watermark) if compression_config is not None else None,
+            logger) if threshold > 0 else None
+
+        # Make up responses to commands the LLM is too slow to answer (if enabled), filling in the real ones once they arrive.
+        degradation_config = self.config_provider.degradation
+        self.fallback_responder = FallbackResponder(self.config_provider.shell, degradation_config.hang) if degradation_config is not None else None
+        self.previous_outputs: Dict[str, str] = {}
+        self.backfills: queue.Queue[Tuple[ChatMessage, str, Optional[str], bool, PendingResponse]] = queue.Queue()
+        self.guarded_backfills: List[Tuple[ChatMessage, Optional[str], str, str, Future]] = []
+        self.late_guard_findings: List[Future] = []
+        self.response_made_up = False
+
+        # Limit how much the LLM generates in response to each command (if enabled).
+        generation_limits_config = self.config_provider.generation_limits
+        self.generation_policy = GenerationPolicy(
+            generation_limits_config.max_tokens,
+            generation_limits_config.command_max_tokens,
+            generation_limits_config.stop_at_prompt) if generation_limits_config is not None else None
+
+        # Send commands entered all at once to the LLM together (if enabled), holding back any that can't be.
+        command_batching_config = self.config_provider.command_batching
+        self.command_batcher = CommandBatcher(command_batching_config.max_commands) if command_batching_config is not None else None
+        self.pending_commands: Deque[str] = deque()
+        self.unbatched_commands = 0
+
+    def push_context (self, content: str, transform_input: bool = True, transform_output = True, stream_callback: Optional[Callable[[str], None]] = None, cache_key: Optional[str] = None, fallback: Optional[Callable[[], str]] = None, limits: Optional[GenerationLimits] = None) -> Tuple[str, Optional[str]]:
         """ Pushes an additional content message to the LLM context.
         
         Args:
             content (str): The content to push.
             transform_input (bool): Whether to transform the content prior to pushing it to the context (default true).
             transform_output (bool): Whether to transform LLM output prior to pushing it to the context (default true).
+            stream_callback (Optional[Callable[[str], None]]): If given, the LLM response is streamed and this is called with each chunk as it is ready.
+            cache_key (Optional[str]): If given, the key under which the raw LLM response is looked up in the response cache.
+            fallback (Optional[Callable[[], str]]): If given, makes up a response to use if the LLM fails or does not start responding before the degradation deadline.
+            limits (Optional[GenerationLimits]): If given, limits on how much the LLM may generate (from the generation policy).
         Returns:
-            str: The LLM's latest response.
+            Tuple[str, Optional[str]]: The LLM's latest response, and the raw response to store to the response cache once it has passed the output guard (if it is fresh from the LLM).
         """
-        self.logger.debug(f"Pushing message {len(self.context)} to the context. Message length is approx. {Shell._estimate_tokens_in_str(content)} tokens.")
+        if self.logger.isEnabledFor(DEBUG): # Counting tokens is wasted work otherwise.
+            self.logger.debug(f"Pushing message {len(self.context)} to the context. Message length is {self.tokenizer.count_tokens(content)} tokens.")
 
         # Transform input if specified.
         final_content = content
         if transform_input:
             final_content = self.input_transformer.transform(content)
-            self.logger.debug(f"Message transformed to contain approx. {Shell._estimate_tokens_in_str(final_content)} tokens.")
+            if self.logger.isEnabledFor(DEBUG):
+                self.logger.debug(f"Message transformed to contain {self.tokenizer.count_tokens(final_content)} tokens.")
 
         # Push content in role of user.
-        self.context.append(ChatMessage('user', final_content))
+        message = ChatMessage('user', final_content)
+        self.context.append(message)
+        self.response_made_up = False
+        try:
+            return self._get_response(content, transform_output, stream_callback, cache_key, fallback, limits)
+        except (KeyboardInterrupt, TimeoutError, ConnectionError):
 
-        # Get LLM response.
-        response = self.large_language_model.get_next_message(self.context)
-        self.logger.debug(f"LLM responded with approx. {Shell._estimate_tokens_in_str(response.content)} tokens.")
+            # Interrupted (or the LLM failed) before the response was complete, so forget the command like it was never run.
+            if self.context.messages[-1] is message:
+                self.context.pop()
+            raise
 
-        # Transform output if specified.
-        if transform_output:
-            response.content = self.output_transformer.transform(response.content)
-            self.logger.debug(f"LLM output transformed to contain approx. {Shell._estimate_tokens_in_str(response.content)} tokens.")
+    def _get_response (self, content: str, transform_output: bool, stream_callback: Optional[Callable[[str], None]], cache_key: Optional[str], fallback: Optional[Callable[[], str]], limits: Optional[GenerationLimits]) -> Tuple[str, Optional[str]]:
+        """ Gets the LLM response to the content at the end of the LLM context and pushes it to the context.
 
-        # Push LLM response to context and return.
+        Args:
+            content (str): The content at the end of the context, as pushed (before any transformation).
+            transform_output (bool): Whether to transform LLM output prior to pushing it to the context.
+            stream_callback (Optional[Callable[[str], None]]): If given, the LLM response is streamed and this is called with each chunk as it is ready.
+            cache_key (Optional[str]): If given, the key under which the raw LLM response is looked up in the response cache.
+            fallback (Optional[Callable[[], str]]): If given, makes up a response to use if the LLM fails or does not start responding before the degradation deadline.
+            limits (Optional[GenerationLimits]): If given, limits on how much the LLM may generate.
+        Returns:
+            Tuple[str, Optional[str]]: The LLM's latest response, and the raw response to store to the response cache once it has passed the output guard (if it is fresh from the LLM).
+        """
+
+        # Look up response in cache if we can.
+        cached_content = None if cache_key is None else self.response_cache.get(cache_key)
+        if cache_key is not None:
+            self.logger.debug(f"Response cache {'hit' if cached_content is not None else 'miss'} ({self.response_cache.hits} hits, {self.response_cache.misses} misses).")
+        raw_chunks: List[str] = []
+
+        # If there is a fallback, generate the response in the background and stop waiting for it if it's too slow.
+        pending_response = None
+        if cached_content is None and fallback is not None:
+            pending_response = PendingResponse(self._stream_response(limits), stream_callback is not None)
+            raw_chunks = pending_response.raw_chunks
+            if not pending_response.wait(self.config_provider.degradation.deadline):
+                return self._push_fallback(content, fallback, pending_response, transform_output, stream_callback, cache_key), None # Cached once the real response arrives.
+
+        # Stream LLM response through output transformers if a callback was given.
+        if stream_callback is not None:
+            if cached_content is not None:
+                chunks = iter([cached_content])
+            elif pending_response is not None:
+                chunks = pending_response.iterate()
+            else:
+                chunks = Shell._record(self._stream_response(limits), raw_chunks)
+            if transform_output:
+                chunks = self.output_transformer.transform_stream(chunks)
+            buffer: List[str] = []
+            for chunk in chunks:
+                if len(chunk) > 0:
+                    stream_callback(chunk)
+                    buffer.append(chunk)
+            response = ChatMessage('system', ''.join(buffer))
+            if self.logger.isEnabledFor(DEBUG):
+                self.logger.debug(f"LLM streamed {self.tokenizer.count_tokens(response.content)} tokens of output.")
+        else:
+
+            # Get LLM response.
+            if cached_content is not None:
+                response = ChatMessage('system', cached_content)
+            elif pending_response is not None:
+                response = ChatMessage('system', pending_response.get_content())
+            elif limits is not None:
+                response = ChatMessage('system', ''.join(self._stream_response(limits))) # Streamed anyway, so that generation stops at the prompt.
+                raw_chunks.append(response.content)
+            else:
+                response = self.large_language_model.get_next_message(self.context.messages)
+                raw_chunks.append(response.content)
+            if self.logger.isEnabledFor(DEBUG):
+                self.logger.debug(f"LLM responded with {self.tokenizer.count_tokens(response.content)} tokens.")
+
+            # Transform output if specified.
+            if transform_output:
+                response.content = self.output_transformer.transform(response.content)
+                if self.logger.isEnabledFor(DEBUG):
+                    self.logger.debug(f"LLM output transformed to contain {self.tokenizer.count_tokens(response.content)} tokens.")
+
+        if limits is not None and limits.truncated:
+            self.logger.debug(f'LLM output was cut short at {limits.max_tokens} tokens.')
+
+        # Push LLM response to context and return, along with the raw response to share with other sessions (if fresh).
         self.context.append(response)
-        self.logger.debug(f"Context size now stands at approx. {self._estimate_tokens()} tokens.")
-        return response.content
+        self.logger.debug(f"Context size now stands at {self.context.token_count} tokens.")
+        return response.content, ''.join(raw_chunks) if cached_content is None else None
+
+    def _stream_response (self, limits: Optional[GenerationLimits]) -> Iterator[str]:
+        """ Streams the LLM response to the content at the end of the LLM context, finished according to the generation
+        policy if generated within limits.
+
+        Args:
+            limits (Optional[GenerationLimits]): Limits on how much the LLM may generate (if any).
+        Returns:
+            Iterator[str]: The chunks of the response.
+        """
+        chunks = self.large_language_model.get_next_message_stream(list(self.context.messages), limits=limits)
+        if limits is None:
+            return chunks
+        return self.generation_policy.finish(chunks, limits, self.prompt)
+
+    def _push_fallback (self, command: str, fallback: Callable[[], str], pending_response: PendingResponse, transform_output: bool, stream_callback: Optional[Callable[[str], None]], cache_key: Optional[str]) -> str:
+        """ Pushes a made-up response to the LLM context in place of one the LLM is too slow to give, to be replaced once it arrives.
+
+        Args:
+            command (str): The command being responded to, to guard the real response with once it arrives.
+            fallback (Callable[[], str]): Makes up the response.
+            pending_response (PendingResponse): The response the LLM is still generating.
+            transform_output (bool): Whether to transform LLM output prior to pushing it to the context.
+            stream_callback (Optional[Callable[[str], None]]): If given, called with the made-up response.
+            cache_key (Optional[str]): If given, the key under which to store the raw LLM response to the response cache once it arrives.
+        Returns:
+            str: The made-up response.
+        """
+        self.logger.warning('LLM did not respond in time. Falling back to a made-up response.')
+        try:
+            content = fallback()
+        except KeyboardInterrupt:
+            pending_response.cancel() # Interrupted before there was anything to backfill.
+            raise
+        if stream_callback is not None and len(content) > 0:
+            stream_callback(content)
+
+        # Hold the made-up response's place in context until the real one arrives.
+        self.response_made_up = True
+        placeholder = ChatMessage('system', content)
+        self.context.append(placeholder)
+        pending_response.on_done(lambda pending_response: self.backfills.put((placeholder, command, cache_key, transform_output, pending_response)))
+        return content
+
+    def _apply_backfills (self):
+        """ Replaces made-up responses in the LLM context with the real ones that have since arrived (and caches them), so
+        long as they pass the output guard.
+
+        Late responses are guarded in the background, and only filled in once the guard has finished, so that a slow
+        guard never holds up the shell.
+        """
+        while not self.backfills.empty():
+            placeholder, command, cache_key, transform_output, pending_response = self.backfills.get_nowait()
+            if pending_response.error is not None:
+                self.logger.warning(f'LLM failed to respond in the background: {pending_response.error}')
+                continue
+            raw_content = pending_response.get_content()
+            try:
+                content = self.output_transformer.transform(raw_content) if transform_output else raw_content
+            except RuntimeError as e:
+                self.logger.warning(f'Discarding late LLM response: {e}')
+                continue
+            self.guarded_backfills.append((placeholder, cache_key, raw_content, content, self.output_guard.detect_async(command, content)))
+
+        # Fill in those that have passed the guard, keeping the made-up response (which is all the user has seen) otherwise.
+        guarded_backfills, self.guarded_backfills = self.guarded_backfills, []
+        for guarded_backfill in guarded_backfills:
+            placeholder, cache_key, raw_content, content, finding = guarded_backfill
+            if not finding.done():
+                self.guarded_backfills.append(guarded_backfill)
+                continue
+            if finding.exception() is not None or finding.result() != OutputGuardFinding.OK:
+                self.logger.warning('Discarding late LLM response, as it did not pass the output guard.')
+                continue
+            if cache_key is not None:
+                self.response_cache.put(cache_key, raw_content)
+            if self.context.replace(placeholder, ChatMessage('system', content)):
+                self.logger.debug(f"Filled in late LLM response. Context size now stands at {self.context.token_count} tokens.")
+
+    def _guard_output (self, command: str, output: str, streaming_output_guard: Optional[StreamingOutputGuard]) -> OutputGuardFinding:
+        """ Runs the LLM's output through the output guard, waiting no longer than the degradation deadline (if enabled).
+
+        Output that the guard cannot judge in time (or at all, because the guard LLM is unreachable) is let through, in
+        keeping with the guard's own policy. If a verdict that comes too late finds a deviation, the session is
+        disconnected before the next command.
+
+        Args:
+            command (str): The command.
+            output (str): The output of the command.
+            streaming_output_guard (Optional[StreamingOutputGuard]): The guard already checking output streamed to the terminal (if any).
+        Returns:
+            OutputGuardFinding: The finding of the output guard.
+        """
+        if streaming_output_guard is not None:
+            detect = lambda: streaming_output_guard.detect(output)
+        else:
+            detect = lambda: self.output_guard.detect(command, output)
+        if self.fallback_responder is None:
+            return detect()
+        finding = OutputGuard.executor.submit(detect)
+        try:
+            return finding.result(self.config_provider.degradation.deadline)
+        except (TimeoutError, ConnectionError):
+            if not finding.done():
+                self.logger.warning('Output guard did not finish in time. Letting output through for now.')
+                self.late_guard_findings.append(finding)
+            return OutputGuardFinding.OK
+
+    def _check_late_guard_findings (self):
+        """ Disconnects the session if the output guard has since found a deviation in output it was too slow to judge in time.
+        """
+        late_guard_findings, self.late_guard_findings = self.late_guard_findings, []
+        for finding in late_guard_findings:
+            if not finding.done():
+                self.late_guard_findings.append(finding)
+            elif finding.exception() is None and finding.result() == OutputGuardFinding.PROBABLE_DEVIATION:
+                self._end_session(forget=True)
+                sys.exit(0)
+
+    def _read_command (self) -> str:
+        """ Reads the next command, picking up any entered along with it if commands are being batched.
+
+        Returns:
+            str: The command.
+        """
+        if len(self.pending_commands) > 0:
+            sys.stdout.write(f'{self.prompt} ') # Already echoed when it was entered, so just show the prompt before it.
+            sys.stdout.flush()
+            return self.pending_commands.popleft()
+        command = input(f'{self.prompt} ')
+        if self.command_batcher is not None:
+            self.pending_commands.extend(self.command_batcher.read_queued_lines())
+        return command
+
+    def _take_batch (self, command: str) -> List[str]:
+        """ Gathers commands entered along with one bound for the LLM that can be sent to the LLM together with it.
+
+        Args:
+            command (str): The command bound for the LLM.
+        Returns:
+            List[str]: The commands to send together, starting with the one given.
+        """
+        batch = [command]
+        if self.unbatched_commands > 0:
+            self.unbatched_commands -= 1
+            return batch # Already failed to be sent together.
+        while len(self.pending_commands) > 0 and len(batch) < self.command_batcher.max_commands:
+            next_command = self.pending_commands[0]
+            if self.command_router.handles(next_command) or self.input_guard.detect(next_command) != InputGuardFinding.OK:
+                break # Needs handling on its own.
+            batch.append(self.pending_commands.popleft())
+        return batch
+
+    def _run_batch (self, batch: List[str]) -> bool:
+        """ Sends several commands to the LLM in one request, then records and prints the output of each as if it had
+        been sent on its own. Any commands whose output could not be told apart are put back to be sent on their own.
+
+        Args:
+            batch (List[str]): The commands, the first of which has already been recorded in history.
+        Returns:
+            bool: True if the commands were sent, or False if the LLM failed, in which case the first command is left to be sent on its own and the rest are put back to be.
+        """
+        self.logger.debug(f'Sending {len(batch)} commands to the LLM together.')
+        transformed_commands = [self.input_transformer.transform(command) for command in batch]
+        batch_prompt = self.prompt_factory.get('command-batch', {'commands': transformed_commands})
+        limits = self.generation_policy.get_batch_limits(batch) if self.generation_policy is not None else None
+        try:
+            response = self.large_language_model.get_next_message([*self.context.messages, ChatMessage('user', batch_prompt)], limits)
+        except Exception as e:
+            self.logger.warning(f'LLM failed to respond to commands sent together, sending them one at a time instead: {e}')
+            self.pending_commands.extendleft(reversed(batch[1:]))
+            self.unbatched_commands = len(batch) - 1
+            return False
+        outputs = self.command_batcher.split(response.content, len(batch)) or [response.content] # Always make progress.
+        self.pending_commands.extendleft(reversed(batch[len(outputs):]))
+        for index, (command, transformed_command, raw_output) in enumerate(zip(batch, transformed_commands, outputs)):
+            if index > 0:
+                self.command_router.record(command)
+
+            # Guard output, then record it as a separate exchange, just like a command sent on its own.
+            cache_key = self._get_cache_key(command)
+            output = self.output_transformer.transform(raw_output)
+            if self.output_guard.detect(command, output) == OutputGuardFinding.PROBABLE_DEVIATION:
+                self._end_session(forget=True)
+                sys.exit(0)
+            self.context.append(ChatMessage('user', transformed_command))
+            self.context.append(ChatMessage('system', output))
+            if cache_key is not None:
+                self.response_cache.put(cache_key, raw_output)
+            self._update_state_fingerprint(command)
+            self.previous_outputs[command.strip()] = output
+
+            # Print output, showing the prompt between commands.
+            print(output, end='')
+            if index < len(outputs) - 1:
+                sys.stdout.write(f'{self.prompt} ')
+        self.logger.debug(f"Context size now stands at {self.context.token_count} tokens.")
+        return True
+
+    def boot (self):
+        """ Pushes the system prompt and the LLM's response to it (the first prompt) to the LLM context, starting from a
+        snapshot of an earlier boot of the same system if boot snapshots are enabled.
+        """
+        if self.booted:
+            return
+        self.context = ChatContext(self.tokenizer) # Start afresh, in case an earlier attempt failed part way through.
+        if self.boot_snapshot_cache is None:
+            self.push_context(self.system_prompt, transform_input=False)
+            self.booted = True
+            return
+
+        # Boot from a snapshot, asking the LLM for one if there isn't one yet.
+        raw_content = self.boot_snapshot_cache.get(self.persona)
+        if raw_content is None:
+            raw_content = self.large_language_model.get_next_message([ChatMessage('user', self.system_prompt)]).content
+            content = self.output_transformer.transform(raw_content) # Check for a prompt before keeping the snapshot.
+            self.boot_snapshot_cache.put(self.persona, raw_content)
+            self.logger.debug('Booted from the LLM and saved a boot snapshot.')
+        else:
+            content = self.output_transformer.transform(raw_content) # Captures the prompt, just like a fresh boot.
+            self.logger.debug('Booted from a boot snapshot.')
+        self.context.append(ChatMessage('user', self.system_prompt))
+        self.context.append(ChatMessage('system', content))
+        self.booted = True
+
+    def resume (self):
+        """ Picks up the session last served to the same user from the same address, if session storage is enabled and
+        it was active recently enough, in place of booting the system afresh (replacing the context if already booted).
+
+        Must be called once the login environment is known, as this identifies the session.
+        """
+        if self.session_store is None:
+            return
+        key = SessionStore.get_current_key()
+        stored_session = self.session_store.load(key)
+        if stored_session is None or len(stored_session.messages) == 0 or time.time() - stored_session.updated_at > self.config_provider.session_store.max_age:
+            self.session_journal = SessionJournal(self.session_store, key, stored_session.epoch + 1 if stored_session is not None else 0)
+            return
+        self.context = ChatContext(self.tokenizer, stored_session.messages)
+        self.update_prompt(stored_session.prompt)
+        self.state_fingerprint = stored_session.state_fingerprint
+        self.session_state.restore(stored_session.session_state) # Answer locally just like before, from variables set to history.
+        self.session_journal = SessionJournal(self.session_store, key, stored_session.epoch, self.context)
+        self.booted = True # No need to boot the system again.
+        self.logger.debug(f'Resumed stored session. Context size now stands at {self.context.token_count} tokens.')
+
+    def _end_session (self, forget: bool = False):
+        """ Records the session one last time and waits (briefly) for it to reach the disk before the process exits.
+
+        Args:
+            forget (bool): Whether to throw the session away instead, so that the next login starts afresh.
+        """
+        if self.session_journal is None:
+            return
+        if forget:
+            self.session_journal.forget()
+        else:
+            self.session_journal.sync(self.context, self.prompt, self.state_fingerprint, self.session_state.serialize())
+        self.session_store.flush(Shell.session_flush_timeout)
+        self.session_journal = None
 
     def update_prompt (self, new_prompt: str):
         """ An event handler invoked by the prompt capturing output transformer when the prompt changes.
@@ -129,63 +528,194 @@ class Shell():
             new_prompt (str): The new prompt.
         """
         self.prompt = new_prompt
+        self.session_state.sync_prompt(new_prompt) # Follow directory changes made by the LLM.
 
-    def _context_compressor_callback (self, chat_messages: Iterable[ChatMessage]):
-        """ A callback invoked by the context compressor when context compression has finished.
+    def push_local_exchange (self, content: str, output: str):
+        """ Pushes a command answered locally and its output to the LLM context, so that the LLM stays consistent with it.
 
         Args:
-            chat_messages (Iterable[ChatMessage]): The compressed chat messages.
+            content (str): The command.
+            output (str): The output of the command.
         """
-        self.context = [*chat_messages, *self.context[self.context_compression_boundary + 1:]]
-        self.context_compression_boundary = None
-        self.logger.debug(f'Finished compressing context. Ending length approx. {self._estimate_tokens()} tokens.')
+        self.prompt = self.session_state.get_prompt(self.prompt) or self.prompt # Show any change of directory.
+        self.context.append(ChatMessage('user', self.input_transformer.transform(content)))
+        self.context.append(ChatMessage('system', f'{output}\n{self.prompt}' if len(output) > 0 else self.prompt))
+        self.logger.debug(f"Answered command locally. Context size now stands at {self.context.token_count} tokens.")
 
-    def run(self):
-        """ Enters the shell.
+    @staticmethod
+    def _record (chunks: Iterable[str], buffer: List[str]) -> Iterator[str]:
+        """ Passes chunks through unchanged, recording a copy of each into a buffer.
+
+        Args:
+            chunks (Iterable[str]): The chunks to pass through.
+            buffer (List[str]): The buffer to record chunks into.
+        Returns:
+            Iterator[str]: The chunks passed.
+        """
+        for chunk in chunks:
+            buffer.append(chunk)
+            yield chunk
+
+    def _get_cache_key (self, command: str) -> Optional[str]:
+        """ Gets the response cache key for a command, if its response may be cached.
+
+        Args:
+            command (str): The command to get the cache key for.
+        Returns:
+            Optional[str]: The cache key for the command, or None if its response may not be cached.
         """
+        if not self.response_cache.is_cacheable(command):
+            return None
+        return ResponseCache.make_key(self.persona, command, f'{self.prompt}\0{self.state_fingerprint}')
 
-        # Input system prompt.
-        self.push_context(self.system_prompt, transform_input=False)
+    def _update_state_fingerprint (self, command: str):
+        """ Folds a command that might have changed the state of the emulated system into the state fingerprint.
 
-        # Loop as a shell until the user exits.
-        while True:
+        Sessions that have only run cacheable commands keep sharing cache entries, while any other command moves the
+        session onto cache entries of its own.
 
-            # Print output (if any) and read next command into buffer.
-            buffer = input(f'{self.prompt} ')
+        Args:
+            command (str): The command to fold in.
+        """
+        if not self.response_cache.is_cacheable(command):
+            self.state_fingerprint = hashlib.sha256(f'{self.state_fingerprint}\0{command}'.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _write_output (chunk: str):
+        """ Writes a chunk of output to the terminal immediately.
+
+        Args:
+            chunk (str): The chunk of output to write.
+        """
+        sys.stdout.write(chunk)
+        sys.stdout.flush()
+
+    @staticmethod
+    def _write_interrupt ():
+        """ Finishes the line interrupted by Ctrl-C the way bash does.
+        """
+        echoed = False
+        if platform.system() != 'Windows' and sys.stdin.isatty():
+            import termios # Not available on Windows.
+            echoed = termios.tcgetattr(sys.stdin.fileno())[3] & termios.ECHOCTL != 0 # The terminal already showed ^C.
+        sys.stdout.write('\n' if echoed else '^C\n')
+        sys.stdout.flush()
+
+    @staticmethod
+    def _hang_up (signum: int, frame):
+        """ A signal handler invoked when the terminal hangs up, which exits straight away (closing any LLM response streams).
+
+        Args:
+            signum (int): The number of the signal.
+            frame: The stack frame interrupted.
+        """
+        sys.exit(128 + signum)
+
+    def run(self):
+        """ Enters the shell.
+        """
+
+        # Cancel the running command on Ctrl-C, and abandon everything (releasing any LLM requests) on hang-up.
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        if platform.system() != 'Windows':
+            signal.signal(signal.SIGHUP, Shell._hang_up)
+
+        # Pick up where the session left off last time (if enabled), otherwise input system prompt.
+        self.resume()
+        self.boot()
+
+        # Loop as a shell until the user exits, recording the session however that happens.
+        try:
+            while True:
+
+                # Record what changed in the session since the last command.
+                if self.session_journal is not None:
+                    self.session_journal.sync(self.context, self.prompt, self.state_fingerprint, self.session_state.serialize())
+                try:
+
+                    # Print output (if any) and read next command into buffer.
+                    buffer = self._read_command()
+                    self.command_router.record(buffer)
+                    self._check_late_guard_findings()
+                    self._apply_backfills()
+                    if self.compression_scheduler is not None:
+                        self.compression_scheduler.apply(self.context) # Merge any finished compression before the context is next sent.
             
-            # Run input through guard.
-            input_guard_finding = self.input_guard.detect(buffer)
-            if input_guard_finding == InputGuardFinding.OK:
-
-                # Get LLM response to what's in the buffer.
-                output = self.push_context(buffer)
-                output_guard_finding = self.output_guard.detect(buffer, output) # Run through output guard.
-                if output_guard_finding == OutputGuardFinding.OK:
-
-                    # All OK, print output.
-                    print(output, end='')
-                elif output_guard_finding == OutputGuardFinding.PROBABLE_DEVIATION:
+                    # Run input through guard, then try to answer locally.
+                    input_guard_finding = self.input_guard.detect(buffer)
+                    local_output = self.command_router.route(buffer) if input_guard_finding == InputGuardFinding.OK else None
+                    batch = self._take_batch(buffer) if input_guard_finding == InputGuardFinding.OK and local_output is None and self.command_batcher is not None else [buffer]
+                    if local_output is not None:
+
+                        # Print output straight away, no LLM needed.
+                        self.push_local_exchange(buffer, local_output)
+                        self._update_state_fingerprint(buffer)
+                        if len(local_output) > 0:
+                            print(local_output)
+                    elif input_guard_finding == InputGuardFinding.OK and len(batch) > 1 and self._run_batch(batch):
+
+                        # Sent commands entered all at once to the LLM together (otherwise sent on their own below).
+                        pass
+                    elif input_guard_finding == InputGuardFinding.OK:
+
+                        # Get LLM response to what's in the buffer, writing it out as it arrives (and guarding it early) if streaming.
+                        streaming_output_guard = StreamingOutputGuard(self.output_guard, buffer, Shell._write_output) if self.config_provider.streaming else None
+                        stream_callback = streaming_output_guard.write if streaming_output_guard is not None else None
+                        fallback = None
+                        if self.fallback_responder is not None:
+                            previous_output = self.previous_outputs.get(buffer.strip())
+                            fallback = lambda: self.fallback_responder.respond(buffer, previous_output)
+                        limits = self.generation_policy.get_limits(buffer, self.prompt) if self.generation_policy is not None else None
+                        cache_key = self._get_cache_key(buffer)
+                        output, raw_output = self.push_context(buffer, stream_callback=stream_callback, cache_key=cache_key, fallback=fallback, limits=limits)
+                        self.previous_outputs[buffer.strip()] = output
+                        self._update_state_fingerprint(buffer)
+                        if self.response_made_up:
+                            output_guard_finding = OutputGuardFinding.OK # Made up locally, so there is nothing to guard.
+                        else:
+                            output_guard_finding = self._guard_output(buffer, output, streaming_output_guard) # Run through output guard.
+                        if output_guard_finding == OutputGuardFinding.OK:
+
+                            # All OK, share fresh output with other sessions and print it (unless already streamed).
+                            if cache_key is not None and raw_output is not None:
+                                self.response_cache.put(cache_key, raw_output)
+                            if stream_callback is None:
+                                print(output, end='')
+                        elif output_guard_finding == OutputGuardFinding.PROBABLE_DEVIATION:
                     
-                    # Simply force a disconnect (context will reset).
-                    sys.exit(0)
-            elif input_guard_finding == InputGuardFinding.SPECIAL_COMMAND_EXIT:
-
-                # Terminate program.
-                sys.exit(0)
-            elif input_guard_finding == InputGuardFinding.SPECIAL_COMMAND_CLEAR:
-
-                # Clear terminal (platform-dependent).
-                if platform.system() == 'Windows':
-                    os.system('cls')
-                else:
-                    os.system('clear')
-            elif input_guard_finding == InputGuardFinding.PROBABLE_PROMPT_INJECTION:
-
-                # Do not allow dangerous input to proceed to LLM.
-                print(f"{buffer.split(' ')[0]}: Command not found")
-
-            # Compress context in background.
-            if self.context_compression_boundary is None and self._estimate_tokens() > self.config_provider.context_compression_threshold:
-                self.logger.debug(f'Compressing context in background. Starting length approx. {self._estimate_tokens()} tokens.')
-                self.context_compression_boundary = len(self.context)
-                self.context_compressor.compress(self.context, self._context_compressor_callback)
+                            # Simply force a disconnect (context will reset, including any stored session).
+                            self._end_session(forget=True)
+                            sys.exit(0)
+                    elif input_guard_finding == InputGuardFinding.SPECIAL_COMMAND_EXIT:
+
+                        # Terminate program.
+                        sys.exit(0)
+                    elif input_guard_finding == InputGuardFinding.SPECIAL_COMMAND_CLEAR:
+
+                        # Clear terminal (platform-dependent).
+                        if platform.system() == 'Windows':
+                            os.system('cls')
+                        else:
+                            os.system('clear')
+                    elif input_guard_finding == InputGuardFinding.PROBABLE_PROMPT_INJECTION:
+
+                        # Do not allow dangerous input to proceed to LLM.
+                        print(f"{buffer.split(' ')[0]}: Command not found")
+                except KeyboardInterrupt:
+
+                    # Ctrl-C cancels the command (and any typed ahead, which the terminal discards too) and shows a fresh prompt.
+                    self.pending_commands.clear()
+                    self.unbatched_commands = 0
+                    Shell._write_interrupt()
+                    continue
+                except (TimeoutError, ConnectionError) as e:
+
+                    # The LLM is too busy (or too slow) to answer, so fail the command like a system out of processes would.
+                    self.logger.warning(f'Command failed: {e}')
+                    print(f'-{self.config_provider.shell}: fork: Resource temporarily unavailable')
+
+                # Compress context in background.
+                if self.compression_scheduler is not None:
+                    self.compression_scheduler.schedule(self.context)
+        finally:
+            self._end_session()
@@ -0,0 +1,60 @@
+""" Exports a trained text classification pipeline to the array-based format used by the text classifier input guard.
+
+Requires scikit-learn (which limbosh itself does not need at runtime). Run from the root of the repository like so:
+
+    python3 -m tools.export_text_classifier models/rf-1-3.model models/rf-1-3
+
+Authors:
+    Saul Johnson (saul.johnson@nhlstenden.com)
+Since:
+    28/02/2023
+"""
+import argparse
+import json
+import os
+
+from joblib import load
+import numpy as np
+
+from input_guards.linear_text_classifier import LinearTextClassifier
+
+
+def export(pipeline_file_path: str, model_directory_path: str):
+    """ Exports a serialized `CountVectorizer`, `TfidfTransformer` and linear classifier pipeline.
+
+    Args:
+        pipeline_file_path (str): The path of the serialized pipeline to export.
+        model_directory_path (str): The path of the directory to export the model to.
+    """
+    pipeline = load(pipeline_file_path)
+    vectorizer, tfidf, classifier = [step for _, step in pipeline.steps]
+    if vectorizer.analyzer != 'word' or vectorizer.tokenizer is not None or vectorizer.preprocessor is not None \
+            or vectorizer.strip_accents is not None or vectorizer.stop_words is not None or vectorizer.binary:
+        raise ValueError('Only vectorizers using the default word analyzer can be exported.')
+    if tfidf.norm != 'l2' or tfidf.sublinear_tf or not tfidf.use_idf:
+        raise ValueError('Only L2-normalized TF-IDF transformers can be exported.')
+    if classifier.coef_.shape[0] != 1:
+        raise ValueError('Only binary linear classifiers can be exported.')
+
+    os.makedirs(model_directory_path, exist_ok=True)
+    with open(os.path.join(model_directory_path, LinearTextClassifier.vocabulary_file_name), 'w', encoding='utf-8') as file:
+        json.dump({term: int(index) for term, index in sorted(vectorizer.vocabulary_.items(), key=lambda item: item[1])}, file, ensure_ascii=False)
+    with open(os.path.join(model_directory_path, LinearTextClassifier.metadata_file_name), 'w') as file:
+        json.dump({
+            'token_pattern': vectorizer.token_pattern,
+            'lowercase': vectorizer.lowercase,
+            'ngram_range': list(vectorizer.ngram_range),
+            'intercept': float(classifier.intercept_[0]),
+            'classes': [int(label) for label in classifier.classes_],
+        }, file, indent=4)
+    idf = np.ascontiguousarray(tfidf.idf_, dtype=np.float64)
+    np.save(os.path.join(model_directory_path, LinearTextClassifier.idf_file_name), idf)
+    np.save(os.path.join(model_directory_path, LinearTextClassifier.weights_file_name), idf * classifier.coef_[0])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exports a text classification pipeline for use by the text classifier input guard.')
+    parser.add_argument('pipeline_file_path', help='the serialized scikit-learn pipeline to export')
+    parser.add_argument('model_directory_path', help='the directory to export the model to')
+    args = parser.parse_args()
+    export(args.pipeline_file_path, args.model_directory_path)